@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ArequipaBusGuide.settings')
+# settings.py lo usa para no dejar conexiones persistentes bajo ASGI
+os.environ.setdefault('DJANGO_SERVER', 'asgi')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -79,17 +80,56 @@ WSGI_APPLICATION = 'ArequipaBusGuide.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_* permite apuntar a otra base, p. ej. el contenedor PostGIS de docker-compose.yml
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
-        'NAME': 'neondb',
-        'USER': 'neondb_owner',
-        'PASSWORD': 'npg_NC8lIeOERZ5q',
-        'HOST': 'ep-tiny-moon-a2ostagj-pooler.eu-central-1.aws.neon.tech',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'neondb'),
+        'USER': os.environ.get('DB_USER', 'neondb_owner'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'npg_NC8lIeOERZ5q'),
+        'HOST': os.environ.get('DB_HOST', 'ep-tiny-moon-a2ostagj-pooler.eu-central-1.aws.neon.tech'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Conexiones persistentes: cada hilo reutiliza su conexión hasta DB_CONN_MAX_AGE
+        # segundos (None = sin límite) y la verifica antes de reutilizarla. Bajo ASGI
+        # (asgi.py define DJANGO_SERVER=asgi) el valor por defecto es 0: cada vista
+        # síncrona corre en un hilo distinto y las conexiones persistentes se
+        # acumularían hasta agotar el límite de Neon/PgBouncer; ahí se reutiliza con DB_POOL
+        'CONN_MAX_AGE': (
+            None if os.environ.get('DB_CONN_MAX_AGE') == 'none'
+            else int(os.environ.get(
+                'DB_CONN_MAX_AGE', 0 if os.environ.get('DJANGO_SERVER') == 'asgi' else 60
+            ))
+        ),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {},
     }
 }
 
+# Con PgBouncer en modo transacción (hosts "-pooler") los cursores del lado del
+# servidor de QuerySet.iterator() no sobreviven entre transacciones
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = os.environ.get(
+    'DB_DISABLE_SERVER_SIDE_CURSORS', '1' if '-pooler' in DATABASES['default']['HOST'] else '0'
+) == '1'
+
+# Pool del lado del cliente por worker (DB_POOL=1, el de la imagen Docker).
+# Requiere psycopg 3 con psycopg_pool (requirements.txt) y reemplaza a CONN_MAX_AGE
+if os.environ.get('DB_POOL') == '1':
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError as e:
+        from django.core.exceptions import ImproperlyConfigured
+
+        raise ImproperlyConfigured(
+            'DB_POOL=1 requiere psycopg 3 con psycopg_pool: pip install "psycopg[binary,pool]"'
+        ) from e
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,3 +173,39 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Routing graph
+# Directorio (idealmente en /dev/shm) con el snapshot mmap del grafo que
+# comparten todos los workers. Sin valor, cada worker carga desde la BD.
+ROUTING_SNAPSHOT_DIR = os.environ.get('ROUTING_SNAPSHOT_DIR')
+
+# Caché en memoria de respuestas de ruteo (por proceso)
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 1024))
+ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', 600))
+ROUTE_CACHE_PRECISION = 4  # decimales de lat/lng en la llave (~11 m)
+
+# Pool acotado para búsquedas multimodales de la vista asíncrona
+ROUTING_POOL_WORKERS = int(os.environ.get('ROUTING_POOL_WORKERS', 2))
+ROUTING_POOL_QUEUE = int(os.environ.get('ROUTING_POOL_QUEUE', 8))
+
+# Tiempos por etapa (Server-Timing y log JSON) en todas las peticiones de ruteo;
+# apagado, solo las peticiones con "debug": true se instrumentan
+ROUTING_TIMING = os.environ.get('ROUTING_TIMING') == '1'
+
+# Histogramas de latencia por motor y etapa para /metrics (ROUTING_METRICS=0 los apaga)
+ROUTING_METRICS = os.environ.get('ROUTING_METRICS', '1') != '0'
+
+# Perfiles cProfile de optimal-route/ (apagado sin directorio): con la cabecera
+# X-Routing-Profile, una fracción de las peticiones o las que superen el umbral
+ROUTING_PROFILE_DIR = os.environ.get('ROUTING_PROFILE_DIR')
+ROUTING_PROFILE_RATE = float(os.environ.get('ROUTING_PROFILE_RATE', 0))
+ROUTING_PROFILE_THRESHOLD_MS = float(os.environ.get('ROUTING_PROFILE_THRESHOLD_MS', 0))
+
+# Carga del grafo al arrancar: off (perezosa), eager (bloquea) o background (hilo);
+# otro valor detiene el arranque con ImproperlyConfigured
+ROUTING_WARMUP = os.environ.get('ROUTING_WARMUP', 'off')
+
+# Vector tiles (/tiles/z/x/y.mvt): motor auto (ST_AsMVT si PostGIS lo soporta,
+# si no el grafo en memoria), postgis o python; caché en disco por versión del grafo
+ROUTING_TILES_ENGINE = os.environ.get('ROUTING_TILES_ENGINE', 'auto')
+ROUTING_TILES_DIR = os.environ.get('ROUTING_TILES_DIR')
@@ -16,8 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from Nodes.urls import urlpatterns as nodes_urls
 from Routes.urls import urlpatterns as routes_urls
+from Routes.tile_views import tile_view
+from Routes.views import metrics_view, readiness_view
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('routes/', include(routes_urls)),
+    path('graph/', include(nodes_urls)),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', tile_view, name='tile'),
+    path('metrics', metrics_view, name='metrics'),
+    path('healthz/ready', readiness_view, name='healthz-ready'),
 ]
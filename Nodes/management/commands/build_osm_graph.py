@@ -0,0 +1,61 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from filter_osm import DEFAULT_RULES, TagRules
+from Nodes.services.osm_etl import OsmGraphPipeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Build nodes and street edges from an OSM extract in one resumable run '
+        '(filter ways, extract nodes, import nodes, import edges, recompute distances, refresh route patterns)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str, default='map_15-6-25.xml', help='OSM extract with nodes and ways')
+        parser.add_argument('--ways', type=str, default='ways.xml',
+                            help='Street ways extract (only ways tagged highway are imported; "" reads --file)')
+        parser.add_argument('--workdir', type=str, default='osm_build',
+                            help='Directory for the intermediate files and the checkpoint')
+        parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 4),
+                            help='Worker processes for the import stages (1 runs them inline)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Nodes per import chunk')
+        parser.add_argument('--rules', type=str, default=None,
+                            help='JSON way rules {"key": ["value", ...] or null} (defaults to filter_osm.DEFAULT_RULES)')
+        parser.add_argument('--drop', action='append', default=[], metavar='KEY[=V1,V2]',
+                            help='Extra way rule, repeatable')
+        parser.add_argument('--since', type=str, default=None, help='Keep nodes edited on or after this date')
+        parser.add_argument('--until', type=str, default=None, help='Keep nodes edited before this date')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+
+    def handle(self, *args, **options):
+        for path in filter(None, (options['file'], options['ways'])):
+            if not os.path.exists(path):
+                raise CommandError(f'{path} not found')
+        rules = TagRules.load(options['rules']).rules if options['rules'] else dict(DEFAULT_RULES)
+        rules.update(TagRules.parse(options['drop']).rules)
+
+        pipeline = OsmGraphPipeline(
+            options['file'],
+            options['workdir'],
+            ways_source=options['ways'],
+            rules=TagRules(rules),
+            since=options['since'],
+            until=options['until'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+            log=self.stdout.write,
+        )
+        results = pipeline.run()
+
+        self.stdout.write('\nstage            status          rows   seconds    rows/s')
+        total = 0.0
+        for name, status, rows, seconds in results:
+            rate = f'{rows / seconds:9.0f}' if seconds and status == 'ran' else '        -'
+            self.stdout.write(f'{name:<16} {status:<10} {rows:>9} {seconds:>9.1f} {rate}')
+            total += seconds if status == 'ran' else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Graph tables built in {total:.1f}s; rebuild the graph snapshot (build_graph_snapshot) to serve them'
+        ))
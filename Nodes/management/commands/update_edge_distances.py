@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from Nodes.models import Edge
 from django.contrib.gis.geos import LineString
 from django.contrib.gis.measure import Distance
+from Routes.services.route_patterns import refresh_route_patterns
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,4 +21,8 @@ class Command(BaseCommand):
                     edge.distance = distance_m
                     edge.save(update_fields=['distance'])
                     updated_count += 1
-        self.stdout.write(self.style.SUCCESS(f'Updated {updated_count} edges with recalculated distances in meters.')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated_count} edges with recalculated distances in meters.'))
+        if updated_count:
+            # route_patterns guarda distancias acumuladas de las aristas
+            count = refresh_route_patterns()
+            self.stdout.write(self.style.SUCCESS(f'Refreshed {count} route patterns'))
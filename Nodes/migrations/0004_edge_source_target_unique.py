@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+# Antes de la restricción: las rutas que apuntan a un tramo repetido pasan al
+# de menor id y se borran los repetidos (si no, el CASCADE se llevaría sus RouteEdge).
+DEDUPLICATE_EDGES = """
+WITH keep AS (
+    SELECT id, MIN(id) OVER (PARTITION BY source_id, target_id) AS keep_id FROM edges
+)
+UPDATE route_edges SET edge_id = keep.keep_id
+FROM keep WHERE route_edges.edge_id = keep.id AND keep.id <> keep.keep_id;
+
+DELETE FROM edges e USING edges k
+WHERE e.source_id = k.source_id AND e.target_id = k.target_id AND e.id > k.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Nodes', '0003_alter_edge_table_alter_node_table'),
+        ('Routes', '0002_alter_route_table_alter_routeedge_table_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_EDGES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='edge',
+            constraint=models.UniqueConstraint(fields=['source', 'target'], name='edges_source_target_uniq'),
+        ),
+    ]
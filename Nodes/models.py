@@ -20,6 +20,10 @@ class Edge(models.Model):
   
   class Meta:
     db_table = 'edges'
+    # Un tramo por par origen-destino: permite upsert concurrente en la importación
+    constraints = [
+      models.UniqueConstraint(fields=['source', 'target'], name='edges_source_target_uniq'),
+    ]
 
   def __str__(self):
     return f"Edge from {self.source_id} to {self.target_id}"
@@ -1,14 +1,49 @@
 from rest_framework import serializers
+
+from Routes.services.polyline import encode_polyline
 from .models import Node, Edge
 
-class NodeSerializer(serializers.ModelSerializer):
+
+class SelectableFieldsMixin:
+    """
+    Acepta `fields=[...]` para serializar solo esas columnas (el resto se
+    descarta). `model_columns()` dice qué columnas del modelo hacen falta.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(unknown))}"})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def model_columns(self):
+        return sorted({field.source.split('.')[0] for field in self.fields.values()})
+
+
+class EncodedLineStringField(serializers.Field):
+    """LineString (lng, lat) como Google Encoded Polyline, igual que el polyline de las rutas."""
+
+    def to_representation(self, value):
+        return encode_polyline([(lat, lng) for lng, lat in value.coords])
+
+
+class NodeSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    lat = serializers.FloatField(source='location.y', read_only=True)
+    lng = serializers.FloatField(source='location.x', read_only=True)
+
     class Meta:
         model = Node
-        fields = ['id', 'latitude', 'longitude', 'name', 'description']
-        read_only_fields = ['id']
+        fields = ['id', 'osm_id', 'lat', 'lng']
+        read_only_fields = fields
+
+
+class EdgeSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
+    geometry = EncodedLineStringField(read_only=True)
 
-class EdgeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Edge
-        fields = ['id', 'start_node', 'end_node', 'distance', 'description']
-        read_only_fields = ['id']
+        fields = ['id', 'source', 'target', 'distance', 'geometry']
+        read_only_fields = fields
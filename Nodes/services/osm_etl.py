@@ -0,0 +1,366 @@
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from filter_osm import DEFAULT_RULES, STREET_KEY, TagRules, is_street, iter_children, stream_filter
+from filter_street_nodes import extract_nodes
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'checkpoint.json'
+WAYS_FILE = 'filtered_ways.xml'
+NODES_FILE = 'street_nodes.xml'
+MERCATOR_RADIUS = 6378137.0
+STAGES = ('filter_ways', 'extract_nodes', 'import_nodes', 'import_edges', 'edge_distances', 'route_patterns')
+# Archivos intermedios: si faltan, la etapa que los produce se repite
+OUTPUTS = {'filter_ways': WAYS_FILE, 'extract_nodes': NODES_FILE}
+
+# Índice osm_id -> (Node.id, lng, lat) para los workers de import_edges; se
+# arma en el proceso principal antes de crear el pool y los hijos (fork) lo heredan
+_node_index = None
+
+
+class Checkpoint:
+    """
+    Progreso del pipeline en <workdir>/checkpoint.json: etapas terminadas
+    (con filas y duración) y chunks ya confirmados de las etapas paralelas.
+    Si la entrada o las opciones cambian, el checkpoint anterior se ignora.
+    """
+
+    def __init__(self, path, fingerprint, restart=False):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.resumed = False
+        self.data = {'fingerprint': fingerprint, 'stages': {}}
+        if not restart and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('fingerprint') == fingerprint:
+                self.data = data
+                self.resumed = True
+            else:
+                logger.warning("La entrada u opciones cambiaron: se ignora el checkpoint %s", path)
+
+    def stage(self, name):
+        return self.data['stages'].setdefault(name, {'done': False, 'chunks': []})
+
+    def done(self, name):
+        return self.stage(name)['done']
+
+    def chunk_done(self, name, index, rows):
+        stage = self.stage(name)
+        stage['chunks'].append(index)
+        stage['rows'] = stage.get('rows', 0) + rows
+        self.save()
+
+    def finish(self, name, rows, seconds):
+        self.data['stages'][name] = {'done': True, 'rows': rows, 'seconds': seconds, 'chunks': []}
+        self.save()
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def fingerprint(paths, options):
+    """Huella de los archivos de entrada (ruta, tamaño, mtime) y de las opciones de filtrado."""
+    parts = [(os.path.abspath(p), os.path.getsize(p), os.path.getmtime(p)) for p in paths]
+    return hashlib.sha1(json.dumps([parts, options], sort_keys=True).encode()).hexdigest()
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def mercator_length(lngs, lats):
+    """
+    Largo en metros de Web Mercator de cada segmento (lngs[i], lats[i]) ->
+    (lngs[i + 1], lats[i + 1]): lo mismo que ST_Length(ST_Transform(g, 3857))
+    que usaban import_ways y update_edge_distances.
+    """
+    x = MERCATOR_RADIUS * np.radians(lngs)
+    y = MERCATOR_RADIUS * np.log(np.tan(math.pi / 4 + np.radians(lats) / 2))
+    return np.hypot(np.diff(x), np.diff(y))
+
+
+# --- Trabajo de cada chunk (corre en los procesos del pool) ----------------
+
+def import_nodes_chunk(rows):
+    """
+    Upsert por osm_id de [(osm_id, lng, lat)] en un solo INSERT ... ON CONFLICT
+    por lote. Un osm_id repetido en el chunk se escribe una vez (gana el último):
+    ON CONFLICT no admite afectar la misma fila dos veces en una sentencia.
+    Devuelve (escritas, repetidas).
+    """
+    from django.contrib.gis.geos import Point
+    from django.db import transaction
+    from Nodes.models import Node
+
+    locations = {osm_id: (lng, lat) for osm_id, lng, lat in rows}
+    with transaction.atomic():
+        Node.objects.bulk_create(
+            [Node(osm_id=osm_id, location=Point(lng, lat, srid=4326)) for osm_id, (lng, lat) in locations.items()],
+            update_conflicts=True, unique_fields=['osm_id'], update_fields=['location'], batch_size=2000,
+        )
+    return len(locations), len(rows) - len(locations)
+
+
+def import_edges_chunk(ways):
+    """
+    Aristas entre nodos consecutivos de cada way ([osm_id, ...]) con un
+    INSERT ... ON CONFLICT (source, target) por lote: un tramo que ya existe
+    se actualiza, así que reintentar un chunk o correr dos chunks con el
+    mismo tramo (ways superpuestos) a la vez no lo duplica. Devuelve
+    (escritas, omitidas).
+    """
+    from django.contrib.gis.geos import LineString
+    from django.db import transaction
+    from Nodes.models import Edge
+
+    osm_ids, node_ids, lngs, lats = _node_index
+    if not len(osm_ids):
+        return 0, sum(max(len(refs) - 1, 0) for refs in ways)
+    # Llave (origen, destino): cada tramo una sola vez por INSERT, ON CONFLICT
+    # no admite afectar la misma fila dos veces en una sentencia
+    segments = {}
+    skipped = 0
+    for refs in ways:
+        refs = np.asarray(refs, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(osm_ids, refs), len(osm_ids) - 1)
+        found = osm_ids[pos] == refs
+        distances = mercator_length(lngs[pos], lats[pos])
+        for i in range(len(refs) - 1):
+            if not (found[i] and found[i + 1]):
+                skipped += 1
+                continue
+            u, v = pos[i], pos[i + 1]
+            segments[(int(node_ids[u]), int(node_ids[v]))] = (
+                float(distances[i]),
+                LineString([(lngs[u], lats[u]), (lngs[v], lats[v])], srid=4326),
+            )
+
+    with transaction.atomic():
+        Edge.objects.bulk_create(
+            [
+                Edge(source_id=source, target_id=target, distance=distance, geometry=geometry)
+                for (source, target), (distance, geometry) in segments.items()
+            ],
+            update_conflicts=True, unique_fields=['source', 'target'],
+            update_fields=['distance', 'geometry'], batch_size=2000,
+        )
+    return len(segments), skipped
+
+
+def edge_distances_chunk(id_range):
+    """Recalcula en SQL la distancia (m, Web Mercator) de las aristas con id en [lo, hi)."""
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE edges SET distance = ST_Length(ST_Transform(geometry, 3857))
+            WHERE id >= %s AND id < %s AND geometry IS NOT NULL
+              AND distance IS DISTINCT FROM ST_Length(ST_Transform(geometry, 3857))
+            """,
+            id_range,
+        )
+        return cursor.rowcount, 0
+
+
+# --- Pipeline ---------------------------------------------------------------
+
+class OsmGraphPipeline:
+    """
+    Extracto OSM -> nodos y calles en la BD, en etapas que leen la salida de
+    la anterior en streaming: filter_ways (solo ways con `highway` que las
+    reglas no descartan), extract_nodes, import_nodes, import_edges,
+    edge_distances y route_patterns (las secuencias de las rutas se
+    recalculan con las distancias nuevas). Las etapas de importación reparten chunks
+    independientes entre `workers` procesos y registran cada chunk confirmado
+    en el checkpoint; una corrida interrumpida retoma donde quedó.
+    """
+
+    def __init__(self, source, workdir, ways_source=None, rules=None, since=None, until=None,
+                 workers=1, chunk_size=5000, restart=False, log=print):
+        self.source = source
+        self.ways_source = ways_source or source
+        self.workdir = workdir
+        self.rules = rules or TagRules(DEFAULT_RULES)
+        self.since = since
+        self.until = until
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.log = log
+        self.results = []
+        os.makedirs(workdir, exist_ok=True)
+        options = {
+            'street_key': STREET_KEY,
+            'rules': {k: sorted(v) if v is not None else None for k, v in self.rules.rules.items()},
+            'since': since,
+            'until': until,
+            'chunk_size': chunk_size,
+        }
+        self.checkpoint = Checkpoint(
+            os.path.join(workdir, CHECKPOINT),
+            fingerprint(sorted({self.source, self.ways_source}), options),
+            restart,
+        )
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def run(self):
+        if self.checkpoint.resumed:
+            self.log(f"Resuming from {self.checkpoint.path}")
+        for i, name in enumerate(STAGES):
+            stage = self.checkpoint.stage(name)
+            output = OUTPUTS.get(name)
+            if stage['done'] and output and not os.path.exists(self.path(output)) and not all(
+                self.checkpoint.stage(later)['done'] for later in STAGES[i + 1:]
+            ):
+                self.log(f"[{name}] {output} is missing, running again")
+                stage['done'] = False
+            if stage['done']:
+                self.results.append((name, 'checkpoint', stage['rows'], stage['seconds']))
+                self.log(f"[{name}] already done ({stage['rows']} rows)")
+                continue
+            self.log(f"[{name}] running...")
+            start = time.perf_counter()
+            rows = getattr(self, name)()
+            seconds = time.perf_counter() - start
+            self.checkpoint.finish(name, rows, seconds)
+            self.results.append((name, 'ran', rows, seconds))
+            self.log(f"[{name}] {rows} rows in {seconds:.1f}s")
+        return self.results
+
+    # Etapas
+
+    def filter_ways(self):
+        rules = self.rules
+        kept, _ = stream_filter(
+            self.ways_source, self.path(WAYS_FILE),
+            lambda elem: elem.tag == 'way' and is_street(elem) and not rules.matches(elem),
+        )
+        return kept['way']
+
+    def extract_nodes(self):
+        kept, _ = extract_nodes(
+            self.source, self.path(NODES_FILE), self.path(WAYS_FILE), self.since, self.until
+        )
+        return kept
+
+    def import_nodes(self):
+        rows = (
+            (elem.get('id'), float(elem.get('lon')), float(elem.get('lat')))
+            for _, elem in iter_children(self.path(NODES_FILE)) if elem.tag == 'node'
+        )
+        return self.parallel('import_nodes', import_nodes_chunk, chunked(rows, self.chunk_size))
+
+    def import_edges(self):
+        global _node_index
+        _node_index = load_node_index()
+        ways = (
+            [int(nd.get('ref')) for nd in elem.iterfind('nd')]
+            for _, elem in iter_children(self.path(WAYS_FILE)) if elem.tag == 'way'
+        )
+        # Cada way aporta varias aristas: chunks más chicos que los de nodos
+        try:
+            return self.parallel('import_edges', import_edges_chunk,
+                                 chunked(ways, max(self.chunk_size // 10, 1)))
+        finally:
+            _node_index = None
+
+    def edge_distances(self):
+        from django.db.models import Max, Min
+        from Nodes.models import Edge
+
+        bounds = Edge.objects.aggregate(lo=Min('id'), hi=Max('id'))
+        if bounds['lo'] is None:
+            return 0
+        step = self.chunk_size * 10
+        ranges = ((lo, lo + step) for lo in range(bounds['lo'], bounds['hi'] + 1, step))
+        return self.parallel('edge_distances', edge_distances_chunk, ranges)
+
+    def route_patterns(self):
+        from Routes.services.route_patterns import refresh_route_patterns
+
+        return refresh_route_patterns()
+
+    def parallel(self, name, work, chunks):
+        """
+        Ejecuta `work(chunk)` para cada chunk no confirmado, con a lo sumo
+        2 × workers chunks en vuelo (la lectura del archivo no se adelanta).
+        Devuelve las filas escritas en toda la etapa, incluidas las de chunks
+        confirmados en una corrida anterior; las omitidas solo van al log.
+        """
+        from django.db import connections
+
+        done = set(self.checkpoint.stage(name)['chunks'])
+        skipped = 0
+        pending = (item for item in enumerate(chunks) if item[0] not in done)
+        if self.workers <= 1:
+            for index, chunk in pending:
+                written, missing = work(chunk)
+                skipped += missing
+                self.checkpoint.chunk_done(name, index, written)
+        else:
+            # Los hijos no deben heredar la conexión abierta del padre
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+                in_flight = {}
+                for index, chunk in pending:
+                    in_flight[pool.submit(work, chunk)] = index
+                    if len(in_flight) >= 2 * self.workers:
+                        skipped += self._collect(name, in_flight)
+                while in_flight:
+                    skipped += self._collect(name, in_flight)
+        if skipped:
+            logger.warning("%s: %d elementos omitidos (fuera del extracto o repetidos)", name, skipped)
+        return self.checkpoint.stage(name).get('rows', 0)
+
+    def _collect(self, name, in_flight):
+        """Espera al menos un chunk, lo confirma en el checkpoint y devuelve sus omitidos."""
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        skipped = 0
+        for future in finished:
+            written, missing = future.result()
+            skipped += missing
+            self.checkpoint.chunk_done(name, in_flight.pop(future), written)
+        return skipped
+
+
+def load_node_index():
+    """(osm_ids ordenados, Node.id, lng, lat) como arreglos alineados, leídos por bloques."""
+    from django.db.models import BigIntegerField, FloatField, Func
+    from django.db.models.functions import Cast
+    from Nodes.models import Node
+    from Routes.services.bulk_load import stream_columns
+
+    osm_ids, ids, lngs, lats = stream_columns(
+        Node.objects.annotate(
+            osm=Cast('osm_id', BigIntegerField()),
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        ),
+        ('osm', 'id', 'lng', 'lat'),
+        (np.int64, np.int64, np.float64, np.float64),
+    )
+    order = np.argsort(osm_ids, kind='stable')
+    return osm_ids[order], ids[order], lngs[order], lats[order]
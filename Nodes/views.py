@@ -1,66 +1,113 @@
-from django.shortcuts import render
-from rest_framework import viewsets, status
-from rest_framework.response import Response
-from rest_framework.decorators import action
+import math
+
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from .models import Node, Edge
 from .serializers import NodeSerializer, EdgeSerializer
 
-# Create your views here.
+METERS_PER_DEGREE = 111320.0
+MAX_RADIUS = 5000  # metros
+
 
-class NodeViewSet(viewsets.ModelViewSet):
+class IdCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre la clave primaria: cada página es un
+    `WHERE id > cursor ORDER BY id LIMIT n` por índice, sin OFFSET ni COUNT(*).
     """
-    ViewSet for viewing and editing Node instances.
-    Provides CRUD operations for nodes.
+    ordering = 'id'
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+
+
+def float_params(params, name, count):
+    try:
+        values = [float(v) for v in params[name].split(',')]
+    except ValueError:
+        raise ValidationError({name: "Debe ser numérico"})
+    if len(values) != count or not all(math.isfinite(v) for v in values):
+        raise ValidationError({name: f"Se esperan {count} valores"})
+    return values
+
+
+def spatial_filters(params, column):
+    """
+    Filtros `bbox=min_lng,min_lat,max_lng,max_lat` y `lat=&lng=&radius=`
+    (metros) sobre `column`. El radio también se acota con su caja para que
+    el índice GiST descarte lo lejano antes del ST_DistanceSphere exacto.
+    """
+    filters = {}
+    if 'bbox' in params:
+        min_lng, min_lat, max_lng, max_lat = float_params(params, 'bbox', 4)
+        if min_lng >= max_lng or min_lat >= max_lat:
+            raise ValidationError({'bbox': "Caja vacía"})
+        filters[f'{column}__intersects'] = Polygon.from_bbox((min_lng, min_lat, max_lng, max_lat))
+    if 'radius' in params:
+        if 'lat' not in params or 'lng' not in params:
+            raise ValidationError({'radius': "Requiere lat y lng"})
+        radius, = float_params(params, 'radius', 1)
+        lat, = float_params(params, 'lat', 1)
+        lng, = float_params(params, 'lng', 1)
+        if not 0 < radius <= MAX_RADIUS:
+            raise ValidationError({'radius': f"Debe estar entre 0 y {MAX_RADIUS} m"})
+        dlat = radius / METERS_PER_DEGREE
+        dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+        point = Point(lng, lat, srid=4326)
+        filters[f'{column}__bboxoverlaps'] = Polygon.from_bbox((lng - dlng, lat - dlat, lng + dlng, lat + dlat))
+        filters[f'{column}__distance_lte'] = (point, D(m=radius))
+    return filters
+
+
+class SpatialListMixin:
+    """
+    Lectura para clientes de mapa: filtros espaciales de `spatial_filters`
+    sobre `spatial_column` y `fields=id,lat,lng` para serializar y leer de la
+    BD solo esas columnas.
+    """
+    pagination_class = IdCursorPagination
+    spatial_column = None
+
+    def selected_fields(self):
+        fields = self.request.query_params.get('fields')
+        if self.request.method != 'GET' or not fields:
+            return None
+        return [name.strip() for name in fields.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.selected_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        fields = self.selected_fields()
+        if fields is not None:
+            # La paginación por cursor necesita el id aunque no se pida
+            columns = self.get_serializer(fields=fields).model_columns()
+            queryset = queryset.only('id', *columns)
+        return queryset.filter(**spatial_filters(self.request.query_params, self.spatial_column))
+
+
+class NodeViewSet(SpatialListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only access to Node instances: the graph is built by the import
+    commands, and edits through the API would not reach the loaded graph.
+    Lists are paginated by cursor and accept bbox/radius filters and field selection.
     """
     queryset = Node.objects.all()
     serializer_class = NodeSerializer
+    spatial_column = 'location'
 
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def update(self, request, *args, **kwargs):
-        partial = kwargs.pop('partial', False)
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-class EdgeViewSet(viewsets.ModelViewSet):
+
+class EdgeViewSet(SpatialListMixin, viewsets.ReadOnlyModelViewSet):
     """
-    ViewSet for viewing and editing Edge instances.
-    Provides CRUD operations for edges.
+    Read-only access to Edge instances. Lists are paginated by cursor and
+    accept bbox/radius filters (on the geometry) and field selection.
     """
     queryset = Edge.objects.all()
     serializer_class = EdgeSerializer
-
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def update(self, request, *args, **kwargs):
-        partial = kwargs.pop('partial', False)
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    spatial_column = 'geometry'
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class RoutesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Routes'
+
+    def ready(self):
+        # Carga el grafo al arrancar (ROUTING_WARMUP) para no hacerlo en la primera petición
+        from Routes.services.warmup import start_warmup
+
+        start_warmup()
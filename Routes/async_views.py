@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from Routes.services.metrics import SEARCH_LIMIT_HITS, observe_request
+from Routes.services.search_pool import PoolOverloaded, get_search_pool
+from Routes.views import (
+    RouteRequestError,
+    engine_label,
+    get_transport_graph,
+    observe_failures,
+    parse_route_request,
+    plan_direct,
+    plan_multimodal,
+    request_timer,
+    route_cache,
+    route_cache_key,
+    route_flights,
+    wants_debug,
+)
+
+
+LABEL = "optimal-route-async"
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncOptimalRouteView(View):
+    """
+    Versión asíncrona de optimal-route/ para ASGI. Los aciertos de caché y las
+    rutas directas se responden en la petición; las búsquedas multimodales van
+    a un pool acotado y, si la cola está llena, se responde 503.
+    """
+    async def post(self, request):
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            body = None
+        debug = wants_debug(body)
+        timer = request_timer(debug)
+        engine = engine_label(body)
+        with observe_failures(timer, LABEL, engine):
+            try:
+                # Un cuerpo que no es un objeto JSON no tiene .get
+                query = parse_route_request(body)
+            except AttributeError:
+                return self.respond({"error": "JSON inválido"}, timer, False, engine, 400)
+            except RouteRequestError as e:
+                return self.respond({"error": str(e)}, timer, False, engine, e.status)
+
+            key = route_cache_key(query)
+            cached = route_cache.get(key)
+            if cached is not None:
+                timer.count("cache_hit")
+                return self.respond(cached, timer, debug, engine)
+
+            try:
+                # Peticiones idénticas en curso (hilos o corrutinas) comparten una sola búsqueda
+                data = await route_flights.do_async(key, self.compute, query, key, timer)
+            except PoolOverloaded:
+                SEARCH_LIMIT_HITS.inc(limit="search_pool")
+                return self.respond(
+                    {"error": "Servidor ocupado, intenta de nuevo."}, timer, False, engine, 503, {"Retry-After": "1"}
+                )
+            except RouteRequestError as e:
+                return self.respond({"error": str(e)}, timer, False, engine, e.status)
+            return self.respond(data, timer, debug, engine)
+
+    def respond(self, data, timer, debug, engine, status=200, headers=None):
+        """Respuesta (también de error) con sus métricas etiquetadas por código."""
+        if debug:
+            data = {**data, "debug": timer.debug_block()}
+        with timer.stage("serialize"):
+            response = JsonResponse(data, status=status, headers=headers, json_dumps_params={"ensure_ascii": False})
+        if timer.enabled:
+            observe_request(LABEL, engine, timer, response.status_code)
+        if timer.trace:
+            response["Server-Timing"] = timer.server_timing()
+            timer.log(LABEL, status=response.status_code)
+        return response
+
+    async def compute(self, query, key, timer):
+        # El fallo ya lo contó post(); solo se vuelve a mirar la llave
+        cached = route_cache.peek(key)
+        if cached is not None:
+            return cached
+        with timer.stage("graph"):
+            G = await sync_to_async(get_transport_graph, thread_sensitive=False)()
+        start_nodes, end_nodes, data = await sync_to_async(plan_direct)(G, query, timer)
+        if data is None:
+            future = get_search_pool().submit(plan_multimodal, G, query, start_nodes, end_nodes, timer)
+            data = await asyncio.wrap_future(future)
+        route_cache.set(key, data)
+        return data
@@ -0,0 +1,99 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from Routes.benchmarks.stats import summarize
+
+
+def read_request_bodies(path):
+    """Lee cuerpos de petición en el formato de test.txt: objetos JSON seguidos."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    bodies = []
+    index = 0
+    while True:
+        while index < len(text) and text[index].isspace():
+            index += 1
+        if index >= len(text):
+            return bodies
+        body, index = decoder.raw_decode(text, index)
+        bodies.append(body)
+
+
+def jitter(body, rng, meters=300):
+    """Mismo par OD desplazado al azar unos metros: consulta "fría" para la caché."""
+    delta = meters / 111000
+    return {
+        **body,
+        "lat1": body["lat1"] + rng.uniform(-delta, delta),
+        "long1": body["long1"] + rng.uniform(-delta, delta),
+        "lat2": body["lat2"] + rng.uniform(-delta, delta),
+        "long2": body["long2"] + rng.uniform(-delta, delta),
+    }
+
+
+def mixed_workload(bodies, count, hot_ratio, seed):
+    """[(clase, cuerpo)]: "hot" repite pares conocidos, "cold" los desplaza."""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(count):
+        body = rng.choice(bodies)
+        if rng.random() < hot_ratio:
+            workload.append(("hot", body))
+        else:
+            workload.append(("cold", jitter(body, rng)))
+    return workload
+
+
+def post_json(url, body, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, TimeoutError):
+        return 0
+
+
+def run_load(url, workload, concurrency, timeout=30):
+    """
+    Dispara el workload con `concurrency` clientes concurrentes y devuelve
+    latencias por clase y conteo de códigos de estado (0 = error de red).
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def call(item):
+        kind, body = item
+        start = time.perf_counter()
+        status = post_json(url, body, timeout)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            entry = results.setdefault(kind, {"latencies": [], "status": {}})
+            entry["latencies"].append(elapsed)
+            entry["status"][status] = entry["status"].get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(call, workload))
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": len(workload),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(workload) / wall, 2) if wall else None,
+        "classes": {
+            kind: {**summarize(entry["latencies"]), "status": entry["status"]}
+            for kind, entry in results.items()
+        },
+    }
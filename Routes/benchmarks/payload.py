@@ -0,0 +1,60 @@
+import json
+import time
+
+from Routes.services.polyline import encode_polyline, simplify, tolerance_for_zoom
+
+
+def _timed_dumps(obj, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = json.dumps(obj)
+    return len(body.encode('utf-8')), (time.perf_counter() - start) / repeat
+
+
+def compare_polyline_payloads(paths, zooms=(None, 17, 15, 13), repeat=5):
+    """
+    Compara tamaño y tiempo de serialización del polyline clásico (lista de
+    {"lat", "lng"}) contra el encoded, con y sin simplificación por zoom.
+
+    `paths` es una lista de recorridos [(lat, lng), ...]. Devuelve una fila
+    por formato con bytes y milisegundos totales sobre todos los recorridos.
+    """
+    rows = []
+    baseline_bytes = 0
+    baseline_ms = 0.0
+    for coords in paths:
+        size, seconds = _timed_dumps(
+            {"polyline": [{"lat": lat, "lng": lng} for lat, lng in coords]}, repeat
+        )
+        baseline_bytes += size
+        baseline_ms += seconds * 1000
+    rows.append({
+        "format": "json",
+        "zoom": None,
+        "points": sum(len(coords) for coords in paths),
+        "bytes": baseline_bytes,
+        "ms": round(baseline_ms, 3),
+    })
+
+    for zoom in zooms:
+        total_bytes = 0
+        total_ms = 0.0
+        total_points = 0
+        for coords in paths:
+            start = time.perf_counter()
+            reduced = simplify(coords, tolerance_for_zoom(zoom)) if zoom is not None else coords
+            encoded = encode_polyline(reduced)
+            build_ms = (time.perf_counter() - start) * 1000
+            size, seconds = _timed_dumps({"polyline": encoded}, repeat)
+            total_bytes += size
+            total_ms += build_ms + seconds * 1000
+            total_points += len(reduced)
+        rows.append({
+            "format": "encoded",
+            "zoom": zoom,
+            "points": total_points,
+            "bytes": total_bytes,
+            "ms": round(total_ms, 3),
+            "bytes_ratio": round(total_bytes / baseline_bytes, 4) if baseline_bytes else None,
+        })
+    return rows
@@ -0,0 +1,259 @@
+import json
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from Routes.benchmarks.load import read_request_bodies
+from Routes.benchmarks.stats import summarize
+
+# Formato del log de reproducción: JSONL, un cuerpo de optimal-route por línea
+# con su marca de tiempo en "ts" (epoch en segundos o ISO 8601), p. ej.
+#   {"ts": "2025-06-01T08:00:01.250", "lat1": -16.35, "long1": -71.50, "lat2": -16.37, "long2": -71.52}
+# También se acepta el formato de test.txt (sin "ts"): se espacian a `interval` segundos.
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+
+def read_replay_log(path, interval=1.0):
+    """[(segundos desde el inicio, cuerpo)] ordenado por tiempo."""
+    entries = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    except json.JSONDecodeError:
+        entries = read_request_bodies(path)
+
+    if entries and all('ts' in body for body in entries):
+        stamped = sorted((_timestamp(body['ts']), body) for body in entries)
+        first = stamped[0][0]
+        return [
+            (ts - first, {k: v for k, v in body.items() if k != 'ts'})
+            for ts, body in stamped
+        ]
+    return [(i * interval, body) for i, body in enumerate(entries)]
+
+
+def repeat_log(entries, times):
+    """Repite el log `times` veces seguidas, desplazando las marcas de tiempo."""
+    if not entries or times <= 1:
+        return entries
+    gap = entries[-1][0] / (len(entries) - 1) if len(entries) > 1 else 0
+    span = entries[-1][0] + (gap or 1.0)
+    return [(offset + k * span, body) for k in range(times) for offset, body in entries]
+
+
+def parse_server_timing(header):
+    """({etapa: ms}, {contador: valor}) de una cabecera Server-Timing."""
+    stages = {}
+    counters = {}
+    for entry in filter(None, (part.strip() for part in header.split(','))):
+        name, _, params = entry.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                stages[name] = float(value)
+            elif key == 'desc':
+                counters[name] = value.strip('"')
+    return stages, counters
+
+
+def _timing_result(status, header):
+    stages, counters = parse_server_timing(header or '')
+    cache_hit = bool(counters.get('cache_hit')) if stages or counters else None
+    return status, cache_hit, stages
+
+
+class HttpTransport:
+    """Envía cada cuerpo por HTTP a un servidor en marcha (runserver, gunicorn)."""
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, body):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return _timing_result(response.status, response.headers.get('Server-Timing'))
+        except urllib.error.HTTPError as e:
+            return _timing_result(e.code, e.headers.get('Server-Timing'))
+        except (urllib.error.URLError, TimeoutError):
+            return 0, None, {}
+
+    def close(self):
+        pass
+
+
+class DjangoTransport:
+    """
+    Llama a la app en el mismo proceso con el cliente de pruebas de Django
+    (middlewares, vistas y BD reales, sin red). Un cliente por hilo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def send(self, body):
+        from django.test import Client
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        response = client.post(self.path, data=json.dumps(body), content_type='application/json')
+        return _timing_result(response.status_code, response.headers.get('Server-Timing'))
+
+    def close(self):
+        from django.db import connections
+
+        connections.close_all()
+
+
+class InMemoryTransport:
+    """
+    Sustituto en memoria de optimal-route/ sobre una ciudad sintética, sin
+    Django ni PostGIS: mismo flujo (caché LRU, búsquedas coalescidas, snap,
+    ruta directa y luego multimodal) para dimensionar concurrencia y caché.
+    """
+
+    def __init__(self, nodes=20000, routes=80, seed=42, cache_size=1024, cache_ttl=600, precision=4,
+                 walk_penalty=2.5):
+        from Routes.benchmarks.synthetic import city_grid
+        from Routes.services.graph_snapshot import attach_snapshot, write_snapshot
+        from Routes.services.route_cache import RouteCache
+        from Routes.services.single_flight import SingleFlight
+
+        city = city_grid(nodes=nodes, routes=routes, seed=seed)
+        self._root = tempfile.mkdtemp(prefix='graph-replay-')
+        write_snapshot(self._root, city.walking_graph(), city.route_store(), city.osm_ids(), city.route_names)
+        self.snapshot = attach_snapshot(self._root)
+        self.G = self.snapshot.transport_graph(walk_penalty)
+        self.walk_penalty = walk_penalty
+        self.precision = precision
+        self.cache = RouteCache(cache_size, cache_ttl)
+        self.flights = SingleFlight()
+
+    def send(self, body):
+        try:
+            point = tuple(round(float(body[k]), self.precision) for k in ('lat1', 'long1', 'lat2', 'long2'))
+        except (KeyError, TypeError, ValueError):
+            return 400, None, {}
+        key = point + (body.get('engine', 'networkx'),)
+        if self.cache.get(key) is not None:
+            return 200, True, {}
+        stages = {}
+        status = self.flights.do(key, self._compute, key, point, stages)
+        return status, False, stages
+
+    def _compute(self, key, point, stages):
+        from Routes.services.multi_source import multi_source_dijkstra_path
+        from Routes.services.path_finder import find_routes_with_transfers
+
+        start = time.perf_counter()
+        ids = self.snapshot.coords.ids
+        seeds = [
+            {int(ids[pos]): d * self.walk_penalty for pos, d in self.snapshot.walking.snap(lat, lng).items()}
+            for lat, lng in (point[:2], point[2:])
+        ]
+        stages['snap'] = (time.perf_counter() - start) * 1000
+        if not seeds[0] or not seeds[1]:
+            return 404
+
+        start = time.perf_counter()
+        found = find_routes_with_transfers(*seeds, max_transfers=0, store=self.snapshot.route_store)
+        stages['direct'] = (time.perf_counter() - start) * 1000
+        if not found:
+            start = time.perf_counter()
+            found = multi_source_dijkstra_path(self.G, *seeds)
+            stages['multimodal'] = (time.perf_counter() - start) * 1000
+            if not found:
+                return 404
+        self.cache.set(key, found)
+        return 200
+
+    def close(self):
+        shutil.rmtree(self._root, ignore_errors=True)
+
+
+def replay(entries, transport, concurrency=8, speed=1.0, debug=True):
+    """
+    Reproduce `entries` respetando sus tiempos divididos por `speed` (2.0 =
+    el doble de rápido; 0 = todo de inmediato). Es carga de lazo abierto: si
+    los clientes no dan abasto, las peticiones esperan y eso cuenta en la
+    latencia ("lag" es la espera antes de enviarse). Con `debug` se pide
+    Server-Timing para medir aciertos de caché y etapas del servidor.
+    """
+    records = []
+    lock = threading.Lock()
+
+    def call(due, body):
+        sent = time.perf_counter()
+        try:
+            status, cache_hit, stages = transport.send(body)
+        except Exception:
+            status, cache_hit, stages = 0, None, {}
+        done = time.perf_counter()
+        with lock:
+            records.append((status, cache_hit, stages, (done - due) * 1000, (done - sent) * 1000,
+                            (sent - due) * 1000))
+
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for offset, body in entries:
+            due = origin + (offset / speed if speed else 0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(call, due, {**body, "debug": True} if debug else body)
+    wall = time.perf_counter() - origin
+    return replay_report(records, wall, concurrency, speed)
+
+
+def replay_report(records, wall, concurrency, speed):
+    status = {}
+    stages = {}
+    hits = known = 0
+    for code, cache_hit, server_stages, _, _, _ in records:
+        status[code] = status.get(code, 0) + 1
+        if cache_hit is not None:
+            known += 1
+            hits += cache_hit
+        for name, ms in server_stages.items():
+            stages.setdefault(name, []).append(ms)
+
+    total = len(records)
+    errors = sum(n for code, n in status.items() if code == 0 or code >= 500)
+    client_errors = sum(n for code, n in status.items() if 400 <= code < 500)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "speed": speed,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "latency": summarize([r[3] for r in records]),
+        "service": summarize([r[4] for r in records]),
+        "lag": summarize([r[5] for r in records]),
+        "status": {str(code): n for code, n in sorted(status.items())},
+        "error_rate": round(errors / total, 4) if total else None,
+        "client_error_rate": round(client_errors / total, 4) if total else None,
+        "cache": {
+            "observed": known,
+            "hits": hits,
+            "hit_ratio": round(hits / known, 4) if known else None,
+        },
+        "server_stages": {name: summarize(samples) for name, samples in stages.items()},
+    }
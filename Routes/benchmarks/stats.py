@@ -0,0 +1,31 @@
+import math
+import time
+
+
+def percentile(sorted_samples, q):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Ejecuta fn y devuelve (resultado, milisegundos)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
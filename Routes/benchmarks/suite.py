@@ -0,0 +1,204 @@
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+from Routes.benchmarks.stats import summarize, timed
+from Routes.benchmarks.synthetic import city_grid
+from Routes.services.graph_snapshot import attach_snapshot, write_snapshot
+from Routes.services.multi_source import multi_source_dijkstra_path
+from Routes.services.path_finder import find_routes_with_transfers
+
+SCHEMA_VERSION = 2  # 2: direct/multimodal pasan a store_direct/transport_dijkstra
+
+# Mismos valores que Routes.views; se repiten para no cargar Django ni GeoDjango
+WALK_PENALTY = 2.5
+TRANSFER_PENALTY = 800
+MAX_TRANSFERS = 2
+
+
+def measure(fn, *args, **kwargs):
+    """
+    (resultado, {ms, peak_bytes}) de una fase de construcción. La fase se
+    ejecuta dos veces: una para el tiempo y otra bajo tracemalloc para el pico
+    de memoria, que de otro modo inflaría el tiempo medido.
+    """
+    result, ms = timed(fn, *args, **kwargs)
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {'ms': round(ms, 3), 'peak_bytes': peak}
+
+
+def operation_summary(samples_ms, found=None):
+    """Percentiles más throughput (operaciones por segundo, secuencial)."""
+    total_s = sum(samples_ms) / 1000
+    result = summarize(samples_ms)
+    result['ops_per_s'] = round(len(samples_ms) / total_s, 1) if total_s else None
+    if found is not None:
+        result['found'] = found
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_synthetic_suite(nodes=10000, edge_ratio=1.9, routes=60, pairs=200, seed=42,
+                        walk_penalty=WALK_PENALTY, transfer_penalty=TRANSFER_PENALTY,
+                        max_transfers=MAX_TRANSFERS):
+    """
+    Benchmark completo sobre una ciudad sintética, sin base de datos ni red:
+    construcción del grafo (RouteStore, capa peatonal, snapshot y DiGraph),
+    snapping y las búsquedas en memoria de `run_workload`. El resultado es
+    JSON estable (mismas llaves y semilla) para comparar commits.
+    """
+    city, generate = measure(
+        city_grid, nodes=nodes, edge_ratio=edge_ratio, routes=routes, seed=seed
+    )
+    store, build_store = measure(city.route_store)
+    walking, build_walking = measure(city.walking_graph)
+
+    root = tempfile.mkdtemp(prefix='graph-benchmark-')
+    try:
+        def write(parent):
+            # Un directorio por ejecución: measure() escribe el snapshot dos veces
+            directory = tempfile.mkdtemp(dir=parent)
+            write_snapshot(directory, walking, store, city.osm_ids(), city.route_names)
+            return directory
+
+        directory, snapshot_write = measure(write, root)
+        snapshot, attach = measure(attach_snapshot, directory)
+        G, transport = measure(snapshot.transport_graph, walk_penalty)
+        result = {
+            'schema': SCHEMA_VERSION,
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'networkx': nx.__version__,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'params': {
+                'nodes': nodes, 'edge_ratio': edge_ratio, 'routes': routes, 'pairs': pairs, 'seed': seed,
+                'walk_penalty': walk_penalty, 'transfer_penalty': transfer_penalty,
+                'max_transfers': max_transfers,
+            },
+            'graph': {
+                'nodes': city.node_count,
+                'street_edges': city.edge_count,
+                'patterns': len(store),
+                'bus_edges': store.edge_count,
+                'transport_edges': G.number_of_edges(),
+            },
+            'build': {
+                'generate': generate,
+                'route_store': build_store,
+                'walking_graph': build_walking,
+                'snapshot_write': snapshot_write,
+                'snapshot_attach': attach,
+                'transport_graph': transport,
+            },
+            'memory_bytes': {
+                'route_store': store.memory_footprint()['total'],
+                'walking_graph': walking.nbytes,
+                'snapshot': snapshot.nbytes,
+                'transport_graph_peak': transport['peak_bytes'],
+            },
+        }
+        result['operations'] = run_workload(
+            snapshot, G, city.od_pairs(pairs, seed), walk_penalty, transfer_penalty, max_transfers
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+def run_workload(snapshot, G, od_pairs, walk_penalty, transfer_penalty, max_transfers):
+    """
+    Búsquedas sin BD por par OD. No son find_best_direct_route ni
+    find_best_multimodal_route de las vistas (esas consultan RouteNode y
+    afinan con shortest_simple_paths); se nombran por lo que miden:
+    store_direct (RouteStore sin transbordos), transport_dijkstra (la
+    búsqueda multi-origen sobre el DiGraph, primera fase de la multimodal)
+    y transfers (motor de transbordos, igual que engine=transfers).
+    """
+    walking = snapshot.walking
+    store = snapshot.route_store
+    ids = snapshot.coords.ids
+    timings = {'snap': [], 'store_direct': [], 'transport_dijkstra': [], 'transfers': []}
+    found = {'store_direct': 0, 'transport_dijkstra': 0, 'transfers': 0}
+
+    for origin, destination in od_pairs:
+        seeds = []
+        for lat, lng in (origin, destination):
+            snapped, ms = timed(walking.snap, lat, lng)
+            timings['snap'].append(ms)
+            seeds.append({int(ids[pos]): dist * walk_penalty for pos, dist in snapped.items()})
+        sources, targets = seeds
+        if not sources or not targets:
+            continue
+
+        paths, ms = timed(
+            find_routes_with_transfers, sources, targets,
+            max_transfers=0, transfer_penalty=transfer_penalty, store=store
+        )
+        timings['store_direct'].append(ms)
+        found['store_direct'] += bool(paths)
+
+        path, ms = timed(multi_source_dijkstra_path, G, sources, targets)
+        timings['transport_dijkstra'].append(ms)
+        found['transport_dijkstra'] += path is not None
+
+        paths, ms = timed(
+            find_routes_with_transfers, sources, targets,
+            max_transfers=max_transfers, transfer_penalty=transfer_penalty, store=store
+        )
+        timings['transfers'].append(ms)
+        found['transfers'] += bool(paths)
+
+    return {
+        name: operation_summary(samples, found.get(name))
+        for name, samples in timings.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Routing benchmark over a synthetic city grid (no database needed)')
+    parser.add_argument('--nodes', type=int, default=10000, help='Approximate number of street nodes')
+    parser.add_argument('--edge-ratio', type=float, default=1.9, help='Street edges per node')
+    parser.add_argument('--routes', type=int, default=60, help='Bus routes (each one runs in both directions)')
+    parser.add_argument('--pairs', type=int, default=200, help='Number of random OD pairs')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the city and the OD workload')
+    parser.add_argument('--output', help='Write the JSON result to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    result = run_synthetic_suite(
+        nodes=args.nodes, edge_ratio=args.edge_ratio, routes=args.routes, pairs=args.pairs, seed=args.seed
+    )
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import math
+import random
+
+import numpy as np
+
+from Routes.services.coordinates import NodeCoordinates
+from Routes.services.graph_loader import RouteStore
+from Routes.services.walking_path import WalkingGraph
+
+EARTH_RADIUS = 6371008.8
+CENTER = (-16.3989, -71.5369)  # Plaza de Armas de Arequipa
+
+
+class SyntheticCity:
+    """
+    Ciudad sintética en grilla para benchmarks sin PostGIS: calles como
+    aristas de la grilla (algunas eliminadas, otras diagonales) y rutas de
+    bus en ambos sentidos que se superponen en las avenidas compartidas.
+    Los ids de nodo empiezan en 1, como en la base de datos.
+    """
+
+    def __init__(self, ids, lats, lngs, edge_source, edge_target, edge_distance, routes):
+        self.coords = NodeCoordinates(ids, lats, lngs)
+        self.edge_source = edge_source
+        self.edge_target = edge_target
+        self.edge_distance = edge_distance
+        self.routes = routes  # {route_id: [node_id, ...]} en el sentido de ida
+        self.route_names = {route_id: f'Ruta {route_id}' for route_id in routes}
+        self._distance = dict(zip(
+            zip(edge_source.tolist(), edge_target.tolist()), edge_distance.tolist()
+        ))
+
+    @property
+    def node_count(self):
+        return len(self.coords)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_source)
+
+    def osm_ids(self):
+        return np.array([str(i).encode() for i in self.coords.ids.tolist()], dtype=np.bytes_)
+
+    def walking_graph(self):
+        return WalkingGraph(self.coords, self.edge_source, self.edge_target, self.edge_distance)
+
+    def route_store(self):
+        """RouteStore con ida (direction 0) y vuelta (direction 1) de cada ruta."""
+        patterns = []
+        edge_pattern, sources, targets, distances = [], [], [], []
+        for route_id, nodes in self.routes.items():
+            for direction, sequence in enumerate((nodes, nodes[::-1])):
+                pattern = len(patterns)
+                patterns.append((route_id, direction))
+                for u, v in zip(sequence, sequence[1:]):
+                    edge_pattern.append(pattern)
+                    sources.append(u)
+                    targets.append(v)
+                    distances.append(self.street_distance(u, v))
+        return RouteStore(patterns, edge_pattern, sources, targets, distances)
+
+    def street_distance(self, u, v):
+        d = self._distance.get((u, v))
+        return d if d is not None else self._distance[(v, u)]
+
+    def od_pairs(self, count, seed=42):
+        """Puntos (lat, lng) aleatorios dentro de la ciudad, como pares origen-destino."""
+        rng = random.Random(seed)
+        lat_min, lat_max = float(self.coords.lats.min()), float(self.coords.lats.max())
+        lng_min, lng_max = float(self.coords.lngs.min()), float(self.coords.lngs.max())
+
+        def sample():
+            return rng.uniform(lat_min, lat_max), rng.uniform(lng_min, lng_max)
+
+        return [(sample(), sample()) for _ in range(count)]
+
+
+def city_grid(nodes=10000, edge_ratio=1.9, routes=60, spacing=90.0, jitter=0.2, seed=42, center=CENTER):
+    """
+    Genera una SyntheticCity de ~`nodes` nodos en grilla cuadrada con
+    ~`edge_ratio * nodes` calles. Con edge_ratio < 2 se eliminan calles al
+    azar (sin tocar las que usan los buses); por encima de 2 se agregan
+    diagonales. Cada ruta es un recorrido en escalera entre dos bordes
+    opuestos, así que las rutas comparten tramos como en el centro real.
+    """
+    rng = random.Random(seed)
+    side = max(2, int(math.ceil(math.sqrt(nodes))))
+    n = side * side
+
+    # Posiciones en metros con ruido, convertidas a lat/lng alrededor del centro
+    xy = np.random.default_rng(seed).normal(0, jitter * spacing, size=(n, 2))
+    grid = np.arange(n)
+    x = (grid % side - side / 2) * spacing + xy[:, 0]
+    y = (grid // side - side / 2) * spacing + xy[:, 1]
+    lat0, lng0 = center
+    lats = lat0 + np.degrees(y / EARTH_RADIUS)
+    lngs = lng0 + np.degrees(x / (EARTH_RADIUS * math.cos(math.radians(lat0))))
+
+    def node(col, row):
+        return row * side + col + 1
+
+    route_nodes = {}
+    for route_id in range(1, routes + 1):
+        route_nodes[route_id] = _staircase(rng, side, node)
+
+    lattice = set()
+    for row in range(side):
+        for col in range(side):
+            if col + 1 < side:
+                lattice.add((node(col, row), node(col + 1, row)))
+            if row + 1 < side:
+                lattice.add((node(col, row), node(col, row + 1)))
+    required = set()
+    for sequence in route_nodes.values():
+        for u, v in zip(sequence, sequence[1:]):
+            required.add((min(u, v), max(u, v)))
+
+    target = int(edge_ratio * n)
+    optional = sorted(lattice - required)
+    rng.shuffle(optional)
+    keep = max(0, min(len(optional), target - len(required)))
+    edges = sorted(required) + optional[:keep]
+    extra = target - len(edges)
+    if extra > 0:
+        diagonals = set()
+        while len(diagonals) < min(extra, 2 * (side - 1) ** 2):
+            col, row = rng.randrange(side - 1), rng.randrange(side - 1)
+            if rng.random() < 0.5:
+                diagonals.add((node(col, row), node(col + 1, row + 1)))
+            else:
+                diagonals.add((node(col + 1, row), node(col, row + 1)))
+        edges += sorted(diagonals)
+
+    source = np.array([u for u, _ in edges], dtype=np.int64)
+    dest = np.array([v for _, v in edges], dtype=np.int64)
+    distance = np.hypot(x[source - 1] - x[dest - 1], y[source - 1] - y[dest - 1])
+    return SyntheticCity(grid + 1, lats, lngs, source, dest, distance, route_nodes)
+
+
+def _staircase(rng, side, node):
+    """Recorrido de un borde al opuesto avanzando en x o y al azar (sin retrocesos)."""
+    if rng.random() < 0.5:
+        col, row = 0, rng.randrange(side)
+        end_col, end_row = side - 1, rng.randrange(side)
+    else:
+        col, row = rng.randrange(side), 0
+        end_col, end_row = rng.randrange(side), side - 1
+    sequence = [node(col, row)]
+    while (col, row) != (end_col, end_row):
+        # Tramos largos sobre la misma calle, como una avenida
+        horizontal = row == end_row or (col != end_col and rng.random() < 0.5)
+        for _ in range(rng.randint(1, 6)):
+            if horizontal and col != end_col:
+                col += 1 if end_col > col else -1
+            elif not horizontal and row != end_row:
+                row += 1 if end_row > row else -1
+            else:
+                break
+            sequence.append(node(col, row))
+    return sequence
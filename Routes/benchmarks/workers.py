@@ -0,0 +1,107 @@
+import gc
+import os
+
+import numpy as np
+
+from Routes.services.graph_snapshot import GraphSnapshot, attach_snapshot
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+PAGE = 4096
+
+
+def smaps_rollup(pid):
+    """Rss, Pss y Shared/Private_* (bytes) de /proc/<pid>/smaps_rollup (Linux 4.14+)."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in SMAPS_FIELDS:
+                values[name] = int(rest.split()[0]) * 1024
+    return values
+
+
+def _worker(root, copy, walk_penalty, ready, go):
+    """
+    Cuerpo de un worker: adjunta el snapshot, arma su DiGraph y toca todas
+    las páginas de los arreglos. Con `copy` el snapshot se rearma sobre
+    copias de los arreglos en el heap del proceso (y se suelta el mmap),
+    como si el worker los cargara de la BD; el resto es igual.
+    Avisa por `ready` y espera a `go` para que el padre lo mida vivo.
+    """
+    status = b'0'
+    try:
+        snapshot = attach_snapshot(root)
+        if copy:
+            mapped = snapshot
+            snapshot = GraphSnapshot(
+                mapped.directory, mapped.manifest,
+                {name: np.array(array) for name, array in mapped.arrays.items()},
+            )
+            del mapped
+            gc.collect()
+        G = snapshot.transport_graph(walk_penalty)
+        for array in snapshot.arrays.values():
+            if array.nbytes:
+                np.frombuffer(np.ascontiguousarray(array), dtype=np.uint8)[::PAGE].sum()
+        status = b'1'
+        os.write(ready, status)
+        os.read(go, 1)
+        del G
+    finally:
+        if status == b'0':
+            os.write(ready, status)
+        os._exit(0)
+
+
+def measure_workers(root, workers, copy=False, walk_penalty=2.5):
+    """
+    Forkea `workers` procesos que adjuntan el snapshot de `root` (o lo copian,
+    con `copy`) y suma lo que /proc/<pid>/smaps_rollup dice de cada uno. Pss
+    reparte las páginas compartidas entre quienes las mapean, así que la
+    suma de Pss es la memoria real del conjunto de workers.
+    """
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    pids = []
+    try:
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                os.close(ready_r)
+                os.close(go_w)
+                _worker(root, copy, walk_penalty, ready_w, go_r)
+            pids.append(pid)
+        os.close(ready_w)
+        os.close(go_r)
+        for _ in pids:
+            if os.read(ready_r, 1) != b'1':
+                raise RuntimeError('Un worker del benchmark de memoria falló al adjuntar el snapshot')
+        rollups = [smaps_rollup(pid) for pid in pids]
+    finally:
+        os.write(go_w, b'x' * len(pids))
+        os.close(go_w)
+        os.close(ready_r)
+        for pid in pids:
+            os.waitpid(pid, 0)
+    totals = {name.lower() + '_bytes': sum(r.get(name, 0) for r in rollups) for name in SMAPS_FIELDS}
+    totals['per_worker_pss_bytes'] = totals['pss_bytes'] // max(workers, 1)
+    return totals
+
+
+def memory_report(root, worker_counts, walk_penalty=2.5):
+    """
+    Memoria medida por número de workers: cada worker con su propia copia de
+    los arreglos (línea base) contra el snapshot compartido por mmap. El
+    DiGraph de networkx es privado en ambos casos: el snapshot no lo reduce.
+    """
+    report = []
+    for n in worker_counts:
+        baseline = measure_workers(root, n, copy=True, walk_penalty=walk_penalty)
+        shared = measure_workers(root, n, copy=False, walk_penalty=walk_penalty)
+        report.append({
+            'workers': n,
+            'per_worker_copy': baseline,
+            'shared_snapshot': shared,
+            'saved_pss_bytes': baseline['pss_bytes'] - shared['pss_bytes'],
+        })
+    return report
@@ -0,0 +1,56 @@
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from Routes.services.geo_export import FORMATS, LAYERS, batched, export_features
+
+
+def error_response(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def parse_ids(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+async def aiter_batches(batches):
+    """
+    Con ASGI, Django consume los iteradores síncronos completos en memoria
+    antes de responder; aquí cada bloque se lee en el hilo de la petición
+    (thread_sensitive), que es el dueño de la conexión a la BD.
+    """
+    iterator = iter(batches)
+    next_batch = sync_to_async(lambda: next(iterator, None))
+    while (batch := await next_batch()) is not None:
+        yield batch
+
+
+@require_GET
+def export_view(request, layer):
+    """
+    Exporta nodes, edges o routes como GeoJSON sequence (?format=geojsonseq,
+    por defecto) o NDJSON, con filtros opcionales ?bbox=min_lng,min_lat,max_lng,max_lat
+    y ?route=1,2. La respuesta se transmite mientras se lee la base de datos.
+    """
+    if layer not in LAYERS:
+        raise Http404("Capa desconocida")
+    fmt = request.GET.get('format', 'geojsonseq')
+    if fmt not in FORMATS:
+        return error_response(f"format debe ser uno de: {', '.join(FORMATS)}")
+    try:
+        bbox = tuple(float(v) for v in request.GET['bbox'].split(',')) if 'bbox' in request.GET else None
+        route_ids = parse_ids(request.GET['route']) if 'route' in request.GET else None
+    except ValueError:
+        return error_response("bbox y route deben ser numéricos")
+    if bbox is not None and len(bbox) != 4:
+        return error_response("bbox debe tener 4 valores")
+
+    content = batched(export_features(layer, fmt, bbox=bbox, route_ids=route_ids))
+    if isinstance(request, ASGIRequest):
+        content = aiter_batches(content)
+    response = StreamingHttpResponse(content, content_type=FORMATS[fmt][1])
+    extension = 'geojsons' if fmt == 'geojsonseq' else 'ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{layer}.{extension}"'
+    return response
@@ -0,0 +1,234 @@
+import json
+import random
+import shutil
+import tempfile
+import time
+
+import networkx as nx
+from django.core.management.base import BaseCommand
+
+from Routes.benchmarks.payload import compare_polyline_payloads
+from Routes.benchmarks.stats import summarize, timed
+from Routes.benchmarks.suite import measure, run_synthetic_suite
+from Routes.benchmarks.workers import memory_report
+from Routes.services.graph_loader import build_graphs, load_route_store
+from Routes.services.graph_snapshot import (
+    attach_snapshot, build_snapshot, load_osm_ids, load_route_names, transport_digraph,
+)
+from Routes.services.path_finder import find_routes_with_transfers
+from Routes.services.walking_path import load_walking_graph
+from Routes.views import MAX_TRANSFERS, TRANSFER_PENALTY, WALK_PENALTY, build_transport_graph, find_best_route_with_penalty
+
+
+class Command(BaseCommand):
+    help = 'Benchmark routing against the graph stored in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suite',
+            choices=['payload', 'engines', 'walking', 'memory', 'synthetic', 'build', 'connections'],
+            default='payload',
+            help='Benchmark suite to run'
+        )
+        parser.add_argument('--pairs', type=int, default=50, help='Number of random OD pairs')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the OD workload')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4, 8],
+            help='Worker counts for the memory report'
+        )
+        parser.add_argument('--nodes', type=int, default=10000, help='Street nodes of the synthetic city')
+        parser.add_argument('--routes', type=int, default=60, help='Bus routes of the synthetic city')
+        parser.add_argument('--output', help='Also write the JSON result to this file')
+
+    def handle(self, *args, **options):
+        if options['suite'] == 'memory':
+            self.stdout.write(json.dumps(self.memory_suite(options['workers']), indent=2))
+            return
+        if options['suite'] == 'connections':
+            self.stdout.write(json.dumps(self.connections_suite(options['pairs'], options['seed']), indent=2))
+            return
+        if options['suite'] == 'build':
+            self.stdout.write(json.dumps(self.build_suite(), indent=2))
+            return
+        if options['suite'] == 'synthetic':
+            # Ciudad generada en memoria: no consulta la base de datos
+            result = run_synthetic_suite(
+                nodes=options['nodes'], routes=options['routes'], pairs=options['pairs'],
+                seed=options['seed'], walk_penalty=WALK_PENALTY, transfer_penalty=TRANSFER_PENALTY,
+                max_transfers=MAX_TRANSFERS
+            )
+            if options['output']:
+                with open(options['output'], 'w') as f:
+                    json.dump(result, f, indent=2)
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write('Building transport graph...')
+        G = build_transport_graph()
+        rng = random.Random(options['seed'])
+
+        if options['suite'] == 'payload':
+            result = self.payload_suite(G, self.sample_pairs(sorted(G.nodes), rng, options['pairs']))
+        elif options['suite'] == 'engines':
+            store = build_graphs()
+            # Solo pares servidos por buses, que ambos motores pueden resolver
+            result = self.engines_suite(G, self.sample_pairs(store.node_ids.tolist(), rng, options['pairs']))
+            result['route_store_bytes'] = store.memory_footprint()
+        elif options['suite'] == 'walking':
+            result = self.walking_suite(G, self.sample_pairs(sorted(G.nodes), rng, options['pairs']))
+
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def sample_pairs(self, nodes, rng, count):
+        return [tuple(rng.sample(nodes, 2)) for _ in range(count)]
+
+    def payload_suite(self, G, pairs):
+        paths = []
+        for origin, destination in pairs:
+            try:
+                path = nx.dijkstra_path(G, origin, destination, weight='weight')
+            except nx.NetworkXNoPath:
+                continue
+            coords = G.graph['coords'].lookup(path)
+            paths.append([coords[n] for n in path])
+        self.stdout.write(f'Comparing polyline payloads over {len(paths)} paths')
+        return compare_polyline_payloads(paths)
+
+    def engines_suite(self, G, pairs):
+        self.stdout.write(f'Comparing routing engines over {len(pairs)} OD pairs')
+        timings = {'networkx': [], 'transfers': []}
+        found = {'networkx': 0, 'transfers': 0}
+        for origin, destination in pairs:
+            path, ms = timed(find_best_route_with_penalty, G, origin, destination)
+            timings['networkx'].append(ms)
+            found['networkx'] += path is not None
+            results, ms = timed(
+                find_routes_with_transfers, {origin: 0}, {destination: 0},
+                max_transfers=MAX_TRANSFERS, transfer_penalty=TRANSFER_PENALTY
+            )
+            timings['transfers'].append(ms)
+            found['transfers'] += bool(results)
+        return {
+            engine: {**summarize(samples), 'found': found[engine]}
+            for engine, samples in timings.items()
+        }
+
+    def walking_suite(self, G, pairs):
+        W, build_ms = timed(load_walking_graph)
+        self.stdout.write(f'Comparing walking router and multimodal search over {len(pairs)} OD pairs')
+        timings = {'walking': [], 'multimodal': []}
+        for origin, destination in pairs:
+            positions = W.coords.positions([origin, destination]).tolist()
+            _, ms = timed(W.shortest_path, {positions[0]: 0}, {positions[1]: 0})
+            timings['walking'].append(ms)
+            _, ms = timed(find_best_route_with_penalty, G, origin, destination)
+            timings['multimodal'].append(ms)
+        result = {name: summarize(samples) for name, samples in timings.items()}
+        result['walking_graph'] = {'build_ms': round(build_ms, 3), 'bytes': W.nbytes}
+        return result
+
+    def build_suite(self):
+        """
+        Construcción del grafo desde la BD: carga anterior (instancias de
+        modelos con geometrías GEOS) contra la carga por columnas a arreglos.
+        """
+        self.stdout.write('Building transport graph from model instances and from streamed columns...')
+        legacy, legacy_stats = measure(legacy_transport_graph)
+        streamed, streamed_stats = measure(streamed_transport_graph)
+        return {
+            name: {**stats, 'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+            for name, G, stats in (
+                ('model_instances', legacy, legacy_stats),
+                ('streamed_columns', streamed, streamed_stats),
+            )
+        }
+
+    def connections_suite(self, requests, seed):
+        """
+        Costo de conexión por petición: "reconnect" cierra la conexión al final
+        de cada petición (lo que hace CONN_MAX_AGE=0; con DB_POOL=1 la devuelve
+        al pool) y "persistent" la reutiliza. Cada petición hace las consultas
+        de snapping y de RouteNode de una ruta directa.
+        """
+        from django.db import connection
+        from Routes.models import RouteNode
+        from Routes.views import get_nearby_nodes
+
+        rng = random.Random(seed)
+        points = [(rng.uniform(-16.43, -16.36), rng.uniform(-71.58, -71.50)) for _ in range(requests)]
+        settings_dict = connection.settings_dict
+        result = {
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'pool': settings_dict['OPTIONS'].get('pool', False),
+            'host': settings_dict['HOST'],
+        }
+        self.stdout.write(f"Measuring connection overhead over {requests} requests against {settings_dict['HOST']}")
+        for mode in ('reconnect', 'persistent'):
+            connect_ms, request_ms = [], []
+            connection.close()
+            for lat, lng in points:
+                start = time.perf_counter()
+                connection.ensure_connection()
+                connected = time.perf_counter()
+                nodes = get_nearby_nodes(lat, lng)
+                list(RouteNode.objects.filter(node_id__in=[n.id for n in nodes]).values_list(
+                    'route_id', 'direction', 'node_id', 'order'
+                ))
+                if mode == 'reconnect':
+                    connection.close()
+                done = time.perf_counter()
+                connect_ms.append((connected - start) * 1000)
+                request_ms.append((done - start) * 1000)
+            result[mode] = {'connect': summarize(connect_ms), 'request': summarize(request_ms)}
+        return result
+
+    def memory_suite(self, worker_counts):
+        """
+        Memoria medida (Pss de /proc/<pid>/smaps_rollup) de N workers forkeados:
+        cada uno con su copia de los arreglos contra el snapshot compartido.
+        El DiGraph de networkx es privado en ambos casos.
+        """
+        from django.db import connections
+
+        root = tempfile.mkdtemp(prefix='graph-snapshot-')
+        try:
+            build_snapshot(root)
+            shared = attach_snapshot(root).nbytes
+            # Los workers forkeados no deben heredar la conexión abierta
+            connections.close_all()
+            workers = memory_report(root, worker_counts, WALK_PENALTY)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        return {'shared_arrays_bytes': shared, 'workers': workers}
+
+
+def streamed_transport_graph():
+    """Igual que build_transport_graph, pero siempre desde la BD y sin guardar globales."""
+    walking = load_walking_graph()
+    return transport_digraph(
+        walking, load_route_store(), load_osm_ids(walking.coords), load_route_names(), WALK_PENALTY
+    )
+
+
+def legacy_transport_graph():
+    """La carga anterior de build_transport_graph, como referencia del benchmark."""
+    from Nodes.models import Edge, Node
+    from Routes.models import RouteEdge
+
+    G = nx.DiGraph()
+    for node in Node.objects.all():
+        G.add_node(node.id, osm_id=node.osm_id, location=(node.location.y, node.location.x))
+    for edge in Edge.objects.all():
+        G.add_edge(edge.source_id, edge.target_id, weight=edge.distance * WALK_PENALTY, type='walk')
+        G.add_edge(edge.target_id, edge.source_id, weight=edge.distance * WALK_PENALTY, type='walk')
+    for route_edge in RouteEdge.objects.select_related('edge', 'route'):
+        edge = route_edge.edge
+        G.add_edge(
+            edge.source_id, edge.target_id, weight=edge.distance, type='bus',
+            route_id=route_edge.route_id, route_name=route_edge.route.name,
+            direction=route_edge.direction, order=route_edge.order
+        )
+    return G
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from Routes.services.graph_snapshot import attach_snapshot, build_snapshot
+
+class Command(BaseCommand):
+    help = 'Build the shared read-only routing graph snapshot (for sidecar deployments)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            type=str,
+            default=None,
+            help='Snapshot directory (defaults to ROUTING_SNAPSHOT_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        root = options['dir'] or settings.ROUTING_SNAPSHOT_DIR
+        if not root:
+            raise CommandError('Set ROUTING_SNAPSHOT_DIR or pass --dir')
+        self.stdout.write(f'Building graph snapshot in {root}...')
+        version = build_snapshot(root)
+        snapshot = attach_snapshot(root)
+        self.stdout.write(self.style.SUCCESS(
+            f'Published snapshot {version}: {len(snapshot.coords)} nodes, '
+            f'{snapshot.walking.edge_count} street edges, {snapshot.route_store.edge_count} bus edges, '
+            f'{snapshot.nbytes} bytes'
+        ))
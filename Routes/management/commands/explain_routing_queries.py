@@ -0,0 +1,78 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Routes.models import RouteEdge, RouteNode
+
+
+class Command(BaseCommand):
+    help = 'Show EXPLAIN ANALYZE plans for the routing and graph-load queries and check which use index-only scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=30, help='Access nodes per lookup (like MAX_SNAP_NODES)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the sampled nodes and route')
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Run VACUUM ANALYZE on route_nodes/route_edges first (index-only scans need the visibility map)'
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                for table in (RouteNode._meta.db_table, RouteEdge._meta.db_table):
+                    self.stdout.write(f'VACUUM ANALYZE {table}...')
+                    cursor.execute(f'VACUUM ANALYZE {table}')
+
+        rng = random.Random(options['seed'])
+        node_ids = list(RouteNode.objects.order_by().values_list('node_id', flat=True).distinct())
+        patterns = list(RouteEdge.objects.order_by().values_list('route_id', 'direction').distinct())
+        if not node_ids or not patterns:
+            self.stdout.write(self.style.WARNING('route_nodes/route_edges are empty; import routes first'))
+            return
+        sample = rng.sample(node_ids, min(options['nodes'], len(node_ids)))
+        route_id, direction = rng.choice(patterns)
+
+        # (nombre, queryset, plan esperado)
+        queries = [
+            (
+                'direct route: patterns at access nodes',
+                RouteNode.objects.filter(node_id__in=sample).values_list('route_id', 'direction', 'node_id', 'order'),
+                'Index Only Scan',
+            ),
+            (
+                'direct route: edges of one pattern',
+                RouteEdge.objects.filter(route_id=route_id, direction=direction).values_list(
+                    'edge__source_id', 'edge__target_id', 'edge__distance'
+                ),
+                'Index Only Scan',
+            ),
+            (
+                'graph load: all route edges',
+                RouteEdge.objects.order_by().values_list(
+                    'route_id', 'direction', 'edge__source_id', 'edge__target_id', 'edge__distance'
+                ),
+                # Lee la tabla completa: un Seq Scan sin Sort es lo esperado
+                'Seq Scan',
+            ),
+        ]
+
+        self.stdout.write(
+            f'{len(node_ids)} routed nodes, {len(patterns)} patterns; '
+            f'sampled {len(sample)} nodes and pattern ({route_id}, {direction})'
+        )
+        for name, queryset, expected in queries:
+            plan = queryset.explain(analyze=True, buffers=True)
+            ok = expected in plan and 'Sort' not in plan
+            style = self.style.SUCCESS if ok else self.style.WARNING
+            self.stdout.write(style(f"\n[{'ok' if ok else 'check'}] {name} (expected: {expected}, no Sort)"))
+            lines = plan.splitlines()
+            for line in lines if options['verbose_plans'] else self._summary(lines):
+                self.stdout.write(f'    {line}')
+
+    def _summary(self, lines):
+        """Nodos de acceso a tablas/índices, ordenamientos y tiempos del plan."""
+        keys = ('Scan', 'Sort', 'Heap Fetches', 'Execution Time', 'Planning Time')
+        return [line.strip() for line in lines if any(key in line for key in keys)]
@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Routes.services.geo_export import CHUNK_SIZE, FORMATS, LAYERS, export_features
+
+PROGRESS_EVERY = 50000
+
+
+class Command(BaseCommand):
+    help = 'Stream nodes, edges or routes as GeoJSON sequence or NDJSON with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('layer', choices=LAYERS)
+        parser.add_argument('--format', choices=list(FORMATS), default='geojsonseq')
+        parser.add_argument('--bbox', type=str, default=None, help='min_lng,min_lat,max_lng,max_lat')
+        parser.add_argument('--route', type=int, action='append', default=None,
+                            help='Only this route (repeatable); nodes/edges are those used by the routes')
+        parser.add_argument('--output', '-o', type=str, default=None, help='Output file (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per keyset page')
+
+    def handle(self, *args, **options):
+        bbox = None
+        if options['bbox']:
+            try:
+                bbox = tuple(float(v) for v in options['bbox'].split(','))
+            except ValueError:
+                raise CommandError('--bbox must be four numbers')
+            if len(bbox) != 4:
+                raise CommandError('--bbox must be four numbers')
+
+        stats = {}
+        records = export_features(
+            options['layer'], options['format'], bbox=bbox, route_ids=options['route'],
+            chunk_size=options['chunk_size'], stats=stats,
+        )
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        start = time.perf_counter()
+        try:
+            for count, record in enumerate(records, 1):
+                out.write(record)
+                if count % PROGRESS_EVERY == 0:
+                    elapsed = time.perf_counter() - start
+                    self.stderr.write(f'  {count} features ({count / elapsed:.0f}/s)')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        rate = stats['features'] / stats['seconds'] if stats['seconds'] else 0
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {stats['features']} {options['layer']} in {stats['seconds']:.1f}s ({rate:.0f} features/s)"
+        ))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from Routes.import_routes import import_routes_from_json
+from Routes.services.route_patterns import refresh_route_patterns
 
 class Command(BaseCommand):
     help = 'Import routes from JSON file'
@@ -11,4 +12,6 @@ class Command(BaseCommand):
         json_file = options['json_file']
         self.stdout.write(self.style.SUCCESS(f'Starting import from {json_file}'))
         import_routes_from_json(json_file)
-        self.stdout.write(self.style.SUCCESS('Import completed')) 
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Import completed'))
+        count = refresh_route_patterns()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} route patterns'))
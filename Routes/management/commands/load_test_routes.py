@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from Routes.benchmarks.load import mixed_workload, read_request_bodies, run_load
+
+
+class Command(BaseCommand):
+    help = 'Send mixed cached/uncached routing traffic to a running server and report tail latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='http://127.0.0.1:8000/routes/optimal-route-async/',
+            help='Routing endpoint to load'
+        )
+        parser.add_argument('--bodies', type=str, default='test.txt', help='File with request bodies (test.txt format)')
+        parser.add_argument('--requests', type=int, default=500, help='Total number of requests')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--hot-ratio', type=float, default=0.8, help='Share of repeated (cacheable) queries')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the workload')
+
+    def handle(self, *args, **options):
+        bodies = read_request_bodies(options['bodies'])
+        workload = mixed_workload(bodies, options['requests'], options['hot_ratio'], options['seed'])
+        self.stdout.write(f"Sending {len(workload)} requests to {options['url']}...")
+        result = run_load(options['url'], workload, options['concurrency'])
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,57 @@
+import glob
+import io
+import json
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Aggregate saved routing request profiles into the top-N hot functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', type=str, default=None, help='Profile directory (default: ROUTING_PROFILE_DIR)')
+        parser.add_argument('--top', type=int, default=25, help='Number of functions to list')
+        parser.add_argument(
+            '--sort',
+            choices=['cumulative', 'tottime', 'ncalls'],
+            default='tottime',
+            help='Sort key for the hot-function table'
+        )
+        parser.add_argument('--min-ms', type=float, default=0, help='Only include requests slower than this')
+        parser.add_argument('--slowest', type=int, default=10, help='Number of slowest requests to list')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.ROUTING_PROFILE_DIR
+        if not directory or not os.path.isdir(directory):
+            raise CommandError('No profile directory; pass --dir or set ROUTING_PROFILE_DIR')
+
+        requests = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.prof'))):
+            meta_path = path[:-len('.prof')] + '.json'
+            meta = {}
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+            if meta.get('elapsed_ms', 0) >= options['min_ms']:
+                requests.append((path, meta))
+        if not requests:
+            raise CommandError(f'No profiles found in {directory}')
+
+        buffer = io.StringIO()
+        stats = pstats.Stats(*[path for path, _ in requests], stream=buffer)
+        self.stdout.write(f'{len(requests)} profiled requests, {stats.total_tt * 1000:.1f} ms profiled in total')
+
+        self.stdout.write('\nSlowest requests:')
+        slowest = sorted(requests, key=lambda item: item[1].get('elapsed_ms', 0), reverse=True)
+        for path, meta in slowest[:options['slowest']]:
+            self.stdout.write(
+                f"  {meta.get('elapsed_ms', '?'):>10} ms  {meta.get('trigger', '?'):<9} "
+                f"{os.path.basename(path)}  {json.dumps(meta.get('params', {}), ensure_ascii=False)}"
+            )
+
+        self.stdout.write(f"\nTop {options['top']} functions by {options['sort']}:")
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(buffer.getvalue())
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from Routes.benchmarks.replay import (
+    DjangoTransport, HttpTransport, InMemoryTransport, read_replay_log, repeat_log, replay,
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay a recorded log of routing requests with its original timing and report capacity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', type=str, default='test.txt', help='JSONL log with "ts" per line, or test.txt format')
+        parser.add_argument(
+            '--target',
+            choices=['http', 'inprocess', 'memory'],
+            default='inprocess',
+            help='http: running server; inprocess: Django test client against the configured DB; '
+                 'memory: synthetic in-memory graph, no DB'
+        )
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='http://127.0.0.1:8000/routes/optimal-route/',
+            help='Endpoint for --target http'
+        )
+        parser.add_argument('--path', type=str, default='/routes/optimal-route/', help='Path for --target inprocess')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--speed', type=float, default=1.0, help='Time compression (2 = twice as fast, 0 = no waits)')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between requests when the log has no timestamps')
+        parser.add_argument('--repeat', type=int, default=1, help='Replay the log this many times back to back')
+        parser.add_argument('--nodes', type=int, default=20000, help='Street nodes of the synthetic graph (--target memory)')
+        parser.add_argument('--no-debug', action='store_true', help='Do not ask the server for Server-Timing data')
+        parser.add_argument('--output', type=str, help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        entries = repeat_log(read_replay_log(options['log'], options['interval']), options['repeat'])
+        if options['target'] == 'http':
+            transport = HttpTransport(options['url'])
+        elif options['target'] == 'inprocess':
+            transport = DjangoTransport(options['path'])
+        else:
+            self.stdout.write('Building synthetic graph...')
+            transport = InMemoryTransport(nodes=options['nodes'])
+
+        self.stdout.write(f"Replaying {len(entries)} requests ({options['target']}, x{options['speed']})...")
+        try:
+            result = replay(entries, transport, options['concurrency'], options['speed'], not options['no_debug'])
+        finally:
+            transport.close()
+        result['log'] = options['log']
+        result['target'] = options['target']
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Routes.services.vector_tiles import MAX_ZOOM, get_tile, get_tile_source, tiles_covering
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the vector tiles of the city into the disk cache (ROUTING_TILES_DIR)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-zoom', type=int, default=11)
+        parser.add_argument('--max-zoom', type=int, default=16)
+        parser.add_argument(
+            '--bbox',
+            type=str,
+            default=None,
+            help='min_lng,min_lat,max_lng,max_lat (defaults to the extent of all nodes)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['auto', 'postgis', 'python'],
+            default=None,
+            help='Tile engine (defaults to ROUTING_TILES_ENGINE)'
+        )
+        parser.add_argument('--dir', type=str, default=None, help='Cache directory (defaults to ROUTING_TILES_DIR)')
+        parser.add_argument('--force', action='store_true', help='Re-render tiles that are already cached')
+
+    def handle(self, *args, **options):
+        root = options['dir'] or settings.ROUTING_TILES_DIR
+        if not root:
+            raise CommandError('Set ROUTING_TILES_DIR or pass --dir')
+        if not 0 <= options['min_zoom'] <= options['max_zoom'] <= MAX_ZOOM:
+            raise CommandError(f'Zoom range must be within 0..{MAX_ZOOM}')
+
+        source = get_tile_source(options['engine'])
+        if options['bbox']:
+            try:
+                bbox = tuple(float(v) for v in options['bbox'].split(','))
+            except ValueError:
+                raise CommandError('--bbox must be four numbers')
+            if len(bbox) != 4:
+                raise CommandError('--bbox must be four numbers')
+        else:
+            bbox = source.bbox()
+            if bbox is None:
+                raise CommandError('There are no nodes; import the street network first')
+
+        version = source.version()
+        self.stdout.write(f'Seeding {source.engine} tiles for graph {version} over {bbox} into {root}')
+        total_start = time.perf_counter()
+        total_tiles = 0
+        for z in range(options['min_zoom'], options['max_zoom'] + 1):
+            start = time.perf_counter()
+            rendered = cached = empty = size = 0
+            for x, y in tiles_covering(bbox, z):
+                data, _, _, hit = get_tile(z, x, y, engine=source.engine, cache_dir=root, refresh=options['force'])
+                cached += hit
+                rendered += not hit
+                empty += not data
+                size += len(data)
+            elapsed = time.perf_counter() - start
+            total_tiles += rendered + cached
+            self.stdout.write(
+                f'  z{z}: {rendered} rendered, {cached} already cached, {empty} empty, '
+                f'{size / 1024:.0f} KiB in {elapsed:.1f}s'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_tiles} tiles in {time.perf_counter() - total_start:.1f}s'
+        ))
@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Nodes', '0003_alter_edge_table_alter_node_table'),
+        ('Routes', '0003_routeedge_direction_routenode'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='routeedge',
+            options={},
+        ),
+        migrations.AlterModelOptions(
+            name='routenode',
+            options={},
+        ),
+        migrations.AddIndex(
+            model_name='routeedge',
+            index=models.Index(fields=['route', 'direction', 'order'], include=['edge'], name='route_edges_pattern_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routenode',
+            index=models.Index(fields=['node', 'route', 'direction', 'order'], name='route_nodes_node_idx'),
+        ),
+        # Los índices de una sola columna quedan cubiertos por los compuestos
+        migrations.AlterField(
+            model_name='routeedge',
+            name='route',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='Routes.route'),
+        ),
+        migrations.AlterField(
+            model_name='routenode',
+            name='node',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='Nodes.node'),
+        ),
+    ]
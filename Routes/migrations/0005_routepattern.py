@@ -0,0 +1,29 @@
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Routes', '0004_route_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoutePattern',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(choices=[('I', 'Ida'), ('V', 'Vuelta')], max_length=1)),
+                ('node_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), size=None)),
+                ('cumulative_distance', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), size=None)),
+                ('shape', models.TextField()),
+                ('edge_count', models.IntegerField()),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Routes.route')),
+            ],
+            options={
+                'db_table': 'route_patterns',
+                'constraints': [models.UniqueConstraint(fields=('route', 'direction'), name='route_patterns_route_direction_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Routes', '0005_routepattern'),
+    ]
+
+    operations = [
+        # Las filas existentes quedan sin huella: el cargador las ignora hasta refrescar
+        migrations.AddField(
+            model_name='routepattern',
+            name='source_checksum',
+            field=models.CharField(default='', max_length=40),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from Nodes.models import Node, Edge
 
@@ -32,14 +33,19 @@ class Route(models.Model):
 
 
 class RouteEdge(models.Model):
-  route = models.ForeignKey(Route, on_delete=models.CASCADE)
+  # route_id lo cubre el índice compuesto (route, direction, order)
+  route = models.ForeignKey(Route, on_delete=models.CASCADE, db_index=False)
   edge = models.ForeignKey(Edge, on_delete=models.CASCADE)
   order = models.IntegerField()  # To maintain the sequence of edges in the route
   direction = models.CharField(max_length=1, choices=[('I', 'Ida'), ('V', 'Vuelta')])
 
   class Meta:
     db_table = 'route_edges'
-    ordering = ['order']
+    # Sin ordering por defecto: quien necesite la secuencia ordena por 'order'
+    indexes = [
+      # Aristas de un patrón (ruta, sentido) en orden; edge_id incluido para index-only scans
+      models.Index(fields=['route', 'direction', 'order'], include=['edge'], name='route_edges_pattern_idx'),
+    ]
 
   def __str__(self):
     return f"Route {self.route.name} - Edge {self.edge.id}"
@@ -47,13 +53,44 @@ class RouteEdge(models.Model):
 
 class RouteNode(models.Model):
   route = models.ForeignKey(Route, on_delete=models.CASCADE)
-  node = models.ForeignKey(Node, on_delete=models.CASCADE)
+  # node_id lo cubre el índice compuesto (node, route, direction, order)
+  node = models.ForeignKey(Node, on_delete=models.CASCADE, db_index=False)
   order = models.IntegerField()
   direction = models.CharField(max_length=1, choices=[('I', 'Ida'), ('V', 'Vuelta')])
 
   class Meta:
     db_table = 'route_nodes'
-    ordering = ['order']
+    indexes = [
+      # Patrones que pasan por los nodos de acceso (ruta directa), sin leer la tabla
+      models.Index(fields=['node', 'route', 'direction', 'order'], name='route_nodes_node_idx'),
+    ]
+
+  def __str__(self):
+    return f"Route {self.route.name} - Node {self.node.id}"
+
+
+class RoutePattern(models.Model):
+  """
+  Secuencia materializada de una ruta en un sentido, derivada de RouteEdge
+  (refresh_route_patterns). `node_ids[i] -> node_ids[i + 1]` es una arista de
+  la ruta salvo donde aparece el separador 0 (tramo sin arista en route_edges);
+  `cumulative_distance` está alineado con `node_ids`. Cambios en route_edges
+  o en la distancia de edges la dejan desactualizada hasta el próximo refresco.
+  """
+  route = models.ForeignKey(Route, on_delete=models.CASCADE)
+  direction = models.CharField(max_length=1, choices=[('I', 'Ida'), ('V', 'Vuelta')])
+  node_ids = ArrayField(models.BigIntegerField())
+  cumulative_distance = ArrayField(models.FloatField())
+  shape = models.TextField()  # Encoded polyline de los nodos
+  edge_count = models.IntegerField()
+  # route_edges_checksum() al refrescar: si no coincide, las distancias cambiaron
+  source_checksum = models.CharField(max_length=40, default='')
+
+  class Meta:
+    db_table = 'route_patterns'
+    constraints = [
+      models.UniqueConstraint(fields=['route', 'direction'], name='route_patterns_route_direction_uniq'),
+    ]
 
   def __str__(self):
-    return f"Route {self.route.name} - Node {self.node.id}"
\ No newline at end of file
+    return f"Route {self.route_id} ({self.direction}) - {self.edge_count} edges"
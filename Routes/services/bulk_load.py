@@ -0,0 +1,50 @@
+import itertools
+
+import numpy as np
+
+CHUNK_SIZE = 20000
+
+
+def keyset_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """
+    Filas (id, *fields) por páginas `WHERE id > último ORDER BY id LIMIT n`.
+    No depende de cursores del lado del servidor (desactivados detrás de
+    PgBouncer, donde iterator() trae todo el resultado al cliente), así que
+    en memoria solo hay una página a la vez.
+    """
+    queryset = queryset.order_by('id')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(id__gt=last)
+        rows = list(page.values_list('id', *fields)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+
+def stream_columns(queryset, fields, dtypes, chunk_size=CHUNK_SIZE):
+    """
+    Lee `fields` de un queryset (puede traer anotaciones) por páginas de
+    keyset (ver `keyset_rows`) directo a arreglos NumPy, uno por campo,
+    preasignados con un COUNT(*). Del resultado solo hay una página en
+    memoria, con o sin cursores del lado del servidor, y no se instancian
+    modelos ni geometrías.
+    """
+    capacity = queryset.count()
+    columns = [np.empty(capacity, dtype=dtype) for dtype in dtypes]
+    size = 0
+    rows = keyset_rows(queryset, fields, chunk_size)
+    while True:
+        chunk = [row[1:] for row in itertools.islice(rows, chunk_size)]
+        if not chunk:
+            break
+        end = size + len(chunk)
+        if end > capacity:
+            # Filas insertadas después del COUNT
+            capacity = max(end, 2 * capacity)
+            columns = [np.concatenate([c, np.empty(capacity - len(c), dtype=c.dtype)]) for c in columns]
+        for column, values in zip(columns, zip(*chunk)):
+            column[size:end] = values
+        size = end
+    return tuple(c[:size] for c in columns)
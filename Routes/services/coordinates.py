@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class NodeCoordinates:
+    """
+    Coordenadas de los nodos en arreglos compactos: ids ordenados (int64) y
+    lat/lng (float64) alineados. Reemplaza a los objetos GEOS `location` para
+    armar polylines y pasos sin tocar la base de datos.
+    """
+
+    def __init__(self, ids, lats, lngs):
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        self.ids = ids[order]
+        self.lats = np.asarray(lats, dtype=np.float64)[order]
+        self.lngs = np.asarray(lngs, dtype=np.float64)[order]
+
+    @classmethod
+    def from_arrays(cls, ids, lats, lngs):
+        """Envuelve arreglos ya ordenados por id (p. ej. mmap de un snapshot) sin copiarlos."""
+        obj = cls.__new__(cls)
+        obj.ids = ids
+        obj.lats = lats
+        obj.lngs = lngs
+        return obj
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        i = np.searchsorted(self.ids, node_id)
+        return i < len(self.ids) and self.ids[i] == node_id
+
+    def positions(self, node_ids):
+        """Posición de cada id en los arreglos; KeyError si alguno no existe."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, node_ids)
+        pos[pos == len(self.ids)] = 0
+        if len(node_ids) and not np.array_equal(self.ids[pos], node_ids):
+            missing = node_ids[self.ids[pos] != node_ids]
+            raise KeyError(int(missing[0]))
+        return pos
+
+    def latlng(self, node_id):
+        pos = self.positions([node_id])[0]
+        return float(self.lats[pos]), float(self.lngs[pos])
+
+    def lookup(self, node_ids):
+        """{node_id: (lat, lng)} para los ids pedidos, en una sola búsqueda vectorizada."""
+        node_ids = list(node_ids)
+        pos = self.positions(node_ids)
+        return dict(zip(node_ids, zip(self.lats[pos].tolist(), self.lngs[pos].tolist())))
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.lats.nbytes + self.lngs.nbytes
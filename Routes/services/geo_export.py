@@ -0,0 +1,151 @@
+import itertools
+import json
+import logging
+import time
+
+from Routes.services.bulk_load import keyset_rows
+
+logger = logging.getLogger(__name__)
+
+LAYERS = ('nodes', 'edges', 'routes')
+FORMATS = {
+    # RFC 8142: cada Feature precedido por RS (0x1e)
+    'geojsonseq': ('\x1e', 'application/geo+json-seq'),
+    # Un Feature por línea (GeoJSONL)
+    'ndjson': ('', 'application/x-ndjson'),
+}
+CHUNK_SIZE = 5000
+PRECISION = 7  # decimales de las coordenadas (~1 cm)
+
+
+def feature(feature_id, geometry, properties):
+    """Feature GeoJSON como texto; `geometry` ya viene serializada desde PostGIS."""
+    return (
+        f'{{"type":"Feature","id":{feature_id},"geometry":{geometry},'
+        f'"properties":{json.dumps(properties, ensure_ascii=False)}}}'
+    )
+
+
+def _bbox_polygon(bbox):
+    from django.contrib.gis.geos import Polygon
+
+    return Polygon.from_bbox(bbox) if bbox is not None else None
+
+
+def node_features(bbox=None, route_ids=None, chunk_size=CHUNK_SIZE):
+    from django.contrib.gis.db.models.functions import AsGeoJSON
+    from Nodes.models import Node
+    from Routes.models import RouteNode
+
+    nodes = Node.objects.all()
+    if bbox is not None:
+        nodes = nodes.filter(location__intersects=_bbox_polygon(bbox))
+    if route_ids:
+        nodes = nodes.filter(id__in=RouteNode.objects.filter(route_id__in=route_ids).values('node_id'))
+    nodes = nodes.annotate(geom=AsGeoJSON('location', precision=PRECISION))
+    for node_id, osm_id, geom in keyset_rows(nodes, ('osm_id', 'geom'), chunk_size):
+        yield feature(node_id, geom, {'osm_id': osm_id})
+
+
+def edge_features(bbox=None, route_ids=None, chunk_size=CHUNK_SIZE):
+    from django.contrib.gis.db.models.functions import AsGeoJSON
+    from Nodes.models import Edge
+    from Routes.models import RouteEdge
+
+    edges = Edge.objects.all()
+    if bbox is not None:
+        edges = edges.filter(geometry__intersects=_bbox_polygon(bbox))
+    if route_ids:
+        edges = edges.filter(id__in=RouteEdge.objects.filter(route_id__in=route_ids).values('edge_id'))
+    edges = edges.annotate(geom=AsGeoJSON('geometry', precision=PRECISION))
+    for edge_id, source, target, distance, geom in keyset_rows(
+        edges, ('source_id', 'target_id', 'distance', 'geom'), chunk_size
+    ):
+        yield feature(edge_id, geom, {'source': source, 'target': target, 'distance': distance})
+
+
+def merge_lines(lines):
+    """
+    Une las geometrías de aristas consecutivas (listas de [lng, lat]) en
+    partes continuas: un punto compartido se escribe una sola vez.
+    """
+    parts = []
+    for coords in lines:
+        if parts and parts[-1][-1] == coords[0]:
+            parts[-1].extend(coords[1:])
+        else:
+            parts.append(list(coords))
+    return parts
+
+
+def route_features(bbox=None, route_ids=None, chunk_size=CHUNK_SIZE):
+    """
+    Un Feature por ruta y sentido con la geometría de sus aristas en `order`.
+    Cada patrón se lee con su propia consulta por el índice compuesto
+    (ruta, sentido, order), así que en memoria solo está el patrón en curso.
+    """
+    from django.contrib.gis.db.models.functions import AsGeoJSON
+    from Routes.models import Route, RouteEdge
+
+    routes = {
+        route_id: {'route_id': route_id, 'name': name, 'company': company}
+        for route_id, name, company in Route.objects.values_list('id', 'name', 'company__name')
+    }
+    patterns = RouteEdge.objects.all()
+    if route_ids:
+        patterns = patterns.filter(route_id__in=route_ids)
+    if bbox is not None:
+        patterns = patterns.filter(route_id__in=RouteEdge.objects.filter(
+            edge__geometry__intersects=_bbox_polygon(bbox)
+        ).values('route_id'))
+    patterns = patterns.order_by('route_id', 'direction').values_list('route_id', 'direction').distinct()
+
+    for route_id, direction in list(patterns):
+        rows = RouteEdge.objects.filter(route_id=route_id, direction=direction).order_by('order').annotate(
+            geom=AsGeoJSON('edge__geometry', precision=PRECISION)
+        ).values_list('edge__distance', 'geom')
+        lines, distance = [], 0.0
+        for edge_distance, geom in rows:
+            lines.append(json.loads(geom)['coordinates'])
+            distance += edge_distance
+        parts = merge_lines(lines)
+        geometry = (
+            {'type': 'LineString', 'coordinates': parts[0]} if len(parts) == 1
+            else {'type': 'MultiLineString', 'coordinates': parts}
+        )
+        properties = dict(routes[route_id], direction=direction, edge_count=len(lines), distance=distance)
+        yield feature(f'"{route_id}-{direction}"', json.dumps(geometry, separators=(',', ':')), properties)
+
+
+def export_features(layer, fmt='geojsonseq', bbox=None, route_ids=None, chunk_size=CHUNK_SIZE, stats=None):
+    """
+    Registros (texto terminado en salto de línea) de la capa pedida. Nodos y
+    calles se leen por páginas de `chunk_size` (keyset sobre id) y las rutas
+    de a un patrón, así que la memoria no crece con el tamaño de la red,
+    haya o no cursores del lado del servidor. `stats` recibe "features".
+    """
+    prefix = FORMATS[fmt][0]
+    features = {'nodes': node_features, 'edges': edge_features, 'routes': route_features}[layer]
+    count = 0
+    start = time.perf_counter()
+    try:
+        for record in features(bbox=bbox, route_ids=route_ids, chunk_size=chunk_size):
+            count += 1
+            yield f'{prefix}{record}\n'
+    finally:
+        elapsed = time.perf_counter() - start
+        if stats is not None:
+            stats['features'] = count
+            stats['seconds'] = elapsed
+        logger.info("Export %s (%s): %d features en %.1fs (%.0f/s)",
+                    layer, fmt, count, elapsed, count / elapsed if elapsed else 0)
+
+
+def batched(records, size=256):
+    """Junta registros en bloques para no emitir un chunk HTTP por Feature."""
+    iterator = iter(records)
+    while True:
+        batch = ''.join(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -1,23 +1,191 @@
-from collections import defaultdict
-from Routes.models import RouteEdge
+import logging
+import threading
+import time
 
-route_graphs = defaultdict(dict)    # route_id -> {node_id: [(neighbor_node_id, distance)]}
-node_routes = defaultdict(set)      # node_id -> set(route_ids)
+import numpy as np
+
+from Routes.services.bulk_load import stream_columns
+from Routes.services.metrics import GRAPH_BUILD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 20000
+
+route_store = None
+_route_store_lock = threading.Lock()
+
+
+class RouteStore:
+    """
+    Adyacencia de la red de buses en arreglos NumPy.
+
+    Un "patrón" es una ruta en un sentido: (route_id, direction), identificado
+    internamente por su índice en `patterns`. Las aristas se guardan ordenadas
+    por (patrón, origen), así que la adyacencia de cada patrón es un tramo
+    contiguo [pattern_ptr[p], pattern_ptr[p + 1]). El índice nodo -> patrones
+    es un CSR ordenado: `node_ids`, `node_ptr`, `node_patterns`.
+    """
+
+    ARRAYS = (
+        'edge_source', 'edge_target', 'edge_distance', 'pattern_ptr',
+        'node_ids', 'node_ptr', 'node_patterns',
+    )
+
+    def __init__(self, patterns, edge_pattern, edge_source, edge_target, edge_distance):
+        self.patterns = list(patterns)
+        self.pattern_index = {key: i for i, key in enumerate(self.patterns)}
+
+        edge_pattern = np.asarray(edge_pattern, dtype=np.int32)
+        edge_source = np.asarray(edge_source, dtype=np.int64)
+        order = np.lexsort((edge_source, edge_pattern))
+        self.edge_source = edge_source[order]
+        self.edge_target = np.asarray(edge_target, dtype=np.int64)[order]
+        self.edge_distance = np.asarray(edge_distance, dtype=np.float64)[order]
+        self.pattern_ptr = np.searchsorted(
+            edge_pattern[order], np.arange(len(self.patterns) + 1, dtype=np.int32)
+        ).astype(np.int64)
+
+        # CSR nodo -> patrones (origen y destino de cada arista, sin duplicados)
+        pairs = np.unique(np.concatenate([
+            np.stack([self.edge_source, edge_pattern[order].astype(np.int64)], axis=1),
+            np.stack([self.edge_target, edge_pattern[order].astype(np.int64)], axis=1),
+        ]), axis=0) if len(order) else np.empty((0, 2), dtype=np.int64)
+        self.node_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        self.node_ptr = np.append(starts, len(pairs)).astype(np.int64)
+        self.node_patterns = pairs[:, 1].astype(np.int32)
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        """
+        RouteStore desde secuencias materializadas [(route_id, direction,
+        node_ids, cumulative_distance)] (tabla route_patterns). Los tramos con
+        el separador 0 no son aristas.
+        """
+        patterns = []
+        edge_pattern, sources, targets, distances = [], [], [], []
+        for route_id, direction, node_ids, cumulative in sequences:
+            nodes = np.asarray(node_ids, dtype=np.int64)
+            hops = np.diff(np.asarray(cumulative, dtype=np.float64))
+            keep = (nodes[:-1] != 0) & (nodes[1:] != 0)
+            edge_pattern.append(np.full(int(keep.sum()), len(patterns), dtype=np.int32))
+            sources.append(nodes[:-1][keep])
+            targets.append(nodes[1:][keep])
+            distances.append(hops[keep])
+            patterns.append((route_id, direction))
+        if not patterns:
+            return cls([], [], [], [], [])
+        return cls(
+            patterns, np.concatenate(edge_pattern), np.concatenate(sources),
+            np.concatenate(targets), np.concatenate(distances),
+        )
+
+    @classmethod
+    def from_arrays(cls, patterns, **arrays):
+        """Envuelve arreglos ya construidos (p. ej. mmap de un snapshot) sin copiarlos."""
+        obj = cls.__new__(cls)
+        obj.patterns = list(patterns)
+        obj.pattern_index = {key: i for i, key in enumerate(obj.patterns)}
+        for name in cls.ARRAYS:
+            setattr(obj, name, arrays[name])
+        return obj
+
+    def __len__(self):
+        return len(self.patterns)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_source)
+
+    def patterns_at(self, node_id):
+        """Índices de los patrones que pasan por el nodo."""
+        i = np.searchsorted(self.node_ids, node_id)
+        if i == len(self.node_ids) or self.node_ids[i] != node_id:
+            return []
+        return self.node_patterns[self.node_ptr[i]:self.node_ptr[i + 1]].tolist()
+
+    def neighbors(self, pattern, node_id):
+        """[(vecino, distancia)] del nodo dentro del patrón (índice)."""
+        lo = self.pattern_ptr[pattern]
+        hi = self.pattern_ptr[pattern + 1]
+        sources = self.edge_source[lo:hi]
+        a = lo + np.searchsorted(sources, node_id, side='left')
+        b = lo + np.searchsorted(sources, node_id, side='right')
+        return list(zip(self.edge_target[a:b].tolist(), self.edge_distance[a:b].tolist()))
+
+    def pattern_edges(self, pattern):
+        """[(origen, destino, distancia)] de todas las aristas del patrón (índice)."""
+        lo = self.pattern_ptr[pattern]
+        hi = self.pattern_ptr[pattern + 1]
+        return list(zip(
+            self.edge_source[lo:hi].tolist(),
+            self.edge_target[lo:hi].tolist(),
+            self.edge_distance[lo:hi].tolist(),
+        ))
+
+    def hop_distance(self, pattern, u, v):
+        """Distancia del tramo u -> v dentro de un patrón (índice)."""
+        return min(d for n, d in self.neighbors(pattern, u) if n == v)
+
+    def memory_footprint(self):
+        """Bytes ocupados por cada arreglo y el total."""
+        arrays = {name: getattr(self, name).nbytes for name in self.ARRAYS}
+        arrays['total'] = sum(arrays.values())
+        return arrays
+
+
+def load_route_store(chunk_size=CHUNK_SIZE):
+    """
+    RouteStore desde route_patterns (una fila por ruta y sentido, una sola
+    consulta) si su `source_checksum` coincide con route_edges_checksum().
+    Si la tabla está vacía o desactualizada (aristas o distancias editadas
+    sin refrescar), lee route_edges por páginas de keyset a arreglos
+    NumPy; en ese caso los patrones (route_id, direction) se numeran en orden
+    de (route_id, direction).
+    """
+    from Routes.models import RouteEdge, RoutePattern
+    from Routes.services.route_patterns import route_edges_checksum
+
+    sequences = list(RoutePattern.objects.order_by('route_id', 'direction').values_list(
+        'route_id', 'direction', 'node_ids', 'cumulative_distance', 'source_checksum'
+    ))
+    if sequences:
+        checksum = route_edges_checksum()
+        if all(sequence[4] == checksum for sequence in sequences):
+            return RouteStore.from_sequences(sequence[:4] for sequence in sequences)
+        logger.warning("route_patterns desactualizada (refresh_route_patterns); se lee route_edges")
+
+    route_ids, directions, sources, targets, distances = stream_columns(
+        RouteEdge.objects.all(),
+        ('route_id', 'direction', 'edge__source_id', 'edge__target_id', 'edge__distance'),
+        (np.int64, 'U1', np.int64, np.int64, np.float64),
+        chunk_size,
+    )
+    letters, codes = np.unique(directions, return_inverse=True)
+    width = max(1, len(letters))
+    keys, edge_pattern = np.unique(route_ids * width + codes, return_inverse=True)
+    patterns = [(int(key) // width, str(letters[int(key) % width])) for key in keys]
+    return RouteStore(patterns, edge_pattern, sources, targets, distances)
 
-_loaded = False
 
 def build_graphs():
-    global _loaded
-    if _loaded:
-        return
-    print("Construyendo grafos de rutas...")
-    for route_edge in RouteEdge.objects.select_related('edge', 'route'):
-        edge = route_edge.edge
-        route_id = route_edge.route_id
-
-        route_graphs[route_id].setdefault(edge.source_id, []).append((edge.target_id, edge.distance))
-        node_routes[edge.source_id].add(route_id)
-        node_routes[edge.target_id].add(route_id)
-
-    _loaded = True
-    print("Rutas cargadas:", len(route_graphs))
+    """RouteStore del proceso, construido una sola vez aunque haya varios hilos."""
+    global route_store
+    if route_store is not None:
+        return route_store
+    with _route_store_lock:
+        if route_store is not None:
+            return route_store
+        from Routes.services.graph_snapshot import get_snapshot
+
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            route_store = snapshot.route_store
+            return route_store
+        logger.info("Construyendo grafos de rutas...")
+        start = time.perf_counter()
+        route_store = load_route_store()
+        elapsed = time.perf_counter() - start
+        GRAPH_BUILD_SECONDS.set(elapsed, graph="routes")
+        logger.info("Rutas cargadas: %d, %d aristas, memoria: %d bytes en %.1fs",
+                    len(route_store), route_store.edge_count, route_store.memory_footprint()['total'], elapsed)
+        return route_store
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import networkx as nx
+import numpy as np
+
+from Routes.services.bulk_load import stream_columns
+from Routes.services.coordinates import NodeCoordinates
+from Routes.services.graph_loader import RouteStore, load_route_store
+from Routes.services.metrics import GRAPH_BUILD_SECONDS
+from Routes.services.spatial_index import GridIndex
+from Routes.services.walking_path import WalkingGraph, load_walking_graph
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+CURRENT = 'CURRENT'
+KEEP_VERSIONS = 2  # la publicada y la anterior (un proceso pudo leer CURRENT justo antes del cambio)
+
+_snapshot = None
+
+
+class GraphSnapshot:
+    """
+    Grafo de solo lectura sobre arreglos .npy abiertos con mmap. Varios
+    procesos que adjuntan el mismo directorio (idealmente en /dev/shm)
+    comparten las mismas páginas físicas: nodos, índice espacial, capa
+    peatonal y RouteStore no se copian por worker.
+    """
+
+    def __init__(self, directory, manifest, arrays):
+        self.directory = directory
+        self.version = manifest['version']
+        self.content_hash = manifest.get('content_hash', self.version)
+        self.manifest = manifest
+        self.arrays = arrays
+        self.coords = NodeCoordinates.from_arrays(
+            arrays['node_ids'], arrays['node_lat'], arrays['node_lng']
+        )
+        self.osm_ids = arrays['node_osm_ids']
+        self.index = GridIndex.from_arrays(
+            arrays['grid_ids'], arrays['grid_x'], arrays['grid_y'],
+            arrays['grid_cells'], arrays['grid_cell_ptr'],
+            manifest['grid']['lat0'], manifest['grid']['cell_size'],
+        )
+        self.walking = WalkingGraph.from_arrays(
+            self.coords, self.index,
+            arrays['walk_indptr'], arrays['walk_indices'], arrays['walk_weights'],
+        )
+        self.route_store = RouteStore.from_arrays(
+            [tuple(p) for p in manifest['patterns']],
+            **{name: arrays['route_' + name] for name in RouteStore.ARRAYS}
+        )
+        self.route_names = {int(k): v for k, v in manifest['route_names'].items()}
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self.arrays.values())
+
+    def transport_graph(self, walk_penalty):
+        """
+        Arma el DiGraph de networkx del motor multimodal a partir de los
+        arreglos, sin consultar la base de datos. El DiGraph en sí sigue
+        siendo memoria privada de cada worker.
+        """
+        return transport_digraph(self.walking, self.route_store, self.osm_ids, self.route_names, walk_penalty)
+
+
+def transport_digraph(walking, store, osm_ids, route_names, walk_penalty):
+    """
+    DiGraph del motor multimodal: calles en ambos sentidos (penalizadas) y
+    aristas de bus por patrón. `osm_ids` (bytes) está alineado con
+    `walking.coords.ids`.
+    """
+    G = nx.DiGraph()
+    ids = walking.coords.ids
+    G.add_nodes_from(
+        (node_id, {'osm_id': osm_id.decode()})
+        for node_id, osm_id in zip(ids.tolist(), osm_ids.tolist())
+    )
+
+    rows = np.repeat(np.arange(len(ids)), np.diff(walking.indptr))
+    G.add_edges_from(
+        (u, v, {'weight': w * walk_penalty, 'type': 'walk'})
+        for u, v, w in zip(
+            ids[rows].tolist(),
+            ids[walking.indices].tolist(),
+            walking.weights.tolist(),
+        )
+    )
+
+    for pattern, (route_id, direction) in enumerate(store.patterns):
+        route_name = route_names.get(route_id)
+        G.add_edges_from(
+            (u, v, {
+                'weight': d,
+                'type': 'bus',
+                'route_id': route_id,
+                'route_name': route_name,
+                'direction': direction,
+            })
+            for u, v, d in store.pattern_edges(pattern)
+        )
+
+    G.graph['coords'] = walking.coords
+    G.graph['route_names'] = route_names
+    return G
+
+
+def load_osm_ids(coords, chunk_size=20000):
+    """osm_id (bytes) de cada nodo, alineado con `coords.ids`."""
+    from Nodes.models import Node
+
+    ids, osm = stream_columns(
+        Node.objects.all(), ('id', 'osm_id'), (np.int64, object), chunk_size
+    )
+    aligned = np.empty(len(coords), dtype=object)
+    aligned[coords.positions(ids)] = osm
+    return aligned.astype(np.bytes_)
+
+
+def load_route_names():
+    from Routes.models import Route
+
+    return dict(Route.objects.values_list('id', 'name'))
+
+
+def write_snapshot(root, walking, store, osm_ids, route_names, keep=KEEP_VERSIONS):
+    """
+    Escribe los arreglos en root/<versión>/, publica la versión en
+    root/CURRENT de forma atómica y borra las versiones viejas (ver
+    `prune_snapshots`). Devuelve la versión escrita.
+    """
+    version = time.strftime('%Y%m%d%H%M%S') + f'-{os.getpid()}'
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+
+    index = walking.index
+    arrays = {
+        'node_ids': walking.coords.ids,
+        'node_lat': walking.coords.lats,
+        'node_lng': walking.coords.lngs,
+        'node_osm_ids': osm_ids,
+        'grid_ids': index.ids,
+        'grid_x': index.x,
+        'grid_y': index.y,
+        'grid_cells': index.cells,
+        'grid_cell_ptr': index.cell_ptr,
+        'walk_indptr': walking.indptr,
+        'walk_indices': walking.indices,
+        'walk_weights': walking.weights,
+    }
+    for name in RouteStore.ARRAYS:
+        arrays['route_' + name] = getattr(store, name)
+    digest = hashlib.sha1()
+    for name, array in sorted(arrays.items()):
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(directory, name + '.npy'), array)
+        digest.update(name.encode())
+        digest.update(array.data)
+    digest.update(repr((list(store.patterns), sorted(route_names.items()))).encode())
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        # Huella del contenido: dos builds de los mismos datos dan la misma
+        'content_hash': digest.hexdigest()[:12],
+        'arrays': sorted(arrays),
+        'grid': {'lat0': index.lat0, 'cell_size': index.cell_size},
+        'patterns': [list(p) for p in store.patterns],
+        'route_names': {str(k): v for k, v in route_names.items()},
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    tmp = os.path.join(root, CURRENT + '.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, CURRENT))
+    prune_snapshots(root, version, keep)
+    return version
+
+
+def prune_snapshots(root, current, keep=KEEP_VERSIONS):
+    """
+    Borra los directorios de versiones anteriores a `current`, salvo las
+    `keep` más recientes contando la publicada. Las versiones posteriores
+    (otro build en curso) no se tocan. Un worker que todavía tiene adjuntada
+    una versión borrada la sigue leyendo: los mmap conservan los archivos
+    hasta cerrarse. Devuelve las versiones borradas.
+    """
+    older = sorted(
+        name for name in os.listdir(root)
+        if name < current and os.path.isdir(os.path.join(root, name))
+    )
+    removed = older[:max(len(older) - (keep - 1), 0)]
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    if removed:
+        logger.info("Snapshots viejos borrados en %s: %s", root, ", ".join(removed))
+    return removed
+
+
+def build_snapshot(root):
+    """Carga el grafo desde la base de datos y lo publica como snapshot en `root`."""
+    start = time.perf_counter()
+    walking = load_walking_graph()
+    store = load_route_store()
+    osm_ids = load_osm_ids(walking.coords)
+    route_names = load_route_names()
+    os.makedirs(root, exist_ok=True)
+    version = write_snapshot(root, walking, store, osm_ids, route_names)
+    elapsed = time.perf_counter() - start
+    GRAPH_BUILD_SECONDS.set(elapsed, graph="snapshot")
+    logger.info("Snapshot del grafo %s escrito en %.1fs", version, elapsed)
+    return version
+
+
+def published_version(root):
+    """Versión publicada en root/CURRENT; FileNotFoundError si todavía no hay."""
+    with open(os.path.join(root, CURRENT)) as f:
+        return f.read().strip()
+
+
+def read_manifest(root, version):
+    with open(os.path.join(root, version, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def published_content_hash(root):
+    """
+    Huella de contenido de la versión publicada, sin abrir los arreglos
+    (los snapshots anteriores a la huella usan su versión).
+    """
+    version = published_version(root)
+    return read_manifest(root, version).get('content_hash', version)
+
+
+def attach_snapshot(root):
+    """Abre (mmap, solo lectura) la versión publicada en root/CURRENT."""
+    version = published_version(root)
+    directory = os.path.join(root, version)
+    manifest = read_manifest(root, version)
+    if manifest['format'] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Formato de snapshot no soportado: {manifest['format']}")
+    arrays = {
+        name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+        for name in manifest['arrays']
+    }
+    return GraphSnapshot(directory, manifest, arrays)
+
+
+def current_snapshot():
+    """Snapshot ya adjuntado por este proceso, o None (no intenta abrirlo)."""
+    return _snapshot
+
+
+def get_snapshot():
+    """
+    Snapshot compartido de este proceso, o None si ROUTING_SNAPSHOT_DIR no está
+    configurado o todavía no hay una versión publicada (se usa la BD).
+    """
+    global _snapshot
+    if _snapshot is not None:
+        return _snapshot
+    from django.conf import settings
+
+    root = getattr(settings, 'ROUTING_SNAPSHOT_DIR', None)
+    if not root:
+        return None
+    try:
+        _snapshot = attach_snapshot(root)
+    except FileNotFoundError:
+        logger.warning("No hay snapshot del grafo en %s, se carga desde la base de datos", root)
+        return None
+    return _snapshot
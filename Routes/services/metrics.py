@@ -0,0 +1,173 @@
+import bisect
+import os
+import threading
+
+# Métricas en memoria del proceso, en el formato de texto de Prometheus.
+# Cada worker de gunicorn expone las suyas; la etiqueta `pid` de
+# routing_process_info permite distinguirlos al agregar por instancia.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _items(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        for labels, value in self._items():
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo: un conteo por bucket más la suma y el total."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def _items(self):
+        with self._lock:
+            return [
+                (dict(zip(self.labelnames, key)), (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            ]
+
+    def samples(self):
+        for labels, (counts, total) in self._items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield self.name + '_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+def register_collector(collector):
+    """
+    `collector()` se llama en cada lectura de /metrics y devuelve
+    [(nombre, tipo, descripción, etiquetas, valor)] con el estado actual
+    (tamaño del grafo, cachés...), para no duplicarlo en métricas propias.
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def resident_memory_bytes():
+    """RSS del proceso (Linux); None si /proc no está disponible."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def render():
+    """Todas las métricas en el formato de exposición de texto (versión 0.0.4)."""
+    families = {}
+    for metric in _metrics:
+        family = families.setdefault(metric.name, [metric.kind, metric.documentation, []])
+        family[2].extend(metric.samples())
+    for collector in _collectors:
+        for name, kind, documentation, labels, value in collector():
+            if value is None:
+                continue
+            family = families.setdefault(name, [kind, documentation, []])
+            family[2].append((name, labels, value))
+
+    lines = []
+    for name, (kind, documentation, samples) in families.items():
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample_name, labels, value in samples:
+            lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram(
+    'routing_request_duration_seconds', 'Duración de las peticiones de ruteo, por código de respuesta.',
+    ('endpoint', 'engine', 'status')
+)
+STAGE_SECONDS = Histogram(
+    'routing_stage_duration_seconds', 'Duración de cada etapa de las peticiones de ruteo.', ('endpoint', 'stage')
+)
+SEARCH_LIMIT_HITS = Counter(
+    'routing_search_limit_hits_total',
+    'Búsquedas que alcanzaron un límite (candidatos, nodos de snap, cola del pool).', ('limit',)
+)
+GRAPH_BUILD_SECONDS = Gauge(
+    'routing_graph_build_seconds', 'Duración de la última construcción de cada grafo.', ('graph',)
+)
+
+
+def observe_request(endpoint, engine, timer, status=200):
+    """
+    Registra la duración total y la de cada etapa de una petición
+    instrumentada, también las que terminan en error (400, 404, 503, 500).
+    """
+    REQUEST_SECONDS.observe(timer.elapsed_ms() / 1000, endpoint=endpoint, engine=engine, status=status)
+    for stage, ms in timer.stages.items():
+        STAGE_SECONDS.observe(ms / 1000, endpoint=endpoint, stage=stage)
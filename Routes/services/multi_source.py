@@ -0,0 +1,60 @@
+import heapq
+from itertools import count
+
+
+def multi_source_dijkstra_path(G, sources, targets, weight='weight', stats=None):
+    """
+    Dijkstra multi-origen / multi-destino.
+
+    `sources` y `targets` son diccionarios {node_id: costo}: el costo de
+    origen siembra la cola (p. ej. la caminata hasta el nodo) y el costo de
+    destino se suma al llegar (caminata desde el nodo hasta el punto final).
+    Devuelve (costo_total, path) del mejor par origen/destino, o None.
+    Si se pasa `stats` (dict), suma los nodos asentados en "settled_nodes".
+    """
+    succ = G.succ
+    dist = {}
+    seen = {}
+    pred = {}
+    heap = []
+    push = heapq.heappush
+    pop = heapq.heappop
+    c = count()
+
+    for node, cost in sources.items():
+        if node in succ and cost < seen.get(node, float('inf')):
+            seen[node] = cost
+            pred[node] = None
+            push(heap, (cost, next(c), node))
+
+    best_cost = float('inf')
+    best_target = None
+    while heap:
+        d, _, u = pop(heap)
+        if u in dist:
+            continue
+        # Ningún nodo pendiente puede mejorar el mejor destino ya alcanzado
+        if d >= best_cost:
+            break
+        dist[u] = d
+        if u in targets and d + targets[u] < best_cost:
+            best_cost = d + targets[u]
+            best_target = u
+        for v, data in succ[u].items():
+            if v in dist:
+                continue
+            nd = d + data.get(weight, 1)
+            if nd < seen.get(v, float('inf')):
+                seen[v] = nd
+                pred[v] = u
+                push(heap, (nd, next(c), v))
+
+    if stats is not None:
+        stats["settled_nodes"] = stats.get("settled_nodes", 0) + len(dist)
+    if best_target is None:
+        return None
+    path = [best_target]
+    while pred[path[-1]] is not None:
+        path.append(pred[path[-1]])
+    path.reverse()
+    return best_cost, path
@@ -1,50 +1,84 @@
 import heapq
-from .graph_loader import build_graphs, route_graphs, node_routes
+from itertools import count
+from .graph_loader import build_graphs
 
-def find_routes_with_transfers(origin_id, destination_id, max_paths=2, max_transfers=2):
-  build_graphs()
+def find_routes_with_transfers(origins, destinations, max_paths=1, max_transfers=2, transfer_penalty=800, store=None, stats=None):
+  """
+  Router sobre la red de buses con número de transbordos acotado.
 
-  result_paths = []
-  visited = set()
-  queue = []
-  print(node_routes[origin_id])
-  for route_id in node_routes[origin_id]:
-    heapq.heappush(queue, (0, 0, origin_id, route_id, [(origin_id, route_id)]))
-
-  while queue and len(result_paths) < max_paths:
-    transfers, cost, current_node, current_route, path = heapq.heappop(queue)
-    state_id = (current_node, current_route)
-    if state_id in visited:
-      continue
-    visited.add(state_id)
+  `origins` y `destinations` son {node_id: costo} (caminata de acceso, como en
+  multi_source_dijkstra_path). La prioridad es el costo generalizado
+  (distancia + transbordos * transfer_penalty) y, a igual costo, menos
+  transbordos. Los caminos se reconstruyen con punteros al padre, sin copiar
+  listas en cada inserción.
+
+  Devuelve hasta `max_paths` resultados {"path", "transfers", "total_cost"},
+  con "path" como [(node_id, (route_id, direction)), ...]. Si se pasa `stats`
+  (dict), suma los estados asentados en "settled_states".
+  """
+  if store is None:
+    store = build_graphs()
+
+  heap = []
+  c = count()
+  best = {}        # (node, pattern, transfers) -> mejor costo conocido
+  parent = {}      # (node, pattern, transfers) -> estado previo
+  settled = {}     # (node, pattern) -> menor número de transbordos ya asentado
+
+  def relax(state, cost):
+    if cost < best.get(state, float('inf')):
+      best[state] = cost
+      parent[state] = current
+      heapq.heappush(heap, (cost, state[2], next(c), state, False))
+
+  current = None
+  for node, cost in origins.items():
+    for pattern in store.patterns_at(node):
+      relax((node, pattern, 0), cost)
 
-    if current_node == destination_id:
+  result_paths = []
+  while heap and len(result_paths) < max_paths:
+    cost, transfers, _, state, final = heapq.heappop(heap)
+    if final:
       result_paths.append({
-        "path": path,
+        "path": _unwind(store, parent, state),
         "transfers": transfers,
         "total_cost": cost
       })
       continue
 
-    neighbors = route_graphs[current_route].get(current_node, [])
-    for next_node, dist in neighbors:
-      heapq.heappush(queue, (
-        transfers,
-        cost + dist,
-        next_node,
-        current_route,
-        path + [(next_node, current_route)]
-      ))
+    node, pattern, _ = state
+    # Dominado: ya se llegó a este nodo en esta ruta con menor costo y no más transbordos
+    if settled.get((node, pattern), max_transfers + 1) <= transfers:
+      continue
+    settled[(node, pattern)] = transfers
+    current = state
+
+    if node in destinations:
+      heapq.heappush(heap, (cost + destinations[node], transfers, next(c), state, True))
+
+    for next_node, dist in store.neighbors(pattern, node):
+      relax((next_node, pattern, transfers), cost + dist)
 
     if transfers < max_transfers:
-      for alt_route in node_routes[current_node]:
-        if alt_route != current_route:
-          heapq.heappush(queue, (
-            transfers + 1,
-            cost,
-            current_node,
-            alt_route,
-            path
-          ))
+      for alt_pattern in store.patterns_at(node):
+        if alt_pattern != pattern:
+          relax((node, alt_pattern, transfers + 1), cost + transfer_penalty)
 
+  if stats is not None:
+    stats["settled_states"] = stats.get("settled_states", 0) + len(settled)
   return result_paths
+
+def _unwind(store, parent, state):
+  path = []
+  while state is not None:
+    path.append((state[0], store.patterns[state[1]]))
+    state = parent[state]
+  path.reverse()
+  return path
+
+def hop_distance(pattern, u, v, store=None):
+  """Distancia del tramo u -> v dentro de un patrón (route_id, direction)."""
+  if store is None:
+    store = build_graphs()
+  return store.hop_distance(store.pattern_index[pattern], u, v)
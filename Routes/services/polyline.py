@@ -0,0 +1,111 @@
+import math
+
+EARTH_RADIUS = 6371008.8       # metros
+METERS_PER_PIXEL_Z0 = 156543.03392  # resolución de Web Mercator en el ecuador, zoom 0
+MAX_ZOOM = 22  # igual que las teselas; más allá 2 ** zoom no aporta (y desborda)
+
+
+def encode_polyline(coords, precision=5):
+    """
+    Codifica [(lat, lng), ...] con el algoritmo "Encoded Polyline" de Google.
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = 0
+    prev_lng = 0
+    for lat, lng in coords:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat = lat_i
+        prev_lng = lng_i
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded, precision=5):
+    """Inverso de `encode_polyline`."""
+    factor = 10 ** precision
+    coords = []
+    index = 0
+    lat = 0
+    lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = 0
+            result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lat / factor, lng / factor))
+    return coords
+
+
+def tolerance_for_zoom(zoom, lat=-16.4, pixels=1.0):
+    """
+    Tolerancia (m) equivalente a `pixels` píxeles en pantalla para un nivel de
+    zoom. Lanza ValueError si `zoom` no está en 0..MAX_ZOOM (o es NaN).
+    """
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom fuera de 0..{MAX_ZOOM}: {zoom}")
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def simplify(coords, tolerance):
+    """
+    Douglas-Peucker sobre [(lat, lng), ...] con tolerancia en metros.
+    Usa una proyección equirectangular local, suficiente a escala de ciudad.
+    """
+    n = len(coords)
+    if n < 3 or tolerance <= 0:
+        return list(coords)
+
+    lat0 = math.radians(coords[0][0])
+    kx = math.radians(1) * EARTH_RADIUS * math.cos(lat0)
+    ky = math.radians(1) * EARTH_RADIUS
+    xy = [(lng * kx, lat * ky) for lat, lng in coords]
+
+    tol2 = tolerance * tolerance
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xy[first]
+        bx, by = xy[last]
+        dx = bx - ax
+        dy = by - ay
+        seg2 = dx * dx + dy * dy
+        max_d2 = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            if seg2 == 0:
+                d2 = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                t = ((px - ax) * dx + (py - ay) * dy) / seg2
+                t = min(1.0, max(0.0, t))
+                d2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+            if d2 > max_d2:
+                max_d2 = d2
+                index = i
+        if max_d2 > tol2:
+            keep[index] = True
+            if index - first > 1:
+                stack.append((first, index))
+            if last - index > 1:
+                stack.append((index, last))
+    return [c for c, k in zip(coords, keep) if k]
@@ -0,0 +1,96 @@
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_ROUTING_PROFILE'
+
+# cProfile no admite dos perfiles activos a la vez (Python 3.12+): si otra
+# petición ya se está perfilando, esta se atiende sin perfil
+_active = threading.Lock()
+_sequence = itertools.count()
+
+
+def profile_trigger(request):
+    """
+    Por qué perfilar esta petición, o None. Requiere ROUTING_PROFILE_DIR:
+    "header" si trae X-Routing-Profile, "sampled" según ROUTING_PROFILE_RATE
+    y "threshold" si hay umbral de latencia (se perfila y solo se guarda si
+    la petición tarda más que ROUTING_PROFILE_THRESHOLD_MS).
+    """
+    from django.conf import settings
+
+    if not settings.ROUTING_PROFILE_DIR:
+        return None
+    if request.META.get(PROFILE_HEADER):
+        return "header"
+    if settings.ROUTING_PROFILE_RATE and random.random() < settings.ROUTING_PROFILE_RATE:
+        return "sampled"
+    if settings.ROUTING_PROFILE_THRESHOLD_MS:
+        return "threshold"
+    return None
+
+
+def save_profile(profiler, directory, meta):
+    """Escribe <nombre>.prof (pstats) y <nombre>.json con los parámetros de la petición."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}"
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, default=str)
+    return name
+
+
+def profile_request(label):
+    """
+    Decorador opt-in para métodos de vistas DRF: perfila con cProfile las
+    peticiones elegidas por `profile_trigger` y guarda las que corresponda.
+    Sin ROUTING_PROFILE_DIR el costo es una lectura de settings por petición.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            trigger = profile_trigger(request)
+            if trigger is None or not _active.acquire(blocking=False):
+                return method(self, request, *args, **kwargs)
+
+            from django.conf import settings
+
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    response = method(self, request, *args, **kwargs)
+                finally:
+                    profiler.disable()
+            finally:
+                _active.release()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            if trigger == "threshold" and elapsed_ms < settings.ROUTING_PROFILE_THRESHOLD_MS:
+                return response
+            try:
+                name = save_profile(profiler, settings.ROUTING_PROFILE_DIR, {
+                    "label": label,
+                    "trigger": trigger,
+                    "elapsed_ms": round(elapsed_ms, 3),
+                    "status": response.status_code,
+                    "path": request.path,
+                    "params": dict(request.data),
+                })
+            except OSError:
+                logger.exception("No se pudo guardar el perfil de %s", label)
+                return response
+            response["X-Routing-Profile"] = name
+            logger.info("Perfil %s guardado (%s, %.1f ms)", name, trigger, elapsed_ms)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RouteCache:
+    """
+    LRU en memoria (por proceso) de respuestas de ruteo, con expiración
+    opcional. Seguro para hilos: se usa tanto desde la vista síncrona como
+    desde la asíncrona y el pool de búsquedas.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, count=True):
+        """
+        Valor vigente o None. Con `count=False` no suma aciertos ni fallos:
+        para volver a mirar una llave cuyo fallo ya se contó (líder del single-flight).
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (self.ttl is None or item[0] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += count
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += count
+            return None
+
+    def peek(self, key):
+        return self.get(key, count=False)
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import time
+
+from Routes.services.polyline import encode_polyline
+
+logger = logging.getLogger(__name__)
+
+GAP = 0  # Separador en node_ids: los ids de Node empiezan en 1
+
+
+def pattern_sequences(rows):
+    """
+    Agrupa aristas [(route_id, direction, source_id, target_id, distance)],
+    ya ordenadas por (route_id, direction, order), en secuencias
+    (route_id, direction, node_ids, cumulative_distance, edge_count).
+    Si una arista no empieza donde terminó la anterior, se inserta GAP.
+    """
+    key = None
+    nodes, cumulative, edges = [], [], 0
+    for route_id, direction, source, target, distance in rows:
+        if (route_id, direction) != key:
+            if key is not None:
+                yield key + (nodes, cumulative, edges)
+            key = (route_id, direction)
+            nodes, cumulative, edges = [source], [0.0], 0
+        elif nodes[-1] != source:
+            nodes += [GAP, source]
+            cumulative += [cumulative[-1], cumulative[-1]]
+        nodes.append(target)
+        cumulative.append(cumulative[-1] + distance)
+        edges += 1
+    if key is not None:
+        yield key + (nodes, cumulative, edges)
+
+
+def route_edges_checksum():
+    """
+    Huella de lo que route_patterns deriva de route_edges + edges: un solo
+    agregado en la BD (conteo, distancias en cm y extremos ponderados por
+    `order`), sin traer filas. Cambia si se edita una arista de ruta, su
+    orden, su sentido o la distancia de una calle que usa.
+    """
+    from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, Max, Sum
+    from django.db.models.functions import Cast, Ord, Round
+    from Routes.models import RouteEdge
+
+    def weighted(value):
+        return Sum(ExpressionWrapper(F('order') * value, output_field=BigIntegerField()))
+
+    totals = RouteEdge.objects.aggregate(
+        count=Count('id'),
+        last=Max('id'),
+        distance=Sum(Cast(Round(F('edge__distance') * 100), BigIntegerField())),
+        sources=weighted(F('edge__source_id')),
+        targets=weighted(F('edge__target_id')),
+        routes=weighted(F('route_id')),
+        # Código del sentido ('I' o 'V'): pasar una arista de ida a vuelta cambia la suma
+        directions=weighted(Ord('direction')),
+    )
+    return hashlib.sha1(repr(sorted(totals.items())).encode()).hexdigest()
+
+
+def refresh_route_patterns(chunk_size=20000):
+    """
+    Recalcula route_patterns desde route_edges (join con edges y orden por
+    `order`, una sola vez) con la forma codificada de cada secuencia y la
+    huella de las tablas de origen (`source_checksum`), tomada antes de leer:
+    si algo cambia mientras tanto, el cargador la verá desactualizada.
+    Devuelve el número de patrones escritos.
+    """
+    from django.db import transaction
+    from django.db.models import FloatField, Func
+    from Nodes.models import Node
+    from Routes.models import RouteEdge, RoutePattern
+
+    start = time.perf_counter()
+    checksum = route_edges_checksum()
+    rows = RouteEdge.objects.order_by('route_id', 'direction', 'order').values_list(
+        'route_id', 'direction', 'edge__source_id', 'edge__target_id', 'edge__distance'
+    )
+    sequences = list(pattern_sequences(rows.iterator(chunk_size=chunk_size)))
+
+    node_ids = {n for sequence in sequences for n in sequence[2] if n != GAP}
+    coords = {
+        node_id: (lat, lng)
+        for node_id, lat, lng in Node.objects.filter(id__in=node_ids).annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        ).values_list('id', 'lat', 'lng').iterator(chunk_size=chunk_size)
+    }
+
+    patterns = [
+        RoutePattern(
+            route_id=route_id,
+            direction=direction,
+            node_ids=nodes,
+            cumulative_distance=cumulative,
+            shape=encode_polyline([coords[n] for n in nodes if n != GAP]),
+            edge_count=edges,
+            source_checksum=checksum,
+        )
+        for route_id, direction, nodes, cumulative, edges in sequences
+    ]
+    with transaction.atomic():
+        RoutePattern.objects.all().delete()
+        RoutePattern.objects.bulk_create(patterns, batch_size=500)
+    logger.info("route_patterns: %d patrones refrescados en %.1fs", len(patterns), time.perf_counter() - start)
+    return len(patterns)
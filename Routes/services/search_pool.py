@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolOverloaded(Exception):
+    """La cola de búsquedas está llena: se responde 503 en vez de encolar más."""
+    pass
+
+
+class SearchPool:
+    """
+    Pool acotado para las búsquedas multimodales largas. Acepta a lo sumo
+    `max_workers + max_queue` búsquedas en curso; por encima rechaza con
+    PoolOverloaded (backpressure) para no degradar a todas las peticiones.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='route-search')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def depth(self):
+        """Búsquedas en curso o en cola."""
+        return self._in_flight
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                raise PoolOverloaded()
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+
+def current_pool():
+    """Pool ya creado, o None (no lo crea solo para leer métricas)."""
+    return _pool
+
+
+def get_search_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from django.conf import settings
+
+                _pool = SearchPool(settings.ROUTING_POOL_WORKERS, settings.ROUTING_POOL_QUEUE)
+    return _pool
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalescencia de peticiones idénticas en curso: la primera con una llave
+    ejecuta la búsqueda y las demás esperan su resultado (o su excepción).
+    Usa concurrent.futures.Future, que se puede esperar desde hilos y desde
+    corrutinas, así que sirve para la vista síncrona y la asíncrona a la vez.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        """(future, es_líder) para la llave."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @property
+    def in_flight(self):
+        return len(self._calls)
+
+    def do(self, key, fn, *args, **kwargs):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            # También cancelaciones: los que esperan no deben quedarse colgados
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        Igual que `do`, pero `fn` es una función async. La búsqueda corre en
+        su propia tarea y se espera con asyncio.shield: si se cancela la
+        petición del líder (el cliente se desconectó) la tarea termina igual
+        para los que esperan, y la cancelación de uno que espera tampoco
+        cancela el Future compartido.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        task.add_done_callback(lambda done: self._settle(key, future, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key, future, task):
+        """Pasa el resultado de la tarea del líder al Future compartido."""
+        if task.cancelled():
+            # Solo si se canceló la tarea misma (p. ej. al cerrar el loop), no la petición del líder
+            with self._lock:
+                self._calls.pop(key, None)
+            future.cancel()
+            return
+        error = task.exception()
+        if error is not None:
+            self._finish(key, future, error=error)
+        else:
+            self._finish(key, future, task.result())
+
+    def stats(self):
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": self.in_flight}
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # metros
+CELL_SIZE = 100.0         # lado de cada celda de la grilla, en metros
+
+
+class GridIndex:
+    """
+    Índice espacial en memoria: grilla uniforme sobre una proyección
+    equirectangular local. Los nodos se ordenan por celda, así que cada celda
+    es un tramo contiguo de los arreglos (todo NumPy, sin objetos por nodo).
+    """
+
+    def __init__(self, ids, lats, lngs, cell_size=CELL_SIZE):
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_size = cell_size
+        self.lat0 = float(lats.mean()) if len(lats) else 0.0
+        self.kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(self.lat0))
+        self.ky = math.radians(1) * EARTH_RADIUS
+
+        x = lngs * self.kx
+        y = lats * self.ky
+        keys = self._keys(np.floor(x / cell_size), np.floor(y / cell_size))
+        order = np.argsort(keys, kind='stable')
+        self.ids = ids[order]
+        self.x = x[order]
+        self.y = y[order]
+        self.cells, starts = np.unique(keys[order], return_index=True)
+        self.cell_ptr = np.append(starts, len(order)).astype(np.int64)
+
+    @classmethod
+    def from_arrays(cls, ids, x, y, cells, cell_ptr, lat0, cell_size=CELL_SIZE):
+        """Envuelve arreglos ya construidos (p. ej. mmap de un snapshot) sin copiarlos."""
+        obj = cls.__new__(cls)
+        obj.cell_size = cell_size
+        obj.lat0 = lat0
+        obj.kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(lat0))
+        obj.ky = math.radians(1) * EARTH_RADIUS
+        obj.ids = ids
+        obj.x = x
+        obj.y = y
+        obj.cells = cells
+        obj.cell_ptr = cell_ptr
+        return obj
+
+    @staticmethod
+    def _keys(cx, cy):
+        # Celdas con signo empaquetadas en un int64 (32 bits por eje)
+        return (cx.astype(np.int64) << 32) + (cy.astype(np.int64) & 0xffffffff)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def within(self, lat, lng, radius, limit=None):
+        """(ids, distancias_m) de los nodos a <= radius metros, del más cercano al más lejano."""
+        if not (math.isfinite(lat) and math.isfinite(lng) and math.isfinite(radius)):
+            # math.floor(nan) o de inf lanzaría; un punto así no tiene vecinos
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        px = lng * self.kx
+        py = lat * self.ky
+        span = int(math.ceil(radius / self.cell_size))
+        cx0 = math.floor(px / self.cell_size)
+        cy0 = math.floor(py / self.cell_size)
+        cx = np.repeat(np.arange(cx0 - span, cx0 + span + 1), 2 * span + 1)
+        cy = np.tile(np.arange(cy0 - span, cy0 + span + 1), 2 * span + 1)
+        keys = self._keys(cx, cy)
+
+        pos = np.searchsorted(self.cells, keys)
+        pos[pos == len(self.cells)] = 0
+        hit = pos[self.cells[pos] == keys] if len(self.cells) else pos[:0]
+        if not len(hit):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        candidates = np.concatenate([
+            np.arange(self.cell_ptr[i], self.cell_ptr[i + 1]) for i in hit
+        ])
+        dist = np.hypot(self.x[candidates] - px, self.y[candidates] - py)
+        keep = dist <= radius
+        candidates = candidates[keep]
+        dist = dist[keep]
+        order = np.argsort(dist, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return self.ids[candidates[order]], dist[order]
+
+    def nearest(self, lat, lng, max_distance):
+        """(id, distancia_m) del nodo más cercano, o None si no hay ninguno en el radio."""
+        ids, dist = self.within(lat, lng, max_distance, limit=1)
+        if not len(ids):
+            return None
+        return int(ids[0]), float(dist[0])
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.x.nbytes + self.y.nbytes + self.cells.nbytes + self.cell_ptr.nbytes
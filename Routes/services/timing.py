@@ -0,0 +1,84 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _NullStage:
+    """Etapa que no mide nada: el costo con la instrumentación apagada es un método vacío."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class StageTimer:
+    """
+    Acumula la duración (ms) de cada etapa de una petición de ruteo y
+    contadores de la búsqueda (nodos asentados, candidatos evaluados...).
+    Deshabilitado, `stage` devuelve un contexto vacío y `counters` es None,
+    así que los algoritmos no cuentan nada. `trace` controla si la petición
+    además se reporta (Server-Timing y log); sin él solo alimenta las métricas.
+    """
+
+    def __init__(self, enabled=True, trace=None):
+        self.enabled = enabled
+        self.trace = enabled if trace is None else enabled and trace
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {} if enabled else None
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {name: round(ms, 3) for name, ms in self.stages.items()}
+
+    def debug_block(self):
+        return {"stages_ms": self.as_dict(), "counters": dict(self.counters or {})}
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (etapas y contadores como `desc`)."""
+        entries = [f"{name};dur={ms:.3f}" for name, ms in self.stages.items()]
+        entries += [f'{name};desc="{value}"' for name, value in (self.counters or {}).items()]
+        return ", ".join(entries)
+
+    def log(self, label, **fields):
+        """Una línea JSON por petición, solo si la petición se reporta (`trace`)."""
+        if not self.trace:
+            return
+        logger.info(json.dumps({"event": label, **self.debug_block(), **fields}, default=str))
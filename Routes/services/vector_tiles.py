@@ -0,0 +1,602 @@
+import hashlib
+import logging
+import math
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from Routes.services.metrics import Counter
+from Routes.services.polyline import simplify, tolerance_for_zoom
+
+logger = logging.getLogger(__name__)
+
+EXTENT = 4096          # resolución interna del tile (Mapbox Vector Tile 2.1)
+BUFFER = 64            # margen en unidades del tile, para que las líneas no se corten en el borde
+MAX_ZOOM = 22
+NODES_MIN_ZOOM = 16    # los nodos solo se dibujan de cerca
+EDGES_MIN_ZOOM = 13    # calles desde nivel barrio; las rutas de bus en todos los niveles
+WEB_MERCATOR_HALF = 20037508.342789244
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+VERSION_TTL = 60       # s entre revisiones de la versión de los datos (BD o snapshot publicado)
+
+TILE_REQUESTS = Counter(
+    'routing_tile_requests_total', 'Vector tiles served, by engine and cache result (hit, miss, off, not_modified)',
+    ('engine', 'cache'),
+)
+
+_source = None
+_source_lock = threading.Lock()
+_source_snapshot = None   # versión del snapshot con que se armó _source
+_source_checked = 0.0
+_db_version = None        # (monotonic de la consulta, versión)
+_cache_pruned = {}        # (raíz, motor) -> versión cuyos tiles viejos ya se borraron
+_postgis_mvt = None
+
+
+# --- Geometría de tiles -----------------------------------------------------
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """(min_lng, min_lat, max_lng, max_lat) del tile XYZ, ampliado `buffer` unidades del tile."""
+    n = 2 ** z
+    pad = buffer / EXTENT
+
+    def lng(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        ty = min(max(ty, 0), n)
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lng(x - pad), lat(y + 1 + pad), lng(x + 1 + pad), lat(y - pad)
+
+
+def tiles_covering(bbox, z):
+    """Tiles (x, y) del nivel `z` que cubren bbox = (min_lng, min_lat, max_lng, max_lat)."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    n = 2 ** z
+
+    def tx(lng):
+        return min(max(int((lng + 180.0) / 360.0 * n), 0), n - 1)
+
+    def ty(lat):
+        lat = math.radians(max(min(lat, 85.0511), -85.0511))
+        return min(max(int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n), 0), n - 1)
+
+    for x in range(tx(min_lng), tx(max_lng) + 1):
+        for y in range(ty(max_lat), ty(min_lat) + 1):
+            yield x, y
+
+
+def project(lats, lngs, z, x, y):
+    """Coordenadas enteras del tile (origen arriba a la izquierda) para arreglos de lat/lng."""
+    n = 2 ** z
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs = np.asarray(lngs, dtype=np.float64)
+    px = ((lngs + 180.0) / 360.0 * n - x) * EXTENT
+    py = ((1 - np.arcsinh(np.tan(lats)) / math.pi) / 2 * n - y) * EXTENT
+    return np.rint(px).astype(np.int64), np.rint(py).astype(np.int64)
+
+
+def in_bounds(lats, lngs, bounds):
+    min_lng, min_lat, max_lng, max_lat = bounds
+    return (lngs >= min_lng) & (lngs <= max_lng) & (lats >= min_lat) & (lats <= max_lat)
+
+
+# --- Codificador MVT (protobuf escrito a mano) ------------------------------
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, data):
+    return _key(number, 2) + _varint(len(data)) + data
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def _command(command, count):
+    return (command & 0x7) | (count << 3)
+
+
+class LayerBuilder:
+    """
+    Una capa del tile: features con geometría en coordenadas del tile y
+    propiedades deduplicadas en las tablas keys/values de la capa.
+    """
+
+    POINT = 1
+    LINESTRING = 2
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.features = []
+        self.keys = {}
+        self.values = {}
+
+    def __len__(self):
+        return len(self.features)
+
+    def _tags(self, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        return tags
+
+    def add_points(self, xs, ys, properties, feature_id=None):
+        geometry = [_command(1, len(xs))]
+        cx = cy = 0
+        for px, py in zip(xs, ys):
+            geometry += [_zigzag(px - cx), _zigzag(py - cy)]
+            cx, cy = px, py
+        self._add(self.POINT, geometry, properties, feature_id)
+
+    def add_lines(self, parts, properties, feature_id=None):
+        """`parts`: listas de (x, y); se descartan vértices repetidos y partes de un solo punto."""
+        geometry = []
+        cx = cy = 0
+        for part in parts:
+            points = [p for i, p in enumerate(part) if i == 0 or p != part[i - 1]]
+            if len(points) < 2:
+                continue
+            (px, py), rest = points[0], points[1:]
+            geometry += [_command(1, 1), _zigzag(px - cx), _zigzag(py - cy), _command(2, len(rest))]
+            cx, cy = px, py
+            for px, py in rest:
+                geometry += [_zigzag(px - cx), _zigzag(py - cy)]
+                cx, cy = px, py
+        if geometry:
+            self._add(self.LINESTRING, geometry, properties, feature_id)
+
+    def _add(self, geom_type, geometry, properties, feature_id):
+        feature = b''
+        if feature_id is not None:
+            feature += _key(1, 0) + _varint(feature_id)
+        tags = self._tags(properties)
+        if tags:
+            feature += _packed_field(2, tags)
+        feature += _key(3, 0) + _varint(geom_type)
+        feature += _packed_field(4, geometry)
+        self.features.append(feature)
+
+    def encode(self):
+        return b''.join([
+            _key(15, 0) + _varint(2),
+            _bytes_field(1, self.name.encode('utf-8')),
+            *(_bytes_field(2, feature) for feature in self.features),
+            *(_bytes_field(3, key.encode('utf-8')) for key in self.keys),
+            *(_bytes_field(4, _encode_value(value)) for _, value in self.values),
+            _key(5, 0) + _varint(self.extent),
+        ])
+
+
+def encode_tile(layers):
+    """Tile MVT con las capas no vacías; b'' si no hay nada que dibujar."""
+    return b''.join(_bytes_field(3, layer.encode()) for layer in layers if len(layer))
+
+
+def chain_segments(pairs):
+    """
+    Une aristas [(u, v)] en recorridos [u, v, w, ...] siguiendo v == siguiente
+    u, empezando por los nodos sin aristas entrantes. Cada arista se usa una vez.
+    """
+    following = {}
+    incoming = {}
+    for u, v in pairs:
+        following.setdefault(u, []).append(v)
+        incoming[v] = incoming.get(v, 0) + 1
+    starts = [u for u, _ in pairs if not incoming.get(u)] + [u for u, _ in pairs]
+    runs = []
+    for start in starts:
+        if not following.get(start):
+            continue
+        run = [start]
+        while following.get(run[-1]):
+            run.append(following[run[-1]].pop())
+        runs.append(run)
+    return runs
+
+
+# --- Fuentes ------------------------------------------------------------------
+
+class GraphTileSource:
+    """
+    Tiles desde el grafo en memoria (capa peatonal + RouteStore), sin consultas.
+    Las calles se dibujan como segmentos entre nodos: la geometría de `edges`
+    no se carga en memoria, pero los nodos de OSM son densos.
+    """
+
+    engine = 'python'
+
+    def __init__(self, walking, store, route_names, version=None):
+        coords = walking.coords
+        self.node_ids = coords.ids
+        self.lats = np.asarray(coords.lats)
+        self.lngs = np.asarray(coords.lngs)
+        # El CSR guarda cada calle en ambos sentidos: una sola vez (u < v)
+        rows = np.repeat(np.arange(len(coords), dtype=np.int64), np.diff(walking.indptr))
+        keep = rows < walking.indices
+        self.street_u = rows[keep]
+        self.street_v = np.asarray(walking.indices)[keep]
+        self.route_u = coords.positions(store.edge_source)
+        self.route_v = coords.positions(store.edge_target)
+        self.route_pattern = np.repeat(np.arange(len(store), dtype=np.int64), np.diff(store.pattern_ptr))
+        self.patterns = store.patterns
+        self.route_names = route_names
+        # Desde un snapshot se usa la huella que se calculó al escribirlo
+        self._version = version or self.content_hash()
+
+    def content_hash(self):
+        """Huella de lo que se dibuja (nodos, calles, rutas y nombres), no de cuándo se cargó."""
+        digest = hashlib.sha1()
+        for array in (self.node_ids, self.lats, self.lngs, self.street_u, self.street_v,
+                      self.route_u, self.route_v, self.route_pattern):
+            digest.update(np.ascontiguousarray(array).data)
+        digest.update(repr((list(self.patterns), sorted(self.route_names.items()))).encode())
+        return 'graph-' + digest.hexdigest()[:12]
+
+    def version(self):
+        return self._version
+
+    def bbox(self):
+        if not len(self.lats):
+            return None
+        return float(self.lngs.min()), float(self.lats.min()), float(self.lngs.max()), float(self.lats.max())
+
+    def render(self, z, x, y):
+        inside = in_bounds(self.lats, self.lngs, tile_bounds(z, x, y, BUFFER))
+        layers = []
+
+        if z >= NODES_MIN_ZOOM:
+            nodes = LayerBuilder('nodes')
+            positions = np.flatnonzero(inside)
+            xs, ys = project(self.lats[positions], self.lngs[positions], z, x, y)
+            for node_id, px, py in zip(self.node_ids[positions].tolist(), xs.tolist(), ys.tolist()):
+                nodes.add_points([px], [py], {}, feature_id=node_id)
+            layers.append(nodes)
+
+        if z >= EDGES_MIN_ZOOM:
+            edges = LayerBuilder('edges')
+            keep = inside[self.street_u] | inside[self.street_v]
+            u, v = self.street_u[keep], self.street_v[keep]
+            ux, uy = project(self.lats[u], self.lngs[u], z, x, y)
+            vx, vy = project(self.lats[v], self.lngs[v], z, x, y)
+            for segment in zip(ux.tolist(), uy.tolist(), vx.tolist(), vy.tolist()):
+                edges.add_lines([[segment[:2], segment[2:]]], {})
+            layers.append(edges)
+
+        routes = LayerBuilder('routes')
+        keep = inside[self.route_u] | inside[self.route_v]
+        tolerance = tolerance_for_zoom(z)
+        by_pattern = {}
+        for pattern, u, v in zip(self.route_pattern[keep].tolist(), self.route_u[keep].tolist(),
+                                 self.route_v[keep].tolist()):
+            by_pattern.setdefault(pattern, []).append((u, v))
+        for pattern, pairs in sorted(by_pattern.items()):
+            parts = []
+            for run in chain_segments(pairs):
+                points = simplify(list(zip(self.lats[run].tolist(), self.lngs[run].tolist())), tolerance)
+                xs, ys = project([p[0] for p in points], [p[1] for p in points], z, x, y)
+                parts.append(list(zip(xs.tolist(), ys.tolist())))
+            route_id, direction = self.patterns[pattern]
+            routes.add_lines(parts, {
+                'route_id': int(route_id),
+                'direction': str(direction),
+                'name': self.route_names.get(route_id),
+            })
+        layers.append(routes)
+        return encode_tile(layers)
+
+
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+           ST_Transform(ST_Expand(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), %(margin)s), 4326) AS search
+),
+node_features AS (
+    SELECT n.id, ST_AsMVTGeom(ST_Transform(n.location, 3857), bounds.geom, %(extent)s, %(buffer)s, true) AS geom
+    FROM nodes n, bounds
+    WHERE %(z)s >= %(nodes_min_zoom)s AND n.location && bounds.search
+),
+edge_features AS (
+    SELECT e.id, ST_AsMVTGeom(
+               ST_Simplify(ST_Transform(e.geometry, 3857), %(tolerance)s), bounds.geom, %(extent)s, %(buffer)s, true
+           ) AS geom
+    FROM edges e, bounds
+    WHERE %(z)s >= %(edges_min_zoom)s AND e.geometry && bounds.search
+),
+route_features AS (
+    SELECT re.route_id, re.direction, r.name, ST_AsMVTGeom(
+               ST_Simplify(ST_LineMerge(ST_Collect(ST_Transform(e.geometry, 3857))), %(tolerance)s),
+               bounds.geom, %(extent)s, %(buffer)s, true
+           ) AS geom
+    FROM route_edges re
+    JOIN edges e ON e.id = re.edge_id
+    JOIN routes r ON r.id = re.route_id
+    CROSS JOIN bounds
+    WHERE e.geometry && bounds.search
+    GROUP BY re.route_id, re.direction, r.name, bounds.geom
+)
+SELECT COALESCE((SELECT ST_AsMVT(f, 'nodes', %(extent)s, 'geom', 'id') FROM node_features f WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(f, 'edges', %(extent)s, 'geom', 'id') FROM edge_features f WHERE geom IS NOT NULL), '')
+    || COALESCE((SELECT ST_AsMVT(f, 'routes', %(extent)s, 'geom') FROM route_features f WHERE geom IS NOT NULL), '')
+"""
+
+
+class PostgisTileSource:
+    """Tiles con ST_AsMVT (PostGIS 3+ compilado con protobuf), con la geometría real de las calles."""
+
+    engine = 'postgis'
+
+    def bbox(self):
+        from django.contrib.gis.db.models import Extent
+        from Nodes.models import Node
+
+        return Node.objects.aggregate(extent=Extent('location'))['extent']
+
+    def version(self):
+        return db_version()
+
+    def render(self, z, x, y):
+        from django.db import connection
+
+        tile_size = 2 * WEB_MERCATOR_HALF / 2 ** z
+        params = {
+            'z': z, 'x': x, 'y': y,
+            'extent': EXTENT,
+            'buffer': BUFFER,
+            'margin': tile_size * BUFFER / EXTENT,
+            # Un píxel en metros de Web Mercator, igual que tolerance_for_zoom en el ecuador
+            'tolerance': tile_size / 256,
+            'nodes_min_zoom': NODES_MIN_ZOOM,
+            'edges_min_zoom': EDGES_MIN_ZOOM,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(TILE_SQL, params)
+            return bytes(cursor.fetchone()[0] or b'')
+
+
+def postgis_mvt_available():
+    """ST_AsMVT con id de feature y ST_TileEnvelope: PostGIS 3.0+ con soporte protobuf."""
+    global _postgis_mvt
+    if _postgis_mvt is None:
+        from django.db import DatabaseError, connection
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT postgis_lib_version(), postgis_full_version()")
+                version, full = cursor.fetchone()
+            _postgis_mvt = int(version.split('.')[0]) >= 3 and 'PROTOBUF' in full
+        except DatabaseError:
+            logger.exception("No se pudo consultar la versión de PostGIS")
+            _postgis_mvt = False
+    return _postgis_mvt
+
+
+def graph_tile_source():
+    from Routes.services.graph_loader import build_graphs
+    from Routes.services.graph_snapshot import get_snapshot, load_route_names
+    from Routes.services.walking_path import get_walking_graph
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        source = GraphTileSource(
+            snapshot.walking, snapshot.route_store, snapshot.route_names, 'graph-' + snapshot.content_hash
+        )
+        return source, snapshot.version
+    return GraphTileSource(get_walking_graph(), build_graphs(), load_route_names()), None
+
+
+def _graph_source():
+    """
+    Fuente "python" del proceso. Cada VERSION_TTL s mira el snapshot publicado
+    (ROUTING_SNAPSHOT_DIR/CURRENT) y, si es otro, arma la fuente desde él: los
+    tiles siguen al snapshot nuevo aunque el grafo de ruteo del proceso no cambie.
+    """
+    global _source, _source_snapshot, _source_checked
+    if _source is not None and time.monotonic() - _source_checked < VERSION_TTL:
+        return _source
+    from django.conf import settings
+    from Routes.services.graph_snapshot import attach_snapshot, published_version
+
+    with _source_lock:
+        if _source is None:
+            _source, _source_snapshot = graph_tile_source()
+        elif time.monotonic() - _source_checked >= VERSION_TTL and settings.ROUTING_SNAPSHOT_DIR:
+            root = settings.ROUTING_SNAPSHOT_DIR
+            try:
+                if published_version(root) != _source_snapshot:
+                    snapshot = attach_snapshot(root)
+                    _source = GraphTileSource(
+                        snapshot.walking, snapshot.route_store, snapshot.route_names,
+                        'graph-' + snapshot.content_hash,
+                    )
+                    _source_snapshot = snapshot.version
+                    logger.info("Tiles desde el snapshot %s (%s)", snapshot.version, _source.version())
+            except (OSError, ValueError):
+                logger.exception("No se pudo adjuntar el snapshot publicado en %s", root)
+        _source_checked = time.monotonic()
+    return _source
+
+
+def get_tile_source(engine=None):
+    """
+    Fuente de tiles según ROUTING_TILES_ENGINE (o `engine`): "postgis",
+    "python" o "auto" (ST_AsMVT si la base lo soporta, si no el grafo en memoria).
+    """
+    from django.conf import settings
+
+    engine = engine or settings.ROUTING_TILES_ENGINE
+    if engine == 'auto':
+        engine = 'postgis' if postgis_mvt_available() else 'python'
+    if engine == 'postgis':
+        return PostgisTileSource()
+    if engine != 'python':
+        raise ValueError(f"Motor de tiles desconocido: {engine}")
+    return _graph_source()
+
+
+def db_version():
+    """
+    Versión de lo que dibuja ST_AsMVT sin agregados en la petición: la huella
+    de contenido del snapshot publicado (calculada al escribirlo) o, sin
+    snapshot, la `source_checksum` que refresh_route_patterns guardó en
+    route_patterns. Se revisa cada VERSION_TTL s; si no hay ninguna de las
+    dos, la huella de route_edges se calcula una sola vez por proceso.
+    """
+    global _db_version
+    if _db_version is not None and time.monotonic() - _db_version[0] < VERSION_TTL:
+        return _db_version[1]
+    from django.conf import settings
+    from Routes.models import RoutePattern
+    from Routes.services.graph_snapshot import published_content_hash
+    from Routes.services.route_patterns import route_edges_checksum
+
+    version = None
+    root = settings.ROUTING_SNAPSHOT_DIR
+    if root:
+        try:
+            version = 'db-' + published_content_hash(root)
+        except (OSError, ValueError):
+            logger.warning("No hay snapshot publicado en %s para versionar los tiles", root)
+    if version is None:
+        checksum = RoutePattern.objects.values_list('source_checksum', flat=True).first()
+        if checksum:
+            version = 'db-' + checksum[:12]
+    if version is None:
+        if _db_version is not None:
+            version = _db_version[1]
+        else:
+            version = 'db-' + route_edges_checksum()[:12]
+    _db_version = (time.monotonic(), version)
+    return version
+
+
+def tile_version(engine=None):
+    """Versión de los datos de la fuente para la llave de caché y el ETag (ver `version()` de cada fuente)."""
+    return get_tile_source(engine).version()
+
+
+class TileCache:
+    """Tiles en disco: <root>/<versión>/<motor>/<z>/<x>/<y>.mvt; un tile vacío es un archivo vacío."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, version, engine, z, x, y):
+        return os.path.join(self.root, version, engine, str(z), str(x), f'{y}.mvt')
+
+    def get(self, version, engine, z, x, y):
+        try:
+            with open(self.path(version, engine, z, x, y), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, version, engine, z, x, y, data):
+        path = self.path(version, engine, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otro worker nunca lee un tile a medias
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def prune(self, version, engine):
+        """
+        Borra los tiles del motor de las versiones anteriores a `version` (más
+        viejas que su directorio): en Cloud Run la caché vive en RAM. Las
+        posteriores son de otro worker que ya ve datos nuevos y no se tocan.
+        Devuelve las versiones borradas.
+        """
+        try:
+            current = os.path.getmtime(os.path.join(self.root, version))
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        removed = []
+        for name in names:
+            directory = os.path.join(self.root, name)
+            try:
+                if name == version or os.path.getmtime(directory) > current:
+                    continue
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(os.path.join(directory, engine), ignore_errors=True)
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass  # quedan tiles de otro motor
+            removed.append(name)
+        if removed:
+            logger.info("Tiles %s viejos borrados en %s: %s", engine, self.root, ", ".join(removed))
+        return removed
+
+
+def get_tile(z, x, y, engine=None, cache_dir=None, refresh=False):
+    """
+    Devuelve (bytes, versión, motor, en_caché). Con ROUTING_TILES_DIR (o
+    `cache_dir`) los tiles se leen y escriben en disco; `refresh` regenera.
+    """
+    from django.conf import settings
+
+    source = get_tile_source(engine)
+    version = source.version()
+    root = cache_dir if cache_dir is not None else settings.ROUTING_TILES_DIR
+    cache = TileCache(root) if root else None
+    if cache is not None and not refresh:
+        data = cache.get(version, source.engine, z, x, y)
+        if data is not None:
+            TILE_REQUESTS.inc(engine=source.engine, cache='hit')
+            return data, version, source.engine, True
+    data = source.render(z, x, y)
+    if cache is not None:
+        try:
+            cache.put(version, source.engine, z, x, y, data)
+        except OSError:
+            logger.exception("No se pudo guardar el tile %d/%d/%d", z, x, y)
+        else:
+            # Una vez por versión y proceso: al cambiar los datos se borran los tiles viejos
+            key = (root, source.engine)
+            if _cache_pruned.get(key) != version:
+                _cache_pruned[key] = version
+                cache.prune(version, source.engine)
+    TILE_REQUESTS.inc(engine=source.engine, cache='miss' if cache is not None else 'off')
+    return data, version, source.engine, False
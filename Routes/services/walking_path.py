@@ -1,27 +1,231 @@
-import networkx as nx
-from Nodes.models import Node, Edge
-from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.measure import D
-
-def find_nearest_node(lat, lng, max_distance=500):
-    point = Point(lng, lat, srid=4326)
-    return Node.objects.filter(
-        location__distance_lte=(point, D(m=max_distance))
-    ).annotate(
-        distance=Distance('location', point)
-    ).order_by('distance').first()
-
-def compute_walking_path(graph, start_coord, end_node):
-    # Encuentra nodo más cercano al punto de inicio
-    origin_node = find_nearest_node(start_coord[0], start_coord[1])
-    if not origin_node:
-        return None, None
+import heapq
+import threading
+import time
+from itertools import count
+
+import numpy as np
+
+from Routes.services.bulk_load import stream_columns
+from Routes.services.coordinates import NodeCoordinates
+from Routes.services.metrics import GRAPH_BUILD_SECONDS
+from Routes.services.spatial_index import GridIndex
+
+SNAP_RADIUS = 400     # m alrededor de cada punto para buscar nodos de acceso
+MAX_SNAP_NODES = 30   # nodos de acceso por punto (caminata y transporte)
+WALK_SPEED = 1.3      # m/s, para estimar la duración
+CHUNK_SIZE = 20000
+
+walking_graph = None
+_walking_lock = threading.Lock()
+
+
+class WalkingGraph:
+    """
+    Capa peatonal (calles) como CSR no dirigido indexado por posición en
+    `coords.ids`. Los nodos se identifican por Node.id, igual que el grafo de
+    transporte, y el snapping se hace en memoria con un GridIndex.
+    """
+
+    def __init__(self, coords, sources, targets, distances):
+        self.coords = coords
+        self.index = GridIndex(coords.ids, coords.lats, coords.lngs)
+        u = coords.positions(sources)
+        v = coords.positions(targets)
+        rows = np.concatenate([u, v])
+        order = np.argsort(rows, kind='stable')
+        self.indices = np.concatenate([v, u])[order]
+        self.weights = np.concatenate([distances, distances]).astype(np.float64)[order]
+        self.indptr = np.searchsorted(rows[order], np.arange(len(coords) + 1)).astype(np.int64)
+
+    @classmethod
+    def from_arrays(cls, coords, index, indptr, indices, weights):
+        """Envuelve arreglos ya construidos (p. ej. mmap de un snapshot) sin copiarlos."""
+        obj = cls.__new__(cls)
+        obj.coords = coords
+        obj.index = index
+        obj.indptr = indptr
+        obj.indices = indices
+        obj.weights = weights
+        return obj
+
+    def __len__(self):
+        return len(self.coords)
+
+    @property
+    def edge_count(self):
+        return len(self.indices) // 2
+
+    def _neighbors(self, i):
+        a = self.indptr[i]
+        b = self.indptr[i + 1]
+        return zip(self.indices[a:b].tolist(), self.weights[a:b].tolist())
+
+    def snap(self, lat, lng, radius=SNAP_RADIUS, limit=MAX_SNAP_NODES):
+        """{posición: distancia_m} de los nodos de acceso alrededor del punto."""
+        ids, dist = self.index.within(lat, lng, radius, limit=limit)
+        return dict(zip(self.coords.positions(ids).tolist(), dist.tolist()))
+
+    def shortest_path(self, sources, targets):
+        """
+        Dijkstra bidireccional multi-origen/multi-destino. `sources` y
+        `targets` son {posición: costo de acceso}. Devuelve
+        (distancia, [node_id, ...]) o None.
+        """
+        dist = ({}, {})
+        seen = ({}, {})
+        pred = ({}, {})
+        heaps = ([], [])
+        c = count()
+        mu = float('inf')
+        meet = None
 
-    # Usa el grafo para calcular camino peatonal
-    try:
-        path = nx.shortest_path(graph, origin_node.osm_id, end_node.osm_id, weight='weight')
-        distance = nx.shortest_path_length(graph, origin_node.osm_id, end_node.osm_id, weight='weight')
-        return path, distance
-    except Exception:
+        for side, seeds in enumerate((sources, targets)):
+            for i, cost in seeds.items():
+                if cost < seen[side].get(i, float('inf')):
+                    seen[side][i] = cost
+                    pred[side][i] = None
+                    heapq.heappush(heaps[side], (cost, next(c), i))
+        for i in seen[0]:
+            if i in seen[1] and seen[0][i] + seen[1][i] < mu:
+                mu = seen[0][i] + seen[1][i]
+                meet = i
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= mu:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, _, u = heapq.heappop(heaps[side])
+            if u in dist[side]:
+                continue
+            dist[side][u] = d
+            other = seen[1 - side]
+            for v, w in self._neighbors(u):
+                nd = d + w
+                if v in dist[side] or nd >= seen[side].get(v, float('inf')):
+                    continue
+                seen[side][v] = nd
+                pred[side][v] = u
+                heapq.heappush(heaps[side], (nd, next(c), v))
+                if v in other and nd + other[v] < mu:
+                    mu = nd + other[v]
+                    meet = v
+
+        if meet is None:
+            return None
+        forward = [meet]
+        while pred[0][forward[-1]] is not None:
+            forward.append(pred[0][forward[-1]])
+        forward.reverse()
+        i = meet
+        while pred[1][i] is not None:
+            i = pred[1][i]
+            forward.append(i)
+        return mu, self.coords.ids[forward].tolist()
+
+    def distances_from(self, sources, targets_list, max_distance=float('inf')):
+        """
+        Uno-a-muchos: un solo Dijkstra desde `sources` ({posición: costo}).
+        `targets_list` es una lista de {posición: costo}, uno por destino.
+        Devuelve una lista con la distancia a cada destino (None si no se alcanza).
+        Los destinos sin nodos de acceso se descartan antes de buscar: si no,
+        su distancia infinita impediría el corte temprano.
+        """
+        best = [float('inf')] * len(targets_list)
+        by_node = {}
+        for j, seeds in enumerate(targets_list):
+            for i, cost in seeds.items():
+                by_node.setdefault(i, []).append((j, cost))
+        reachable = [j for j, seeds in enumerate(targets_list) if seeds]
+        if not reachable:
+            return [None] * len(targets_list)
+
+        dist = {}
+        seen = {}
+        heap = []
+        c = count()
+        worst = float('inf')  # mayor distancia entre los destinos alcanzables
+        for i, cost in sources.items():
+            if cost < seen.get(i, float('inf')):
+                seen[i] = cost
+                heapq.heappush(heap, (cost, next(c), i))
+        while heap:
+            d, _, u = heapq.heappop(heap)
+            if u in dist:
+                continue
+            # Todos los destinos ya tienen una distancia que ningún nodo pendiente mejora
+            if d > max_distance or d >= worst:
+                break
+            dist[u] = d
+            improved = False
+            for j, cost in by_node.get(u, ()):
+                if d + cost < best[j]:
+                    best[j] = d + cost
+                    improved = True
+            if improved:
+                worst = max(best[j] for j in reachable)
+            for v, w in self._neighbors(u):
+                nd = d + w
+                if v not in dist and nd < seen.get(v, float('inf')):
+                    seen[v] = nd
+                    heapq.heappush(heap, (nd, next(c), v))
+        return [b if b <= max_distance and b != float('inf') else None for b in best]
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.index.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+
+def load_walking_graph(chunk_size=CHUNK_SIZE):
+    """
+    Carga nodos (lat/lng crudos vía ST_Y/ST_X) y calles por bloques a arreglos
+    NumPy; no lee la geometría de las calles.
+    """
+    from django.db.models import FloatField, Func
+    from Nodes.models import Node, Edge
+
+    ids, lats, lngs = stream_columns(
+        Node.objects.annotate(
+            lng=Func('location', function='ST_X', output_field=FloatField()),
+            lat=Func('location', function='ST_Y', output_field=FloatField()),
+        ),
+        ('id', 'lat', 'lng'),
+        (np.int64, np.float64, np.float64),
+        chunk_size,
+    )
+    sources, targets, distances = stream_columns(
+        Edge.objects.all(),
+        ('source_id', 'target_id', 'distance'),
+        (np.int64, np.int64, np.float64),
+        chunk_size,
+    )
+    return WalkingGraph(NodeCoordinates(ids, lats, lngs), sources, targets, distances)
+
+
+def get_walking_graph():
+    """Capa peatonal del proceso, construida una sola vez aunque haya varios hilos."""
+    global walking_graph
+    if walking_graph is None:
+        with _walking_lock:
+            if walking_graph is None:
+                from Routes.services.graph_snapshot import get_snapshot
+
+                start = time.perf_counter()
+                snapshot = get_snapshot()
+                walking_graph = snapshot.walking if snapshot is not None else load_walking_graph()
+                GRAPH_BUILD_SECONDS.set(time.perf_counter() - start, graph="walking")
+    return walking_graph
+
+
+def compute_walking_path(start_coord, end_coord, graph=None):
+    """Camino peatonal entre dos puntos (lat, lng). Devuelve (path, distancia) o (None, None)."""
+    if graph is None:
+        graph = get_walking_graph()
+    sources = graph.snap(*start_coord)
+    targets = graph.snap(*end_coord)
+    if not sources or not targets:
+        return None, None
+    found = graph.shortest_path(sources, targets)
+    if not found:
         return None, None
+    distance, path = found
+    return path, distance
@@ -0,0 +1,155 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "eager", "background")
+RETRIES = 5          # reintentos tras un fallo (p. ej. la BD todavía no acepta conexiones)
+BACKOFF = 2.0        # s antes del primer reintento; se duplica en cada uno
+MAX_BACKOFF = 60.0
+
+
+class WarmupState:
+    """Progreso de la carga inicial de este proceso, para /healthz/ready."""
+
+    def __init__(self):
+        self.mode = None
+        self.phases = {}
+        self.total_ms = None
+        self.error = None
+        self.ready = threading.Event()
+
+    @property
+    def status(self):
+        if self.ready.is_set():
+            return "ready"
+        if self.error is not None:
+            return "failed"
+        return "warming"
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "mode": self.mode,
+            "phases_ms": {name: round(ms, 1) for name, ms in self.phases.items()},
+            "total_ms": round(self.total_ms, 1) if self.total_ms is not None else None,
+            "error": self.error,
+        }
+
+
+state = WarmupState()
+
+
+def _phases():
+    from Routes.services.graph_loader import build_graphs
+    from Routes.services.graph_snapshot import get_snapshot
+    from Routes.services.search_pool import get_search_pool
+    from Routes.services.walking_path import get_walking_graph
+    from Routes.views import get_transport_graph
+
+    return (
+        # Primero lo que el grafo de transporte reutiliza, para no construirlo dos veces
+        ("snapshot", get_snapshot),
+        ("walking_graph", get_walking_graph),
+        ("route_store", build_graphs),
+        ("transport_graph", get_transport_graph),
+        ("search_pool", get_search_pool),
+    )
+
+
+def graphs_loaded():
+    """True si este proceso ya tiene los grafos, los haya cargado el warm-up o una petición."""
+    from Routes import views
+    from Routes.services import graph_loader, walking_path
+
+    return all(graph is not None for graph in (
+        walking_path.walking_graph, graph_loader.route_store, views.graph_cache,
+    ))
+
+
+def refresh_ready():
+    """
+    Marca el proceso listo si el warm-up falló pero la carga perezosa de una
+    petición posterior sí completó los grafos: un error transitorio al
+    arrancar no deja al worker fuera de rotación para siempre.
+    """
+    if not state.ready.is_set() and state.error is not None and graphs_loaded():
+        logger.info("Grafos cargados de forma perezosa tras el fallo del warm-up: %s", state.error)
+        state.error = None
+        state.ready.set()
+
+
+def warm_up(retries=RETRIES, backoff=BACKOFF):
+    """
+    Carga capa peatonal (con su índice espacial), RouteStore, grafo de
+    transporte y pool de búsquedas, registrando la duración de cada fase.
+    Si una fase falla se reintenta todo con espera exponencial (las fases ya
+    cargadas no se repiten: quedan en caché en sus módulos). Si se agotan los
+    reintentos, las peticiones siguen cargando todo de forma perezosa y
+    `refresh_ready` marca el proceso listo cuando lo logran.
+    """
+    from django.db import connections
+
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            for name, load in _phases():
+                phase_start = time.perf_counter()
+                load()
+                state.phases[name] = (time.perf_counter() - phase_start) * 1000
+                logger.info("Warm-up %s: %.1f ms", name, state.phases[name])
+            break
+        except Exception as e:
+            state.error = f"{type(e).__name__}: {e}"
+            if attempt == retries:
+                logger.exception("Warm-up del grafo falló tras %d intentos", retries + 1)
+                return
+            delay = min(backoff * 2 ** attempt, MAX_BACKOFF)
+            logger.exception("Warm-up del grafo falló, reintento en %.0f s", delay)
+        finally:
+            # Las conexiones abiertas por este hilo no se reutilizan
+            connections.close_all()
+        time.sleep(delay)
+    state.error = None
+    state.total_ms = (time.perf_counter() - start) * 1000
+    state.ready.set()
+    logger.info("Warm-up completo en %.1f ms (%s)", state.total_ms,
+                ", ".join(f"{name}={ms:.0f}ms" for name, ms in state.phases.items()))
+
+
+def _serves_requests():
+    """False para comandos de manage.py (migrate, import_routes...) y el proceso vigía de runserver."""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    if 'runserver' not in sys.argv:
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
+def start_warmup(in_worker=False):
+    """
+    Inicia la carga según ROUTING_WARMUP: "eager" bloquea hasta terminar,
+    "background" usa un hilo y "off" deja la carga perezosa (listo de inmediato).
+    Con gunicorn (ROUTING_WARMUP_DEFER=1) el master no carga nada: cada worker
+    llama a esta función desde post_fork con `in_worker=True`. Un modo
+    desconocido lanza ImproperlyConfigured.
+    """
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+
+    mode = settings.ROUTING_WARMUP
+    if mode not in MODES:
+        raise ImproperlyConfigured(f"ROUTING_WARMUP={mode!r}: usa uno de {', '.join(MODES)}")
+    state.mode = mode
+    if mode == "off":
+        state.ready.set()
+        return
+    if not in_worker and (os.environ.get('ROUTING_WARMUP_DEFER') == '1' or not _serves_requests()):
+        return
+    if mode == "eager":
+        warm_up()
+    else:
+        threading.Thread(target=warm_up, name='routing-warmup', daemon=True).start()
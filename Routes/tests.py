@@ -1,3 +1,181 @@
-from django.test import TestCase
+import math
 
-# Create your tests here.
+import networkx as nx
+import numpy as np
+from django.test import SimpleTestCase
+
+from Routes.benchmarks.synthetic import city_grid
+from Routes.services.multi_source import multi_source_dijkstra_path
+from Routes.services.path_finder import find_routes_with_transfers
+
+# Los routers propios contra networkx sobre la ciudad sintética de los
+# benchmarks: no necesitan PostGIS ni datos cargados.
+
+SOURCE = 'source'
+TARGET = 'target'
+TRANSFER_PENALTY = 800
+
+
+def with_terminals(G, sources, targets):
+    """Copia de G con un nodo origen y uno destino unidos a las semillas con su costo."""
+    H = G.copy() if G.is_directed() else G.to_directed()
+    H.add_nodes_from((SOURCE, TARGET))
+    H.add_weighted_edges_from((SOURCE, node, cost) for node, cost in sources.items())
+    H.add_weighted_edges_from((node, TARGET, cost) for node, cost in targets.items())
+    return H
+
+
+def reference_cost(G, sources, targets):
+    """Costo óptimo según networkx, o None si no hay camino."""
+    try:
+        return nx.dijkstra_path_length(with_terminals(G, sources, targets), SOURCE, TARGET)
+    except nx.NetworkXNoPath:
+        return None
+
+
+class RouterTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.city = city_grid(nodes=900, routes=8, seed=7)
+        cls.walking = cls.city.walking_graph()
+        cls.store = cls.city.route_store()
+        cls.streets = nx.Graph()
+        cls.streets.add_weighted_edges_from(zip(
+            cls.city.edge_source.tolist(), cls.city.edge_target.tolist(), cls.city.edge_distance.tolist()
+        ))
+        cls.pairs = cls.city.od_pairs(20, seed=3)
+
+    def seeds(self, lat, lng):
+        """{node_id: distancia} de los nodos de acceso, como los usan las vistas."""
+        positions = self.walking.snap(lat, lng)
+        return {int(self.walking.coords.ids[i]): d for i, d in positions.items()}
+
+    def path_length(self, path):
+        return sum(self.city.street_distance(u, v) for u, v in zip(path, path[1:]))
+
+
+class WalkingGraphTests(RouterTestCase):
+    def test_shortest_path_matches_networkx(self):
+        for start, end in self.pairs:
+            sources, targets = self.walking.snap(*start), self.walking.snap(*end)
+            found = self.walking.shortest_path(sources, targets)
+            expected = reference_cost(self.streets, self.seeds(*start), self.seeds(*end))
+            if expected is None:
+                self.assertIsNone(found)
+                continue
+            distance, path = found
+            self.assertAlmostEqual(distance, expected, places=6)
+            # El camino devuelto es real y cuesta lo que dice
+            first, last = self.walking.coords.positions([path[0], path[-1]]).tolist()
+            cost = sources[first] + self.path_length(path) + targets[last]
+            self.assertAlmostEqual(cost, distance, places=6)
+            self.assertEqual(len(path), len(set(path)))
+
+    def test_distances_from_matches_networkx(self):
+        start = self.pairs[0][0]
+        ends = [end for _, end in self.pairs]
+        distances = self.walking.distances_from(
+            self.walking.snap(*start), [self.walking.snap(*end) for end in ends]
+        )
+        for end, distance in zip(ends, distances):
+            expected = reference_cost(self.streets, self.seeds(*start), self.seeds(*end))
+            if expected is None:
+                self.assertIsNone(distance)
+            else:
+                self.assertAlmostEqual(distance, expected, places=6)
+
+
+class GridIndexTests(RouterTestCase):
+    def test_within_matches_brute_force(self):
+        index = self.walking.index
+        coords = self.walking.coords
+        radius = 250
+        for lat, lng in [point for pair in self.pairs for point in pair]:
+            ids, dist = index.within(lat, lng, radius)
+            brute = np.hypot((coords.lngs - lng) * index.kx, (coords.lats - lat) * index.ky)
+            expected = coords.ids[brute <= radius]
+            self.assertEqual(sorted(ids.tolist()), sorted(expected.tolist()))
+            self.assertTrue(np.all(np.diff(dist) >= 0))
+
+    def test_within_limit_keeps_nearest(self):
+        lat, lng = self.pairs[0][0]
+        _, dist = self.walking.index.within(lat, lng, 400)
+        _, limited = self.walking.index.within(lat, lng, 400, limit=5)
+        self.assertEqual(limited.tolist(), dist[:5].tolist())
+
+    def test_non_finite_point_has_no_neighbours(self):
+        for lat, lng in [(math.nan, -71.5), (-16.4, math.inf)]:
+            ids, _ = self.walking.index.within(lat, lng, 400)
+            self.assertEqual(len(ids), 0)
+
+
+class MultiSourceTests(RouterTestCase):
+    def test_matches_networkx(self):
+        G = self.streets.to_directed()
+        for start, end in self.pairs:
+            sources, targets = self.seeds(*start), self.seeds(*end)
+            found = multi_source_dijkstra_path(G, sources, targets)
+            expected = reference_cost(G, sources, targets)
+            if expected is None:
+                self.assertIsNone(found)
+                continue
+            cost, path = found
+            self.assertAlmostEqual(cost, expected, places=6)
+            self.assertAlmostEqual(sources[path[0]] + self.path_length(path) + targets[path[-1]], cost, places=6)
+
+
+class TransferRouterTests(RouterTestCase):
+    def transfer_graph(self):
+        """
+        Grafo (nodo, patrón) equivalente al router con transbordos sin límite:
+        aristas de bus dentro de cada patrón y cambios de patrón en un mismo
+        nodo con TRANSFER_PENALTY.
+        """
+        G = nx.DiGraph()
+        for pattern in range(len(self.store)):
+            G.add_weighted_edges_from(
+                ((u, pattern), (v, pattern), d) for u, v, d in self.store.pattern_edges(pattern)
+            )
+        for node in self.store.node_ids.tolist():
+            patterns = self.store.patterns_at(node)
+            G.add_weighted_edges_from(
+                ((node, a), (node, b), TRANSFER_PENALTY) for a in patterns for b in patterns if a != b
+            )
+        return G
+
+    def test_matches_networkx(self):
+        G = self.transfer_graph()
+        checked = 0
+        for start, end in self.pairs:
+            origins, destinations = self.seeds(*start), self.seeds(*end)
+            found = find_routes_with_transfers(
+                origins, destinations, max_transfers=len(self.store),
+                transfer_penalty=TRANSFER_PENALTY, store=self.store,
+            )
+            expected = reference_cost(
+                G,
+                {(n, p): c for n, c in origins.items() for p in self.store.patterns_at(n)},
+                {(n, p): c for n, c in destinations.items() for p in self.store.patterns_at(n)},
+            )
+            if expected is None:
+                self.assertEqual(found, [])
+                continue
+            checked += 1
+            result = found[0]
+            self.assertAlmostEqual(result["total_cost"], expected, places=6)
+
+            # El costo se reconstruye desde el camino: caminatas, tramos y transbordos
+            path = result["path"]
+            cost = origins[path[0][0]] + destinations[path[-1][0]]
+            transfers = 0
+            for (u, a), (v, b) in zip(path, path[1:]):
+                if a != b:
+                    self.assertEqual(u, v)
+                    transfers += 1
+                    cost += TRANSFER_PENALTY
+                else:
+                    cost += self.store.hop_distance(self.store.pattern_index[a], u, v)
+            self.assertEqual(transfers, result["transfers"])
+            self.assertAlmostEqual(cost, result["total_cost"], places=6)
+        self.assertGreater(checked, 0)
@@ -0,0 +1,35 @@
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
+
+from Routes.services.vector_tiles import CONTENT_TYPE, TILE_REQUESTS, get_tile, get_tile_source, valid_tile
+
+TILE_MAX_AGE = 3600  # s; la versión de los datos va en el ETag
+
+
+def tile_etag(version, engine):
+    return f'"{version}-{engine}"'
+
+
+@require_GET
+def tile_view(request, z, x, y):
+    """
+    Vector tile (Mapbox Vector Tile) con las capas nodes, edges y routes.
+    Los tiles sin contenido se responden con 204. El ETag depende solo de la
+    versión de los datos, así que un If-None-Match vigente se responde con
+    304 sin leer ni dibujar el tile.
+    """
+    if not valid_tile(z, x, y):
+        raise Http404("Tile fuera de rango")
+    source = get_tile_source()
+    etag = tile_etag(source.version(), source.engine)
+    if request.headers.get('If-None-Match') == etag:
+        TILE_REQUESTS.inc(engine=source.engine, cache='not_modified')
+        response = HttpResponseNotModified()
+    else:
+        data, version, engine, cached = get_tile(z, x, y, engine=source.engine)
+        etag = tile_etag(version, engine)
+        response = HttpResponse(data, content_type=CONTENT_TYPE) if data else HttpResponse(status=204)
+        response['X-Tile-Cache'] = 'hit' if cached else 'miss'
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={TILE_MAX_AGE}'
+    return response
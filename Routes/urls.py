@@ -1,8 +1,13 @@
 from django.urls import path
 
-from Routes.views import OptimalRouteView
+from Routes.async_views import AsyncOptimalRouteView
+from Routes.export_views import export_view
+from Routes.views import OptimalRouteView, WalkingRouteView
 
 
 urlpatterns = [
     path('optimal-route/', OptimalRouteView.as_view(), name='optimal-route'),
+    path('optimal-route-async/', AsyncOptimalRouteView.as_view(), name='optimal-route-async'),
+    path('walking-route/', WalkingRouteView.as_view(), name='walking-route'),
+    path('export/<str:layer>', export_view, name='export'),
 ]
\ No newline at end of file
@@ -1,63 +1,113 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
 import networkx as nx
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
 from django.contrib.gis.db.models.functions import Distance
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from Nodes.models import Node, Edge
-from Routes.models import Route, RouteEdge
+from Nodes.models import Node
+from Routes.services.multi_source import multi_source_dijkstra_path
+from Routes.services.path_finder import find_routes_with_transfers, hop_distance
+from Routes.services.graph_snapshot import (
+    current_snapshot, get_snapshot, load_osm_ids, load_route_names, transport_digraph,
+)
+from Routes.services.graph_loader import build_graphs
+from Routes.services import graph_loader, search_pool, walking_path
+from Routes.services.metrics import (
+    GRAPH_BUILD_SECONDS, SEARCH_LIMIT_HITS, observe_request, register_collector, render,
+    resident_memory_bytes,
+)
+from Routes.services.profiling import profile_request
+from Routes.services.polyline import encode_polyline, simplify, tolerance_for_zoom
+from Routes.services.route_cache import RouteCache
+from Routes.services.single_flight import SingleFlight
+from Routes.services.timing import StageTimer
+from Routes.services.walking_path import MAX_SNAP_NODES, SNAP_RADIUS, WALK_SPEED, get_walking_graph
+from Routes.services.warmup import refresh_ready, state as warmup_state
+
+logger = logging.getLogger(__name__)
 
 # Ajusta estos parámetros según tu preferencia
 WALK_PENALTY = 2.5        # Caminata vale 2.5x metros respecto a ir en bus
 TRANSFER_PENALTY = 800    # Penalización fija por cambio de bus o de modo, en "metros virtuales"
 MAX_ROUTE_CANDIDATES = 6  # Busca hasta 6 rutas candidatas
+MAX_TRANSFERS = 2         # Transbordos máximos del motor "transfers"
+MAX_WALKING_TARGETS = 100 # Destinos por petición uno-a-muchos de walking-route/
+ENGINES = ("networkx", "transfers")
 
 graph_cache = None
+graph_version = None
+graph_source = None
+_graph_lock = threading.Lock()
+route_cache = RouteCache(settings.ROUTE_CACHE_SIZE, settings.ROUTE_CACHE_TTL)
+route_flights = SingleFlight()
+
+
+class RouteRequestError(Exception):
+    """Error de una petición de ruteo, con el código HTTP a devolver."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
 
-def get_nearest_node(lat, lng, max_distance=400):
+def get_nearby_nodes(lat, lng, max_distance=SNAP_RADIUS, limit=MAX_SNAP_NODES):
+    """Nodos dentro de `max_distance` metros, del más cercano al más lejano."""
     user_point = Point(lng, lat, srid=4326)
-    nearby_nodes = Node.objects.filter(
+    nodes = list(Node.objects.filter(
         location__distance_lte=(user_point, D(m=max_distance))
     ).annotate(
         distance=Distance('location', user_point)
-    ).order_by('distance')
-    return nearby_nodes.first()
+    ).order_by('distance')[:limit])
+    if len(nodes) == limit:
+        SEARCH_LIMIT_HITS.inc(limit="snap_nodes")
+    return nodes
+
+def access_costs(nodes):
+    """Costo de caminata (penalizado) desde el punto del usuario hasta cada nodo."""
+    return {node.id: node.distance.m * WALK_PENALTY for node in nodes}
 
 def build_transport_graph():
-    G = nx.DiGraph()
-
-    # 1. Nodos
-    for node in Node.objects.all():
-        G.add_node(node.id, osm_id=node.osm_id, location=node.location)
-
-    # 2. Edges de caminata (calles), en ambos sentidos y penalizados
-    for edge in Edge.objects.all():
-        G.add_edge(
-            edge.source_id,
-            edge.target_id,
-            weight=edge.distance * WALK_PENALTY,
-            type='walk'
-        )
-        G.add_edge(
-            edge.target_id,
-            edge.source_id,
-            weight=edge.distance * WALK_PENALTY,
-            type='walk'
-        )
+    """
+    Grafo de transporte desde la BD sin instanciar modelos: nodos, calles y
+    aristas de bus se leen por columnas a arreglos NumPy (ver bulk_load) y la
+    capa peatonal y el RouteStore quedan cargados para el resto del proceso.
+    """
+    walking = get_walking_graph()
+    return transport_digraph(
+        walking, build_graphs(), load_osm_ids(walking.coords), load_route_names(), WALK_PENALTY
+    )
 
-    # 3. Edges de bus (solo según sentido del RouteEdge)
-    for route_edge in RouteEdge.objects.select_related('edge', 'route'):
-        edge = route_edge.edge
-        G.add_edge(
-            edge.source_id,
-            edge.target_id,
-            weight=edge.distance,
-            type='bus',
-            route_id=route_edge.route_id,
-            route_name=route_edge.route.name,
-            direction=route_edge.direction,
-            order=route_edge.order
-        )
+def get_transport_graph():
+    """Grafo de transporte del proceso, construido una sola vez aunque haya varios hilos."""
+    global graph_cache
+    if graph_cache is None:
+        with _graph_lock:
+            if graph_cache is None:
+                graph_cache = load_transport_graph()
+    return graph_cache
+
+def load_transport_graph():
+    """Usa el snapshot compartido si está configurado; si no, construye desde la BD."""
+    global graph_version, graph_source
+    start = time.perf_counter()
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        G = snapshot.transport_graph(WALK_PENALTY)
+        graph_version, graph_source = snapshot.version, "snapshot"
+    else:
+        G = build_transport_graph()
+        graph_version, graph_source = "db-" + time.strftime("%Y%m%d%H%M%S"), "database"
+    elapsed = time.perf_counter() - start
+    GRAPH_BUILD_SECONDS.set(elapsed, graph="transport")
+    logger.info("Grafo de transporte %s: %d nodos, %d aristas en %.1fs",
+                graph_version, G.number_of_nodes(), G.number_of_edges(), elapsed)
     return G
 
 def describe_path(G, path):
@@ -112,16 +162,18 @@ def count_bus_segments(G, path):
         last_mode = mode
     return bus_segments
 
-def step_instructions(segment, node_objs):
+def step_instructions(segment, coords):
     first = segment[0]
     last = segment[-1]
+    from_lat, from_lng = coords[first['from_node']]
+    to_lat, to_lng = coords[last['to_node']]
     if first["mode"] == "walk":
-        return f"Camina {int(sum(step['distance'] / WALK_PENALTY for step in segment))} metros desde ({node_objs[first['from_node']].location.y}, {node_objs[first['from_node']].location.x}) hasta ({node_objs[last['to_node']].location.y}, {node_objs[last['to_node']].location.x})"
+        return f"Camina {int(sum(step['distance'] / WALK_PENALTY for step in segment))} metros desde ({from_lat}, {from_lng}) hasta ({to_lat}, {to_lng})"
     elif first["mode"] == "bus":
         return (
             f"Sube al bus {first['route_name']} (ID {first['route_id']}) dirección {'ida' if first['direction']=='I' else 'vuelta'} "
-            f"desde ({node_objs[first['from_node']].location.y}, {node_objs[first['from_node']].location.x}) "
-            f"y bájate en ({node_objs[last['to_node']].location.y}, {node_objs[last['to_node']].location.x})"
+            f"desde ({from_lat}, {from_lng}) "
+            f"y bájate en ({to_lat}, {to_lng})"
         )
     else:
         return "Sigue la ruta"
@@ -143,7 +195,7 @@ def penalized_path_length(G, path):
         last_route = route
     return length
 
-def find_best_route_with_penalty(G, start_id, end_id, max_candidates=MAX_ROUTE_CANDIDATES):
+def find_best_route_with_penalty(G, start_id, end_id, max_candidates=MAX_ROUTE_CANDIDATES, stats=None):
     try:
         candidates = nx.shortest_simple_paths(G, start_id, end_id, weight='weight')
         best = None
@@ -156,247 +208,624 @@ def find_best_route_with_penalty(G, start_id, end_id, max_candidates=MAX_ROUTE_C
                 best_score = score
             count += 1
             if count >= max_candidates:
+                SEARCH_LIMIT_HITS.inc(limit="route_candidates")
                 break
+        if stats is not None:
+            stats["candidates"] = stats.get("candidates", 0) + count
         return best
     except Exception:
         return None
-def find_best_direct_route(G, start_node, end_node):
+def find_best_direct_route(G, start_nodes, end_nodes):
     """
     Busca la mejor ruta directa (un solo bus), aunque implique caminata al inicio o fin.
+    Considera como paraderos todos los nodos cercanos al origen y al destino.
     """
-    # 1. Encuentra todas las rutas de bus que pasen cerca de ambos nodos
     from Routes.models import RouteNode
 
-    # Todos los RouteNode de subida cerca del inicio
-    start_routenodes = RouteNode.objects.filter(
-        node=start_node
-    ).select_related('route')
-    # Todos los RouteNode de bajada cerca del destino
-    end_routenodes = RouteNode.objects.filter(
-        node=end_node
-    ).select_related('route')
-
-    direct_candidates = []
-    for s in start_routenodes:
-        for e in end_routenodes:
-            if (
-                s.route_id == e.route_id and
-                s.direction == e.direction and
-                s.order < e.order
-            ):
-                direct_candidates.append((s, e))
+    start_costs = access_costs(start_nodes)
+    end_costs = access_costs(end_nodes)
+
+    # 1. Agrupa por ruta y sentido los paraderos de subida y de bajada candidatos
+    boardings = {}
+    for route_id, direction, node_id, order in RouteNode.objects.filter(
+        node_id__in=start_costs
+    ).values_list('route_id', 'direction', 'node_id', 'order'):
+        boardings.setdefault((route_id, direction), []).append((node_id, order))
+    alightings = {}
+    for route_id, direction, node_id, order in RouteNode.objects.filter(
+        node_id__in=end_costs
+    ).values_list('route_id', 'direction', 'node_id', 'order'):
+        alightings.setdefault((route_id, direction), []).append((node_id, order))
+
+    direct_candidates = [
+        key for key in boardings
+        if key in alightings and
+        min(order for _, order in boardings[key]) < max(order for _, order in alightings[key])
+    ]
     if not direct_candidates:
         return None
 
-    # 2. Elige la ruta directa con menor distancia de bus
+    # 2. Una sola búsqueda multi-origen por ruta y sentido, sembrada con la caminata.
+    #    Las aristas salen del RouteStore en memoria, sin consultar route_edges.
+    store = build_graphs()
     best = None
     best_dist = float('inf')
-    for s, e in direct_candidates:
-        # Busca el path real entre los dos RouteNodes usando solo los edges de ese route y direction
-        # Crea un subgrafo solo para esa ruta y sentido
-        bus_edges = [
-            (re.edge.source_id, re.edge.target_id, re.edge.distance)
-            for re in RouteEdge.objects.filter(route=s.route, direction=s.direction)
-        ]
+    for route_id, direction in direct_candidates:
+        pattern = store.pattern_index.get((route_id, direction))
+        if pattern is None:
+            continue
         bus_G = nx.DiGraph()
-        for u, v, d in bus_edges:
-            bus_G.add_edge(u, v, weight=d)
-        try:
-            bus_path = nx.shortest_path(bus_G, s.node_id, e.node_id, weight='weight')
-            bus_dist = nx.shortest_path_length(bus_G, s.node_id, e.node_id, weight='weight')
-        except nx.NetworkXNoPath:
+        bus_G.add_weighted_edges_from(store.pattern_edges(pattern))
+        found = multi_source_dijkstra_path(
+            bus_G,
+            {node_id: start_costs[node_id] for node_id, _ in boardings[(route_id, direction)]},
+            {node_id: end_costs[node_id] for node_id, _ in alightings[(route_id, direction)]},
+        )
+        # Subir y bajar en el mismo paradero no es una ruta de bus
+        if not found or len(found[1]) < 2:
+            continue
+        total_score, bus_path = found
+        if total_score >= best_dist:
             continue
 
-        # Caminata desde start_node real a s.node (si es distinto)
-        walk_dist_start = 0 if s.node_id == start_node.id else G.get_edge_data(start_node.id, s.node_id, {}).get('weight', float('inf'))
-        # Caminata desde e.node al destino real
-        walk_dist_end = 0 if e.node_id == end_node.id else G.get_edge_data(e.node_id, end_node.id, {}).get('weight', float('inf'))
-        total_walk = (walk_dist_start + walk_dist_end) / WALK_PENALTY
-
-        # Penalización si el paradero está lejos (opcional: puedes poner un máximo)
-        total_score = bus_dist + (walk_dist_start + walk_dist_end)
-        if total_score < best_dist:
-            best = {
-                "route": s.route,
-                "direction": s.direction,
-                "bus_path": bus_path,
-                "bus_dist": bus_dist,
-                "start_walk": (start_node.id, s.node_id, walk_dist_start / WALK_PENALTY),
-                "end_walk": (e.node_id, end_node.id, walk_dist_end / WALK_PENALTY),
-                "total_walk": total_walk,
-                "total_score": total_score
-            }
-            best_dist = total_score
+        # La caminata es la del nodo semilla que ganó la búsqueda: el paradero
+        # de subida (y el de bajada), no el nodo más cercano al punto
+        walk_dist_start = start_costs[bus_path[0]]
+        walk_dist_end = end_costs[bus_path[-1]]
+        best = {
+            "route_id": route_id,
+            "direction": direction,
+            "bus_path": bus_path,
+            "bus_dist": total_score - walk_dist_start - walk_dist_end,
+            "start_walk": (bus_path[0], walk_dist_start / WALK_PENALTY),
+            "end_walk": (bus_path[-1], walk_dist_end / WALK_PENALTY),
+            "total_walk": (walk_dist_start + walk_dist_end) / WALK_PENALTY,
+            "total_score": total_score
+        }
+        best_dist = total_score
+    if best:
+        best["route_name"] = G.graph['route_names'].get(best["route_id"])
     return best
 
+def find_best_multimodal_route(G, start_nodes, end_nodes, max_candidates=MAX_ROUTE_CANDIDATES, stats=None):
+    """
+    Búsqueda multimodal multi-origen/multi-destino: parte de todos los nodos
+    cercanos al origen (sembrados con su caminata) y termina en cualquiera de
+    los cercanos al destino. Luego afina el par elegido con la penalización
+    por transbordos.
+    """
+    found = multi_source_dijkstra_path(G, access_costs(start_nodes), access_costs(end_nodes), stats=stats)
+    if not found:
+        return None
+    _, path = found
+    if len(path) < 2:
+        return path
+    return find_best_route_with_penalty(G, path[0], path[-1], max_candidates, stats) or path
+
+def find_transfer_route(G, start_nodes, end_nodes, stats=None):
+    """
+    Motor alternativo: router de transbordos acotados sobre la red de buses.
+    Devuelve (path, steps) con el mismo formato que describe_path, o None.
+    """
+    results = find_routes_with_transfers(
+        access_costs(start_nodes),
+        access_costs(end_nodes),
+        max_transfers=MAX_TRANSFERS,
+        transfer_penalty=TRANSFER_PENALTY,
+        stats=stats
+    )
+    if not results:
+        return None
+    return describe_transfer_path(G, results[0]["path"])
+
+def describe_transfer_path(G, route_path):
+    """
+    Convierte [(node_id, (route_id, direction)), ...] en path + segmentos por ruta.
+    Si no hay tramos de bus (un nodo de acceso común al origen y al destino)
+    devuelve ([nodo], []): un resultado solo a pie, como el motor networkx.
+    """
+    path = [route_path[0][0]]
+    steps = []
+    for (u, _), (v, pattern) in zip(route_path, route_path[1:]):
+        if u == v:
+            # Transbordo en el mismo paradero
+            continue
+        route_id, direction = pattern
+        step = {
+            "from_node": u,
+            "to_node": v,
+            "mode": "bus",
+            "route_id": route_id,
+            "route_name": G.graph['route_names'].get(route_id),
+            "direction": direction,
+            "distance": hop_distance(pattern, u, v)
+        }
+        if steps and steps[-1][0]["route_id"] == route_id and steps[-1][0]["direction"] == direction:
+            steps[-1].append(step)
+        else:
+            steps.append([step])
+        path.append(v)
+    return path, steps
+
+def polyline_options(data):
+    """
+    Opciones de formato del polyline (opt-in). None mantiene el formato clásico
+    de lista {"lat", "lng"}; "encoded" devuelve Google Encoded Polylines por
+    paso y `zoom` (0..22) simplifica con Douglas-Peucker a ~1 píxel de tolerancia.
+    """
+    polyline_format = data.get("polyline_format", "json")
+    if polyline_format not in ("json", "encoded"):
+        raise ValueError(polyline_format)
+    zoom = data.get("zoom")
+    tolerance = tolerance_for_zoom(float(zoom)) if zoom is not None else 0
+    if polyline_format == "json" and not tolerance:
+        return None
+    return {"encoded": polyline_format == "encoded", "tolerance": tolerance}
+
+def render_polyline(points, options):
+    if options is None:
+        return points
+    coords = simplify([(p["lat"], p["lng"]) for p in points], options["tolerance"])
+    if options["encoded"]:
+        return encode_polyline(coords)
+    return [{"lat": lat, "lng": lng} for lat, lng in coords]
+
+def add_step_polylines(steps, step_points, options):
+    """En formato encoded cada paso lleva su propia geometría."""
+    if options is None or not options["encoded"]:
+        return
+    for step, points in zip(steps, step_points):
+        step["polyline"] = render_polyline(points, options)
+
+def point(coords, node_id):
+    lat, lng = coords[node_id]
+    return {"lat": lat, "lng": lng}
+
+def node_payload(G, coords, node_id):
+    lat, lng = coords[node_id]
+    return {
+        "id": node_id,
+        "osm_id": G.nodes[node_id]['osm_id'],
+        "lat": lat,
+        "lng": lng
+    }
+
+def build_direct_response(G, direct, options, origin, destination):
+    """
+    Arma la respuesta tipo steps + polyline de una ruta directa, sin consultas
+    a la BD. Las caminatas van del punto `origin` (lat, lng) al paradero de
+    subida y del de bajada al punto `destination`.
+    """
+    start_node, start_walk = direct["start_walk"]
+    end_node, end_walk = direct["end_walk"]
+    bus_path = direct["bus_path"]
+    coords = G.graph['coords'].lookup(bus_path)
+    polyline = []
+    steps = []
+    step_points = []
+
+    # Caminata inicio
+    walk_init = start_walk > 0
+    if walk_init:
+        polyline += [{"lat": origin[0], "lng": origin[1]}, point(coords, start_node)]
+    # Bus
+    bus_coords = [point(coords, nid) for nid in bus_path]
+    polyline += bus_coords
+    # Caminata final
+    walk_end = end_walk > 0
+    if walk_end:
+        polyline += [point(coords, end_node), {"lat": destination[0], "lng": destination[1]}]
+
+    # Steps
+    if walk_init:
+        step_points.append(polyline[:2])
+        steps.append({
+            "type": "walk",
+            "from": polyline[0],
+            "to": polyline[1],
+            "distance": int(start_walk),
+            "instructions": "Camina hasta el paradero de subida"
+        })
+    step_points.append(bus_coords)
+    steps.append({
+        "type": "bus",
+        "route_id": direct["route_id"],
+        "route_name": direct["route_name"],
+        "direction": direct["direction"],
+        "from": bus_coords[0],
+        "to": bus_coords[-1],
+        "distance": int(direct["bus_dist"]),
+        "instructions": f"Sube al bus {direct['route_name']} y bájate en la parada más cercana a tu destino"
+    })
+    if walk_end:
+        step_points.append(polyline[-2:])
+        steps.append({
+            "type": "walk",
+            "from": polyline[-2],
+            "to": polyline[-1],
+            "distance": int(end_walk),
+            "instructions": "Camina hasta tu destino final"
+        })
+    add_step_polylines(steps, step_points, options)
+
+    return {
+        "direct_route": True,
+        "start_node": node_payload(G, coords, start_node),
+        "end_node": node_payload(G, coords, end_node),
+        "polyline": render_polyline(polyline, options),
+        "steps": steps,
+        "summary": {
+            "total_walk_m": int(direct["total_walk"]),
+            "total_bus_m": int(direct["bus_dist"]),
+            "total_transfers": 0
+        }
+    }
+
+def build_multimodal_response(G, path, options, steps=None):
+    """Arma la respuesta de una ruta multimodal, sin consultas a la BD."""
+    coords = G.graph['coords'].lookup(path)
+    polyline = [point(coords, nid) for nid in path]
+    if steps is None:
+        steps = describe_path(G, path)
+    steps_list = []
+    step_points = []
+    offset = 0
+    total_walk = 0
+    total_bus = 0
+    for segment in steps:
+        first = segment[0]
+        last = segment[-1]
+        segment_distance = sum(step["distance"] for step in segment)
+        if first["mode"] == "walk":
+            total_walk += segment_distance / WALK_PENALTY
+        else:
+            total_bus += segment_distance
+        # Los segmentos son consecutivos en el path: comparten el nodo de corte
+        step_points.append(polyline[offset:offset + len(segment) + 1])
+        offset += len(segment)
+        steps_list.append({
+            "type": first["mode"],
+            "route_id": first.get("route_id"),
+            "route_name": first.get("route_name"),
+            "direction": first.get("direction"),
+            "from": point(coords, first["from_node"]),
+            "to": point(coords, last["to_node"]),
+            "distance": int(segment_distance if first["mode"] == "bus" else segment_distance / WALK_PENALTY),
+            "instructions": step_instructions(segment, coords)
+        })
+    add_step_polylines(steps_list, step_points, options)
+
+    return {
+        "direct_route": False,
+        "start_node": node_payload(G, coords, path[0]),
+        "end_node": node_payload(G, coords, path[-1]),
+        "polyline": render_polyline(polyline, options),
+        "steps": steps_list,
+        "summary": {
+            "total_distance_m": int(total_walk + total_bus),
+            "total_walk_m": int(total_walk),
+            "total_bus_m": int(total_bus),
+            "total_transfers": sum(1 for i in range(1, len(steps)) if steps[i][0]["mode"] != steps[i-1][0]["mode"] or (steps[i][0]["mode"] == "bus" and steps[i][0]["route_id"] != steps[i-1][0]["route_id"]))
+        }
+    }
+
+def parse_point(lat, lng):
+    """
+    (lat, lng) como floats finitos dentro de [-90, 90] y [-180, 180]; lanza
+    ValueError. Un NaN o infinito llegaría hasta el índice espacial.
+    """
+    lat, lng = float(lat), float(lng)
+    if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"Coordenadas fuera de rango: {lat}, {lng}")
+    return lat, lng
+
+def parse_route_request(data):
+    """Valida el cuerpo de optimal-route/ y lo normaliza; lanza RouteRequestError."""
+    try:
+        lat1, long1 = parse_point(data.get("lat1"), data.get("long1"))
+        lat2, long2 = parse_point(data.get("lat2"), data.get("long2"))
+    except (TypeError, ValueError):
+        raise RouteRequestError("Coordenadas inválidas")
+    try:
+        options = polyline_options(data)
+    except (TypeError, ValueError):
+        raise RouteRequestError("Formato de polyline inválido")
+    engine = data.get("engine", "networkx")
+    if engine not in ENGINES:
+        raise RouteRequestError(f"Motor inválido, usa uno de: {', '.join(ENGINES)}")
+    return {
+        "lat1": lat1,
+        "long1": long1,
+        "lat2": lat2,
+        "long2": long2,
+        "options": options,
+        "engine": engine
+    }
+
+def route_cache_key(query):
+    """Llave normalizada: coordenadas redondeadas + motor + formato del polyline."""
+    digits = settings.ROUTE_CACHE_PRECISION
+    options = query["options"]
+    return (
+        round(query["lat1"], digits), round(query["long1"], digits),
+        round(query["lat2"], digits), round(query["long2"], digits),
+        query["engine"],
+        (options["encoded"], round(options["tolerance"], 3)) if options else None
+    )
+
+def plan_direct(G, query, timer):
+    """
+    Snapping y búsqueda de ruta directa (consultan la BD). Devuelve
+    (start_nodes, end_nodes, respuesta o None si no hay ruta directa).
+    """
+    # Todos los nodos cercanos a cada punto (multi-origen / multi-destino)
+    with timer.stage("snap"):
+        start_nodes = get_nearby_nodes(query["lat1"], query["long1"])
+        end_nodes = get_nearby_nodes(query["lat2"], query["long2"])
+    if not start_nodes or not end_nodes:
+        raise RouteRequestError("No se encontraron nodos cercanos.", status=404)
+
+    # 1. Intenta ruta directa
+    with timer.stage("direct"):
+        direct = find_best_direct_route(G, start_nodes, end_nodes)
+    if not direct:
+        return start_nodes, end_nodes, None
+    with timer.stage("response"):
+        return start_nodes, end_nodes, build_direct_response(
+            G, direct, query["options"],
+            (query["lat1"], query["long1"]), (query["lat2"], query["long2"]),
+        )
+
+def plan_multimodal(G, query, start_nodes, end_nodes, timer):
+    """Búsqueda multimodal (solo CPU, sin BD) y su respuesta."""
+    steps = None
+    with timer.stage("multimodal"):
+        if query["engine"] == "transfers":
+            found = find_transfer_route(G, start_nodes, end_nodes, stats=timer.counters)
+            path, steps = found if found else (None, None)
+        else:
+            path = find_best_multimodal_route(G, start_nodes, end_nodes, stats=timer.counters)
+    if not path:
+        raise RouteRequestError("No se encontró ruta disponible entre los puntos.", status=404)
+    with timer.stage("response"):
+        return build_multimodal_response(G, path, query["options"], steps)
+
+def wants_debug(data):
+    """`debug: true` en el cuerpo agrega el bloque "debug" a la respuesta."""
+    return hasattr(data, "get") and str(data.get("debug", "")).lower() in ("1", "true")
+
+def engine_label(data):
+    """Motor pedido, para etiquetar las métricas antes de validar la petición."""
+    engine = data.get("engine", "networkx") if hasattr(data, "get") else None
+    return engine if engine in ENGINES else "invalid"
+
+def request_timer(debug):
+    """
+    Instrumentación activa si las métricas o ROUTING_TIMING están encendidos
+    o la petición pide debug; solo estos dos últimos reportan la petición.
+    """
+    trace = settings.ROUTING_TIMING or debug
+    return StageTimer(enabled=settings.ROUTING_METRICS or trace, trace=trace)
+
+def timed_response(data, timer, debug, label, engine, status=200):
+    """
+    Response con el bloque "debug" opcional. Con la instrumentación activa
+    mide la serialización (render de DRF), registra las métricas con el
+    código de la respuesta y, si la petición se reporta, agrega
+    Server-Timing y la línea de log estructurada.
+    """
+    if debug:
+        data = {**data, "debug": timer.debug_block()}
+    response = Response(data, status=status)
+    if timer.enabled:
+        start = time.perf_counter()
+
+        def finish(rendered):
+            timer.add("serialize", (time.perf_counter() - start) * 1000)
+            observe_request(label, engine, timer, rendered.status_code)
+            if timer.trace:
+                rendered["Server-Timing"] = timer.server_timing()
+            timer.log(label, status=rendered.status_code)
+
+        response.add_post_render_callback(finish)
+    return response
+
+def error_response(message, status, timer, label, engine):
+    """Respuesta de error de la API, contada en las métricas como las exitosas."""
+    return timed_response({"error": message}, timer, False, label, engine, status)
+
+@contextmanager
+def observe_failures(timer, label, engine):
+    """Una excepción no controlada (Django responde 500) también queda en las métricas."""
+    try:
+        yield
+    except Exception:
+        if timer.enabled:
+            observe_request(label, engine, timer, 500)
+        raise
+
+def compute_route(query, key, timer):
+    """Búsqueda completa (síncrona); la ejecuta solo el líder de cada llave."""
+    # Otra petición pudo terminar la misma búsqueda justo antes (el fallo ya lo contó la vista)
+    cached = route_cache.peek(key)
+    if cached is not None:
+        return cached
+    with timer.stage("graph"):
+        G = get_transport_graph()
+    start_nodes, end_nodes, data = plan_direct(G, query, timer)
+    # 2. Si no hay ruta directa, usa la lógica multimodal penalizada (como antes)
+    if data is None:
+        data = plan_multimodal(G, query, start_nodes, end_nodes, timer)
+    route_cache.set(key, data)
+    return data
+
 class OptimalRouteView(APIView):
     """
     Devuelve ruta óptima, priorizando rutas directas de bus.
     """
+    @profile_request("optimal-route")
     def post(self, request):
-        global graph_cache
-        lat1 = request.data.get("lat1")
-        long1 = request.data.get("long1")
-        lat2 = request.data.get("lat2")
-        long2 = request.data.get("long2")
-
-        try:
-            lat1, long1 = float(lat1), float(long1)
-            lat2, long2 = float(lat2), float(long2)
-        except (TypeError, ValueError):
-            return Response({"error": "Coordenadas inválidas"}, status=400)
-
-        if graph_cache is None:
-            graph_cache = build_transport_graph()
-        G = graph_cache
-
-        # Nodos más cercanos
-        start_node = get_nearest_node(lat1, long1)
-        end_node = get_nearest_node(lat2, long2)
-        if not start_node or not end_node:
-            return Response({"error": "No se encontraron nodos cercanos."}, status=404)
-
-        # 1. Intenta ruta directa
-        direct = find_best_direct_route(G, start_node, end_node)
-        if direct:
-            # Arma la respuesta tipo steps + polyline
-            node_objs = Node.objects.in_bulk(
-                [n for n in direct["bus_path"]] +
-                [direct["start_walk"][0], direct["start_walk"][1], direct["end_walk"][0], direct["end_walk"][1]]
-            )
-            polyline = []
-
-            # Caminata inicio
-            walk_init = []
-            if direct["start_walk"][2] > 0 and direct["start_walk"][0] != direct["start_walk"][1]:
-                walk_init = [node_objs[direct["start_walk"][0]], node_objs[direct["start_walk"][1]]]
-                polyline += [
-                    {"lat": walk_init[0].location.y, "lng": walk_init[0].location.x},
-                    {"lat": walk_init[1].location.y, "lng": walk_init[1].location.x}
-                ]
-            # Bus
-            bus_coords = [
-                {"lat": node_objs[nid].location.y, "lng": node_objs[nid].location.x}
-                for nid in direct["bus_path"]
-            ]
-            polyline += bus_coords
-
-            # Caminata final
-            walk_end = []
-            if direct["end_walk"][2] > 0 and direct["end_walk"][0] != direct["end_walk"][1]:
-                walk_end = [node_objs[direct["end_walk"][0]], node_objs[direct["end_walk"][1]]]
-                polyline += [
-                    {"lat": walk_end[0].location.y, "lng": walk_end[0].location.x},
-                    {"lat": walk_end[1].location.y, "lng": walk_end[1].location.x}
-                ]
-
-            # Steps
-            steps = []
-            if walk_init:
-                steps.append({
-                    "type": "walk",
-                    "from": {"lat": walk_init[0].location.y, "lng": walk_init[0].location.x},
-                    "to": {"lat": walk_init[1].location.y, "lng": walk_init[1].location.x},
-                    "distance": int(direct["start_walk"][2]),
-                    "instructions": "Camina hasta el paradero de subida"
-                })
-            steps.append({
-                "type": "bus",
-                "route_id": direct["route"].id,
-                "route_name": direct["route"].name,
-                "direction": direct["direction"],
-                "from": {"lat": node_objs[direct["bus_path"][0]].location.y, "lng": node_objs[direct["bus_path"][0]].location.x},
-                "to": {"lat": node_objs[direct["bus_path"][-1]].location.y, "lng": node_objs[direct["bus_path"][-1]].location.x},
-                "distance": int(direct["bus_dist"]),
-                "instructions": f"Sube al bus {direct['route'].name} y bájate en la parada más cercana a tu destino"
-            })
-            if walk_end:
-                steps.append({
-                    "type": "walk",
-                    "from": {"lat": walk_end[0].location.y, "lng": walk_end[0].location.x},
-                    "to": {"lat": walk_end[1].location.y, "lng": walk_end[1].location.x},
-                    "distance": int(direct["end_walk"][2]),
-                    "instructions": "Camina hasta tu destino final"
-                })
-
-            return Response({
-                "direct_route": True,
-                "start_node": {
-                    "id": start_node.id,
-                    "osm_id": start_node.osm_id,
-                    "lat": start_node.location.y,
-                    "lng": start_node.location.x
-                },
-                "end_node": {
-                    "id": end_node.id,
-                    "osm_id": end_node.osm_id,
-                    "lat": end_node.location.y,
-                    "lng": end_node.location.x
-                },
-                "polyline": polyline,
-                "steps": steps,
-                "summary": {
-                    "total_walk_m": int(direct["total_walk"]),
-                    "total_bus_m": int(direct["bus_dist"]),
-                    "total_transfers": 0
+        debug = wants_debug(request.data)
+        timer = request_timer(debug)
+        engine = engine_label(request.data)
+        with observe_failures(timer, "optimal-route", engine):
+            try:
+                query = parse_route_request(request.data)
+            except RouteRequestError as e:
+                return error_response(str(e), e.status, timer, "optimal-route", engine)
+
+            key = route_cache_key(query)
+            cached = route_cache.get(key)
+            if cached is not None:
+                timer.count("cache_hit")
+                return timed_response(cached, timer, debug, "optimal-route", engine)
+
+            try:
+                # Peticiones idénticas en curso comparten una sola búsqueda
+                data = route_flights.do(key, compute_route, query, key, timer)
+            except RouteRequestError as e:
+                return error_response(str(e), e.status, timer, "optimal-route", engine)
+            return timed_response(data, timer, debug, "optimal-route", engine)
+
+
+class WalkingRouteView(APIView):
+    """
+    Ruta solo a pie sobre la capa de calles (última milla). Con lat2/long2
+    devuelve el camino punto a punto; con "targets" ([{"lat", "lng"}, ...])
+    devuelve la distancia desde el origen a cada destino en una sola búsqueda.
+    """
+    def post(self, request):
+        debug = wants_debug(request.data)
+        timer = request_timer(debug)
+
+        def fail(message, status):
+            return error_response(message, status, timer, "walking-route", "walking")
+
+        with observe_failures(timer, "walking-route", "walking"):
+            try:
+                lat1, long1 = parse_point(request.data.get("lat1"), request.data.get("long1"))
+                targets = request.data.get("targets")
+                one_to_many = targets is not None
+                if one_to_many:
+                    if len(targets) > MAX_WALKING_TARGETS:
+                        return fail(f"Máximo {MAX_WALKING_TARGETS} destinos por petición", 400)
+                    targets = [parse_point(t["lat"], t["lng"]) for t in targets]
+                else:
+                    targets = [parse_point(request.data.get("lat2"), request.data.get("long2"))]
+            except (TypeError, ValueError, KeyError):
+                return fail("Coordenadas inválidas", 400)
+            try:
+                options = polyline_options(request.data)
+            except (TypeError, ValueError):
+                return fail("Formato de polyline inválido", 400)
+
+            with timer.stage("graph"):
+                W = get_walking_graph()
+            with timer.stage("snap"):
+                sources = W.snap(lat1, long1)
+                target_seeds = [W.snap(lat, lng) for lat, lng in targets]
+            if not sources:
+                return fail("No se encontraron nodos cercanos.", 404)
+
+            if one_to_many:
+                with timer.stage("walking"):
+                    distances = W.distances_from(sources, target_seeds)
+                return timed_response({
+                    "results": [
+                        {
+                            "lat": lat,
+                            "lng": lng,
+                            "distance_m": int(d) if d is not None else None,
+                            "duration_s": int(d / WALK_SPEED) if d is not None else None
+                        }
+                        for (lat, lng), d in zip(targets, distances)
+                    ]
+                }, timer, debug, "walking-route", "walking")
+
+            if not target_seeds[0]:
+                return fail("No se encontraron nodos cercanos.", 404)
+            with timer.stage("walking"):
+                found = W.shortest_path(sources, target_seeds[0])
+            if not found:
+                return fail("No se encontró ruta a pie entre los puntos.", 404)
+            distance, path = found
+            with timer.stage("response"):
+                coords = W.coords.lookup(path)
+                data = {
+                    "start_node": {"id": path[0], "lat": coords[path[0]][0], "lng": coords[path[0]][1]},
+                    "end_node": {"id": path[-1], "lat": coords[path[-1]][0], "lng": coords[path[-1]][1]},
+                    "polyline": render_polyline([point(coords, nid) for nid in path], options),
+                    "distance_m": int(distance),
+                    "duration_s": int(distance / WALK_SPEED)
                 }
-            })
-
-        # 2. Si no hay ruta directa, usa la lógica multimodal penalizada (como antes)
-        path = find_best_route_with_penalty(G, start_node.id, end_node.id)
-        if not path:
-            return Response({"error": "No se encontró ruta disponible entre los puntos."}, status=404)
-        node_objs = Node.objects.in_bulk(path)
-        polyline = [{"lat": node_objs[nid].location.y, "lng": node_objs[nid].location.x} for nid in path]
-        steps = describe_path(G, path)
-        steps_list = []
-        total_walk = 0
-        total_bus = 0
-        for segment in steps:
-            first = segment[0]
-            last = segment[-1]
-            segment_distance = sum(step["distance"] for step in segment)
-            if first["mode"] == "walk":
-                total_walk += segment_distance / WALK_PENALTY
-            else:
-                total_bus += segment_distance
-            steps_list.append({
-                "type": first["mode"],
-                "route_id": first.get("route_id"),
-                "route_name": first.get("route_name"),
-                "direction": first.get("direction"),
-                "from": {
-                    "lat": node_objs[first["from_node"]].location.y,
-                    "lng": node_objs[first["from_node"]].location.x,
-                },
-                "to": {
-                    "lat": node_objs[last["to_node"]].location.y,
-                    "lng": node_objs[last["to_node"]].location.x,
-                },
-                "distance": int(segment_distance if first["mode"] == "bus" else segment_distance / WALK_PENALTY),
-                "instructions": step_instructions(segment, node_objs)
-            })
-
-        return Response({
-            "direct_route": False,
-            "start_node": {
-                "id": start_node.id,
-                "osm_id": start_node.osm_id,
-                "lat": start_node.location.y,
-                "lng": start_node.location.x
-            },
-            "end_node": {
-                "id": end_node.id,
-                "osm_id": end_node.osm_id,
-                "lat": end_node.location.y,
-                "lng": end_node.location.x
-            },
-            "polyline": polyline,
-            "steps": steps_list,
-            "summary": {
-                "total_distance_m": int(total_walk + total_bus),
-                "total_walk_m": int(total_walk),
-                "total_bus_m": int(total_bus),
-                "total_transfers": sum(1 for i in range(1, len(steps)) if steps[i][0]["mode"] != steps[i-1][0]["mode"] or (steps[i][0]["mode"] == "bus" and steps[i][0]["route_id"] != steps[i-1][0]["route_id"]))
-            }
-        })
+            return timed_response(data, timer, debug, "walking-route", "walking")
+
+
+@register_collector
+def routing_metrics():
+    """Estado actual de grafos, cachés y pool para /metrics."""
+    samples = [
+        ("routing_process_info", "gauge", "Proceso (worker) que responde.", {"pid": os.getpid()}, 1),
+        ("process_resident_memory_bytes", "gauge", "Memoria residente del proceso.", {}, resident_memory_bytes()),
+        ("routing_cache_hits_total", "counter", "Aciertos de la caché de rutas.", {}, route_cache.hits),
+        ("routing_cache_misses_total", "counter", "Fallos de la caché de rutas.", {}, route_cache.misses),
+        ("routing_cache_entries", "gauge", "Rutas guardadas en caché.", {}, len(route_cache)),
+    ]
+    lookups = route_cache.hits + route_cache.misses
+    if lookups:
+        samples.append(("routing_cache_hit_ratio", "gauge", "Aciertos / consultas de la caché de rutas.", {},
+                        route_cache.hits / lookups))
+    flights = route_flights.stats()
+    samples += [
+        ("routing_searches_executed_total", "counter", "Búsquedas ejecutadas (líderes).", {}, flights["executed"]),
+        ("routing_searches_coalesced_total", "counter", "Peticiones que esperaron una búsqueda idéntica.", {},
+         flights["coalesced"]),
+        ("routing_searches_in_flight", "gauge", "Búsquedas en curso.", {}, flights["in_flight"]),
+    ]
+    pool = search_pool.current_pool()
+    if pool is not None:
+        samples.append(("routing_search_pool_depth", "gauge", "Búsquedas en el pool (en curso o en cola).", {},
+                        pool.depth))
+
+    if graph_cache is not None:
+        samples += [
+            ("routing_graph_info", "gauge", "Versión del grafo de transporte cargado.",
+             {"version": graph_version, "source": graph_source}, 1),
+            ("routing_graph_nodes", "gauge", "Nodos por grafo.", {"graph": "transport"}, graph_cache.number_of_nodes()),
+            ("routing_graph_edges", "gauge", "Aristas por grafo.", {"graph": "transport"}, graph_cache.number_of_edges()),
+            ("routing_graph_memory_bytes", "gauge", "Memoria de las estructuras del grafo.",
+             {"structure": "coordinates"}, graph_cache.graph['coords'].nbytes),
+        ]
+    store = graph_loader.route_store
+    if store is not None:
+        samples += [
+            ("routing_routes", "gauge", "Patrones (ruta, sentido) cargados.", {}, len(store)),
+            ("routing_graph_edges", "gauge", "Aristas por grafo.", {"graph": "routes"}, store.edge_count),
+            ("routing_graph_memory_bytes", "gauge", "Memoria de las estructuras del grafo.",
+             {"structure": "route_store"}, store.memory_footprint()['total']),
+        ]
+    walking = walking_path.walking_graph
+    if walking is not None:
+        samples += [
+            ("routing_graph_nodes", "gauge", "Nodos por grafo.", {"graph": "walking"}, len(walking.coords)),
+            ("routing_graph_edges", "gauge", "Aristas por grafo.", {"graph": "walking"}, walking.edge_count),
+            ("routing_graph_memory_bytes", "gauge", "Memoria de las estructuras del grafo.",
+             {"structure": "walking"}, walking.nbytes),
+        ]
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        samples.append(("routing_graph_memory_bytes", "gauge", "Memoria de las estructuras del grafo.",
+                        {"structure": "snapshot_mmap"}, snapshot.nbytes))
+    return samples
+
+
+def readiness_view(request):
+    """200 cuando el grafo y los índices del proceso están cargados; 503 mientras tanto."""
+    refresh_ready()
+    data = warmup_state.as_dict()
+    return JsonResponse(data, status=200 if data["status"] == "ready" else 503)
+
+
+def metrics_view(request):
+    """Métricas del proceso en el formato de texto de Prometheus."""
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,36 +1,145 @@
+import argparse
+import json
+import time
 import xml.etree.ElementTree as ET
+from collections import Counter
+from xml.sax.saxutils import quoteattr
 
-def filter_osm_ways(input_file, output_file):
-    # Parse the XML file
-    tree = ET.parse(input_file)
-    root = tree.getroot()
-    
-    # Find all ways
-    ways_to_remove = []
-    for way in root.findall('.//way'):
-        # Check if way has address interpolation tag or building=yes tag
-        for tag in way.findall('tag'):
-            if (tag.get('k') == 'addr:interpolation' and tag.get('v') in ['even', 'odd', 'all']) or \
-                (tag.get('k') == 'substance' and tag.get('v') == 'water') or \
-                (tag.get('k') == 'footway' and tag.get('v') in ['sidewalk', 'crossing']) or \
-                (tag.get('k') == 'highway' and tag.get('v') in ['steps', 'footway']) or\
-                (tag.get('k') in ['landuse', 'natural', 'building', 'leisure', 'barrier', 'tourism', 'waterway']):
-                ways_to_remove.append(way)
-                break
-    
-    # Remove the ways
-    for way in ways_to_remove:
-        root.remove(way)
-    
-    # Write the filtered data to a new file
-    tree.write(output_file, encoding='utf-8', xml_declaration=True)
-
-# Input and output file names
-input_file = 'ways.xml'
-output_file = 'filtered_ways.xml'
-
-try:
-    filter_osm_ways(input_file, output_file)
-    print(f"Successfully filtered OSM file. Output written to {output_file}")
-except Exception as e:
-    print(f"Error processing file: {str(e)}") 
\ No newline at end of file
+# Ways que no son calles caminables: key -> valores a descartar (None = cualquier valor)
+DEFAULT_RULES = {
+    'addr:interpolation': ['even', 'odd', 'all'],
+    'substance': ['water'],
+    'footway': ['sidewalk', 'crossing'],
+    'highway': ['steps', 'footway'],
+    'landuse': None,
+    'natural': None,
+    'building': None,
+    'leisure': None,
+    'barrier': None,
+    'tourism': None,
+    'waterway': None,
+}
+
+
+# Solo los ways con este tag son calles; railway, power, boundary, building... no
+STREET_KEY = 'highway'
+
+
+def is_street(elem):
+    """True si el way tiene tag `highway` (cualquier valor; las reglas descartan los no caminables)."""
+    return any(tag.get('k') == STREET_KEY for tag in elem.iterfind('tag'))
+
+
+class TagRules:
+    """
+    Reglas de descarte por tag: un elemento se descarta si tiene algún tag
+    `k=v` con `k` en las reglas y `v` entre sus valores (o cualquier valor).
+    """
+
+    def __init__(self, rules):
+        self.rules = {key: None if values is None else frozenset(values) for key, values in rules.items()}
+
+    @classmethod
+    def load(cls, path):
+        """JSON {"key": ["valor", ...] | null}; null descarta cualquier valor."""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def parse(cls, specs):
+        """Reglas desde la línea de comandos: "key" o "key=v1,v2"."""
+        rules = {}
+        for spec in specs:
+            key, _, values = spec.partition('=')
+            rules[key] = values.split(',') if values else None
+        return cls(rules)
+
+    def matches(self, elem):
+        for tag in elem.iterfind('tag'):
+            key = tag.get('k')
+            if key in self.rules:
+                values = self.rules[key]
+                if values is None or tag.get('v') in values:
+                    return True
+        return False
+
+
+def iter_children(source):
+    """
+    Pares (raíz, hijo) con cada hijo directo de la raíz ya completo. El hijo
+    anterior se descarta de la raíz, así que la memoria no crece con el archivo.
+    """
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield root, elem
+            # del conserva los atributos de la raíz, clear() los borraría
+            del root[:]
+
+
+def stream_filter(input_file, output_file, keep):
+    """
+    Copia `input_file` en `output_file` con solo los hijos directos de la raíz
+    para los que `keep(elem)` es verdadero, escribiendo cada uno apenas se
+    decide. Devuelve dos Counter por tag: (conservados, descartados).
+    """
+    kept, dropped = Counter(), Counter()
+    root = None
+    with open(output_file, 'w', encoding='utf-8') as out:
+        out.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        for root_elem, elem in iter_children(input_file):
+            if root is None:
+                root = root_elem
+                attrs = ''.join(f' {k}={quoteattr(v)}' for k, v in root.attrib.items())
+                out.write(f'<{root.tag}{attrs}>\n')
+            if keep(elem):
+                elem.tail = None
+                out.write('  ' + ET.tostring(elem, encoding='unicode') + '\n')
+                kept[elem.tag] += 1
+            else:
+                dropped[elem.tag] += 1
+        out.write(f'</{root.tag}>\n' if root is not None else '<osm/>\n')
+    return kept, dropped
+
+
+def filter_osm_ways(input_file, output_file, rules=None, element='way'):
+    """
+    Copia `input_file` en `output_file` sin los `element` que cumplen las
+    reglas (streaming, ver `stream_filter`). Devuelve (conservados, descartados).
+    """
+    rules = rules or TagRules(DEFAULT_RULES)
+    kept, dropped = stream_filter(
+        input_file, output_file, lambda elem: elem.tag != element or not rules.matches(elem)
+    )
+    return kept[element], dropped[element]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drop OSM ways (e.g. buildings, sidewalks) by tag rules, streaming')
+    parser.add_argument('input', nargs='?', default='ways.xml')
+    parser.add_argument('output', nargs='?', default='filtered_ways.xml')
+    parser.add_argument('--rules', help='JSON file {"key": ["value", ...] or null} (replaces the default rules)')
+    parser.add_argument('--drop', action='append', default=[], metavar='KEY[=V1,V2]',
+                        help='Extra rule, repeatable')
+    args = parser.parse_args()
+
+    rules = dict(DEFAULT_RULES)
+    if args.rules:
+        rules = TagRules.load(args.rules).rules
+    rules.update(TagRules.parse(args.drop).rules)
+
+    start = time.perf_counter()
+    kept, dropped = filter_osm_ways(args.input, args.output, TagRules(rules))
+    print(f"Kept {kept} ways, dropped {dropped} in {time.perf_counter() - start:.1f}s. "
+          f"Output written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,72 +1,109 @@
-import xml.etree.ElementTree as ET
-from tqdm import tqdm
-
-def get_way_node_ids(ways_file):
-    """Extract all node IDs referenced in ways.xml"""
-    print("Reading ways.xml to collect node IDs...")
-    tree = ET.parse(ways_file)
-    root = tree.getroot()
-    
-    # Create a set for faster lookups
-    node_ids = set()
-    
-    # Iterate through all way elements
-    for way in tqdm(root.findall('.//way')):
-        # Get all nd (node) references in this way
-        for nd in way.findall('nd'):
-            node_ids.add(nd.get('ref'))
-    
-    print(f"Found {len(node_ids)} unique node IDs in ways")
-    return node_ids
-
-def filter_nodes(nodes_file, output_file, node_ids):
-    """Filter nodes.xml to keep only nodes that are in node_ids"""
-    print("Filtering nodes.xml...")
-    
-    # Parse the input file
-    context = ET.iterparse(nodes_file, events=('start', 'end'))
-    
-    # Get the root element
-    _, root = next(context)
-    
-    # Create a new root for the output
-    new_root = ET.Element(root.tag)
-    # Copy all attributes from the original root
-    for key, value in root.attrib.items():
-        new_root.set(key, value)
-    
-    # Counter for kept nodes
-    kept_nodes = 0
-    
-    # Process nodes
-    for event, elem in tqdm(context):
-        if event == 'end' and elem.tag == 'node':
-            # Check if this node's ID is in our set
-            if elem.get('id') in node_ids:
-                new_root.append(elem)
-                kept_nodes += 1
-            else:
-                # Clear the element to free memory
-                elem.clear()
-    
-    print(f"Kept {kept_nodes} nodes out of total nodes")
-    
-    # Write the filtered XML
-    print("Writing filtered nodes to output file...")
-    tree = ET.ElementTree(new_root)
-    tree.write(output_file, encoding='utf-8', xml_declaration=True)
-    print("Done!")
+import argparse
+import time
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from filter_osm import TagRules, iter_children, stream_filter
+
+MERGE_EVERY = 1 << 22  # refs acumuladas (32 MB) antes de deduplicar
+
+
+def way_node_ids(ways_file):
+    """
+    Ids de los nodos referenciados por los ways, como arreglo int64 ordenado y
+    sin repetidos. Las refs se acumulan en un array('q') y se deduplican por
+    bloques, sin sets de strings ni el DOM completo.
+    """
+    ids = np.empty(0, dtype=np.int64)
+    pending = array('q')
+    for _, elem in iter_children(ways_file):
+        if elem.tag != 'way':
+            continue
+        pending.extend(int(nd.get('ref')) for nd in elem.iterfind('nd'))
+        if len(pending) >= MERGE_EVERY:
+            ids = np.union1d(ids, np.frombuffer(pending, dtype=np.int64))
+            pending = array('q')
+    return np.union1d(ids, np.frombuffer(pending, dtype=np.int64))
+
+
+def osm_timestamp(value):
+    """'2025-05-01' o '2025-05-01T12:00:00' -> '2025-05-01T12:00:00Z', comparable como string."""
+    return datetime.fromisoformat(value.rstrip('Z')).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class NodeFilter:
+    """
+    Decide por cada <node> en una sola pasada: referenciado por algún way
+    (búsqueda binaria en `node_ids`), `since <= timestamp < until` y sin tags
+    descartados por `rules`. Los nodos sin timestamp no se filtran por fecha.
+    """
+
+    def __init__(self, node_ids=None, since=None, until=None, rules=None):
+        self.node_ids = node_ids
+        self.since = since
+        self.until = until
+        self.rules = rules
+
+    def __call__(self, elem):
+        if elem.tag != 'node':
+            return False
+        if self.node_ids is not None:
+            node_id = int(elem.get('id'))
+            i = self.node_ids.searchsorted(node_id)
+            if i == len(self.node_ids) or self.node_ids[i] != node_id:
+                return False
+        timestamp = elem.get('timestamp')
+        if timestamp is not None:
+            if self.since is not None and timestamp < self.since:
+                return False
+            if self.until is not None and timestamp >= self.until:
+                return False
+        return self.rules is None or not self.rules.matches(elem)
+
+
+def extract_nodes(nodes_file, output_file, ways_file=None, since=None, until=None, rules=None):
+    """
+    Escribe en `output_file` los nodos de `nodes_file` que pasan el NodeFilter
+    (ways, ventana de fechas y tags); ways y relations no se copian.
+    Devuelve (conservados, descartados).
+    """
+    node_ids = way_node_ids(ways_file) if ways_file else None
+    if node_ids is not None:
+        print(f"Found {len(node_ids)} unique node IDs in ways ({node_ids.nbytes / 1e6:.1f} MB)")
+    keep = NodeFilter(
+        node_ids,
+        osm_timestamp(since) if since else None,
+        osm_timestamp(until) if until else None,
+        rules,
+    )
+    kept, dropped = stream_filter(nodes_file, output_file, keep)
+    return kept['node'], dropped['node']
+
 
 def main():
-    ways_file = 'filtered_ways.xml'
-    nodes_file = 'map_15-6-25.xml'
-    output_file = 'street_nodes_2.xml'
-    
-    # Get node IDs from ways
-    node_ids = get_way_node_ids(ways_file)
-    
-    # Filter nodes
-    filter_nodes(nodes_file, output_file, node_ids)
-
-if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description='Extract the nodes used by the street ways, filtered by timestamp and tags, in one streaming pass'
+    )
+    parser.add_argument('nodes', nargs='?', default='map_15-6-25.xml', help='OSM extract with the nodes')
+    parser.add_argument('output', nargs='?', default='street_nodes_2.xml')
+    parser.add_argument('--ways', default='filtered_ways.xml',
+                        help='Ways whose node refs are kept ("" keeps every node)')
+    parser.add_argument('--since', help='Keep nodes edited on or after this date (ISO 8601)')
+    parser.add_argument('--until', help='Keep nodes edited before this date (ISO 8601)')
+    parser.add_argument('--drop', action='append', default=[], metavar='KEY[=V1,V2]',
+                        help='Drop nodes with this tag, repeatable')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    kept, dropped = extract_nodes(
+        args.nodes, args.output, args.ways or None, args.since, args.until,
+        TagRules.parse(args.drop) if args.drop else None,
+    )
+    print(f"Kept {kept} nodes, dropped {dropped} in {time.perf_counter() - start:.1f}s. "
+          f"Output written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
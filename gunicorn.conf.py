@@ -0,0 +1,35 @@
+import os
+
+# El master importa la app una sola vez antes de crear los workers
+preload_app = True
+
+# El warm-up del grafo (Routes.apps) corre en cada worker, después de publicar el snapshot
+os.environ['ROUTING_WARMUP_DEFER'] = '1'
+
+
+def on_starting(server):
+    """
+    Publica el snapshot del grafo en ROUTING_SNAPSHOT_DIR desde el master, antes
+    de crear los workers; cada worker lo adjunta con mmap sin copiarlo.
+    Con ROUTING_SNAPSHOT_SIDECAR=1 el snapshot lo construye otro proceso
+    (manage.py build_graph_snapshot) y aquí no se hace nada.
+    """
+    root = os.environ.get('ROUTING_SNAPSHOT_DIR')
+    if not root or os.environ.get('ROUTING_SNAPSHOT_SIDECAR') == '1':
+        return
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ArequipaBusGuide.settings')
+    django.setup()
+    from django.db import connections
+    from Routes.services.graph_snapshot import build_snapshot
+
+    version = build_snapshot(root)
+    server.log.info("Snapshot del grafo %s publicado en %s", version, root)
+    # Los workers no deben heredar la conexión abierta por el master
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    from Routes.services.warmup import start_warmup
+
+    start_warmup(in_worker=True)